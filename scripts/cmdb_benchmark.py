@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+CMDB Validation Benchmark
+=========================
+Load test for servicenow_cmdb_sync.py. Starts servicenow_mock_server.py
+with 1k/10k/100k CIs and drives single-VM, batch and async validation and
+a full environment scan against it, reporting throughput, p50/p99 request
+latency and peak Python heap usage (tracemalloc).
+
+Usage:
+    python cmdb_benchmark.py
+    python cmdb_benchmark.py --sizes 1000 10000 --json benchmark.json
+    python cmdb_benchmark.py --latency 20 --error-rate 0.01 --scenarios batch
+    python cmdb_benchmark.py --baseline main.json --max-regression 0.3
+    python cmdb_benchmark.py --scenarios scan --json-decoder json
+
+Author: Morpheus Automation Lab
+Version: 1.0.0
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+import subprocess
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import servicenow_cmdb_sync as cmdb_sync
+from servicenow_mock_server import build_record
+
+
+SCENARIOS = ('single', 'batch', 'async', 'scan')
+
+# Regression checks compare this metric against the baseline
+THROUGHPUT_KEY = 'vms_per_sec'
+
+
+#--------------------------------------------------------------
+# Measurement
+#--------------------------------------------------------------
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples (0 for no samples)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class RequestTimer:
+    """
+    Record the latency of every ServiceNow API call made while active.
+    
+    Wraps ServiceNowClient._send, which both the sync and async clients
+    go through for every network call, so retries and rate-limit waits
+    are included and memoized or coalesced lookups are not.
+    """
+    
+    def __init__(self):
+        self.samples: List[float] = []
+        self._lock = threading.Lock()
+        self._original = None
+    
+    def __enter__(self) -> 'RequestTimer':
+        original = self._original = cmdb_sync.ServiceNowClient._send
+        timer = self
+        
+        def timed(client, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(client, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with timer._lock:
+                    timer.samples.append(elapsed)
+        
+        cmdb_sync.ServiceNowClient._send = timed
+        return self
+    
+    def __exit__(self, *exc_info):
+        cmdb_sync.ServiceNowClient._send = self._original
+
+
+def measure(scenario: str, size: int, fn, trace_memory: bool = True) -> Dict[str, Any]:
+    """
+    Run one scenario and collect its metrics.
+    
+    Args:
+        scenario: Scenario name
+        size: Number of CIs served by the mock
+        fn: Callable returning the number of VMs validated
+        trace_memory: Track peak heap usage (slows the run somewhat)
+    
+    Returns:
+        Result row for the report
+    """
+    if trace_memory:
+        tracemalloc.start()
+    
+    with RequestTimer() as timer:
+        started = time.perf_counter()
+        vms = fn()
+        elapsed = time.perf_counter() - started
+    
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    
+    return {
+        'scenario': scenario,
+        'size': size,
+        'vms': vms,
+        'seconds': round(elapsed, 3),
+        THROUGHPUT_KEY: round(vms / elapsed, 1) if elapsed else 0.0,
+        'requests': len(timer.samples),
+        'p50_ms': round(percentile(timer.samples, 50) * 1000, 2),
+        'p99_ms': round(percentile(timer.samples, 99) * 1000, 2),
+        'peak_mb': round(peak / (1024 * 1024), 1)
+    }
+
+
+#--------------------------------------------------------------
+# Scenarios
+#--------------------------------------------------------------
+
+def expected_values(index: int, environment: str) -> Dict[str, Any]:
+    """Expected values for mock VM number `index`."""
+    record = build_record(index, environment)
+    return {
+        'name': record['name'],
+        'environment': environment,
+        'ip_address': record['ip_address'],
+        'cpu_count': int(record['cpu_count']),
+        'ram': int(record['ram']),
+        'disk_space': int(record['disk_space'])
+    }
+
+
+def sample_indexes(size: int, sample: int) -> List[int]:
+    """Evenly spaced VM indexes, at most `sample` of them."""
+    step = max(1, size // max(1, sample))
+    return list(range(0, size, step))[:sample]
+
+
+def run_single(size: int, args: argparse.Namespace) -> int:
+    """Validate a sample of VMs one at a time through run_validation."""
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    indexes = sample_indexes(size, args.single_sample)
+    for i in indexes:
+        cmdb_sync.run_validation(
+            vm_name=build_record(i, args.environment)['name'],
+            environment=args.environment,
+            expected_values=expected_values(i, args.environment),
+            create_incident=args.incidents,
+            client=client
+        )
+    return len(indexes)
+
+
+def run_batch(size: int, args: argparse.Namespace) -> int:
+    """Validate every VM, plus --missing VMs absent from the CMDB, in one batch."""
+    expected = {}
+    for i in range(size + int(size * args.missing)):
+        values = expected_values(i, args.environment)
+        expected[values['name']] = values
+    
+    cmdb_sync.run_batch_validation(
+        vm_names=list(expected),
+        environment=args.environment,
+        expected_values=expected,
+        create_incident=args.incidents
+    )
+    return len(expected)
+
+
+def run_async(size: int, args: argparse.Namespace) -> int:
+    """Validate a sample of VMs concurrently with the async client."""
+    indexes = sample_indexes(size, args.async_sample)
+    
+    async def validate_all():
+        async with cmdb_sync.AsyncServiceNowClient(cmdb_sync.ServiceNowConfig()) as client:
+            async def validate(i):
+                values = expected_values(i, args.environment)
+                record = await cmdb_sync.async_get_cmdb_record(client, values['name'])
+                return cmdb_sync.validate_sync(values, record, client.rules)
+            
+            await asyncio.gather(*[validate(i) for i in indexes])
+    
+    asyncio.run(validate_all())
+    return len(indexes)
+
+
+def run_scan(size: int, args: argparse.Namespace) -> int:
+    """Stream every CI in the environment, prefetching pages as reconciliation does."""
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    try:
+        return sum(1 for _ in cmdb_sync.get_cmdb_records_by_environment(
+            client, args.environment, prefetch=True, profile='validation'
+        ))
+    finally:
+        client.close()
+
+
+SCENARIO_RUNNERS = {
+    'single': run_single,
+    'batch': run_batch,
+    'async': run_async,
+    'scan': run_scan
+}
+
+
+#--------------------------------------------------------------
+# Mock Server Process
+#--------------------------------------------------------------
+
+def start_mock(size: int, args: argparse.Namespace) -> subprocess.Popen:
+    """
+    Start the mock server for `size` CIs and point the client at it.
+    
+    Returns:
+        The mock server process
+    """
+    command = [
+        sys.executable, os.path.join(SCRIPT_DIR, 'servicenow_mock_server.py'),
+        '--port', '0',
+        '--records', str(size),
+        '--environment', args.environment,
+        '--latency', str(args.latency),
+        '--jitter', str(args.jitter),
+        '--error-rate', str(args.error_rate),
+        '--throttle-rate', str(args.throttle_rate),
+        '--drift', str(args.drift)
+    ]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    
+    # First line: "Listening on http://host:port"
+    line = process.stdout.readline().strip()
+    if not line.startswith('Listening on http://'):
+        process.kill()
+        raise RuntimeError(f"Mock server failed to start: {line or 'no output'}")
+    
+    os.environ.update({
+        'SNOW_INSTANCE': line[len('Listening on http://'):],
+        'SNOW_URL_SCHEME': 'http',
+        'SNOW_USERNAME': 'benchmark',
+        'SNOW_PASSWORD': 'benchmark',
+        'SNOW_CACHE_PATH': ''
+    })
+    return process
+
+
+#--------------------------------------------------------------
+# Reporting
+#--------------------------------------------------------------
+
+REPORT_COLUMNS = (
+    ('scenario', 'Scenario', '{:<8}'),
+    ('size', 'CIs', '{:>8}'),
+    ('vms', 'VMs', '{:>8}'),
+    ('seconds', 'Seconds', '{:>9}'),
+    (THROUGHPUT_KEY, 'VMs/sec', '{:>10}'),
+    ('requests', 'Requests', '{:>9}'),
+    ('p50_ms', 'p50 ms', '{:>8}'),
+    ('p99_ms', 'p99 ms', '{:>8}'),
+    ('peak_mb', 'Peak MB', '{:>8}')
+)
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """Print results as a fixed-width table."""
+    header = '  '.join(fmt.format(title) for _, title, fmt in REPORT_COLUMNS)
+    print(header)
+    print('-' * len(header))
+    for row in results:
+        print('  '.join(fmt.format(row[key]) for key, _, fmt in REPORT_COLUMNS))
+
+
+def find_regressions(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    max_regression: float
+) -> List[str]:
+    """
+    Compare throughput against a baseline run.
+    
+    Returns:
+        One message per scenario/size that is slower than allowed
+    """
+    previous = {(r['scenario'], r['size']): r for r in baseline}
+    regressions = []
+    for row in results:
+        before = previous.get((row['scenario'], row['size']))
+        if not before or not before[THROUGHPUT_KEY]:
+            continue
+        change = row[THROUGHPUT_KEY] / before[THROUGHPUT_KEY] - 1
+        if change < -max_regression:
+            regressions.append(
+                f"{row['scenario']} @ {row['size']}: {row[THROUGHPUT_KEY]} VMs/sec "
+                f"vs {before[THROUGHPUT_KEY]} ({change:+.0%})"
+            )
+    return regressions
+
+
+#--------------------------------------------------------------
+# CLI Interface
+#--------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark CMDB validation against a local mock ServiceNow'
+    )
+    
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+        help='Fleet sizes (CIs served by the mock) to benchmark'
+    )
+    parser.add_argument(
+        '--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+        help='Scenarios to run'
+    )
+    parser.add_argument(
+        '--environment', default='dev', choices=['dev', 'staging', 'prod', 'production'],
+        help='Environment of the generated CIs'
+    )
+    parser.add_argument(
+        '--single-sample', type=int, default=200,
+        help='VMs validated one at a time in the single scenario'
+    )
+    parser.add_argument(
+        '--async-sample', type=int, default=2000,
+        help='VMs validated concurrently in the async scenario'
+    )
+    parser.add_argument(
+        '--incidents', action='store_true',
+        help='Create incidents for failures (exercises incident and batch APIs)'
+    )
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock latency in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Mock latency jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Mock 503 rate')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Mock 429 rate')
+    parser.add_argument(
+        '--drift', type=float, default=0.01,
+        help='Fraction of mock CIs that differ from expected values'
+    )
+    parser.add_argument(
+        '--missing', type=float, default=0.0,
+        help='Extra VMs, as a fraction of the fleet, that the batch expects but '
+             'the CMDB lacks (critical failures, so --incidents has work to do)'
+    )
+    parser.add_argument(
+        '--json-decoder', choices=['auto', 'json', *cmdb_sync.FAST_JSON_DECODERS],
+        help='JSON decoder for API responses (sets SNOW_JSON_DECODER)'
+    )
+    parser.add_argument(
+        '--no-tracemalloc', action='store_true',
+        help='Skip peak memory tracking (tracemalloc slows allocation-heavy code)'
+    )
+    parser.add_argument('--json', metavar='FILE', help='Write results as JSON')
+    parser.add_argument(
+        '--baseline', metavar='FILE',
+        help='Results JSON from a previous run to check for throughput regressions'
+    )
+    parser.add_argument(
+        '--max-regression', type=float, default=0.3,
+        help='Allowed throughput drop against --baseline (0.3 = 30%%)'
+    )
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show client logging')
+    
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s | %(levelname)-8s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    if not args.verbose:
+        # Per-VM discrepancy warnings would drown the report
+        logging.getLogger(cmdb_sync.__name__).setLevel(logging.ERROR)
+    if args.json_decoder:
+        os.environ['SNOW_JSON_DECODER'] = args.json_decoder
+    
+    results = []
+    for size in args.sizes:
+        process = start_mock(size, args)
+        try:
+            for scenario in args.scenarios:
+                print(f"Running {scenario} @ {size} CIs...", file=sys.stderr, flush=True)
+                results.append(measure(
+                    scenario, size,
+                    lambda: SCENARIO_RUNNERS[scenario](size, args),
+                    trace_memory=not args.no_tracemalloc
+                ))
+        finally:
+            process.terminate()
+            process.wait()
+    
+    print_report(results)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nThroughput regressions:")
+            for message in regressions:
+                print(f"  - {message}")
+            return 1
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+CMDB Sync Launcher
+==================
+Lightweight entry point for servicenow_cmdb_sync.py. Python never caches
+bytecode for the script it is asked to run, so invoking the 5k-line module
+directly recompiles it on every call. Importing it from here reuses
+__pycache__ and roughly halves startup for short Morpheus tasks.
+
+Takes exactly the same arguments as servicenow_cmdb_sync.py.
+
+Usage:
+    python cmdb_sync.py --vm-name web-vm-01 --environment dev
+    python cmdb_sync.py --vm-name web-vm-01 --environment dev --demo
+
+Author: Morpheus Automation Lab
+Version: 1.0.0
+"""
+
+import sys
+
+from servicenow_cmdb_sync import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
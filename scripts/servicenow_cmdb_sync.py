@@ -8,6 +8,7 @@ are properly synchronized to the ServiceNow CMDB.
 Usage:
     python servicenow_cmdb_sync.py --vm-name <name> --environment <env>
     python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev --validate
+    python servicenow_cmdb_sync.py --vm-list vms.txt --environment dev
 
 Author: Morpheus Automation Lab
 Version: 1.0.0
@@ -16,16 +17,96 @@ Version: 1.0.0
 import os
 import sys
 import json
+import time
+import re
+import abc
+import csv
+import mmap
+import shlex
+import codecs
+import struct
+import base64
+import hashlib
+import hmac
+import random
+import ipaddress
 import logging
+import socket
 import argparse
-from datetime import datetime
-from typing import Dict, Optional, Tuple, Any
+import threading
+import contextvars
+import importlib.util
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict
+from collections.abc import Mapping
+from enum import Enum
+from functools import partial, wraps
+from itertools import chain, count, repeat
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+from urllib.parse import quote, urlencode
 
-# Third-party imports
+# fcntl is POSIX-only; the shared rate limit file needs it
 try:
-    import requests
-    from requests.auth import HTTPBasicAuth
+    import fcntl
 except ImportError:
+    fcntl = None
+
+
+def _lazy_import(name: str):
+    """
+    Import a module on first attribute access instead of at startup.
+    
+    Quick runs (demo, cache hits, the daemon thin client) never touch the
+    HTTP stack or the event loop, so deferring them keeps CLI startup short.
+    
+    Args:
+        name: Module name
+        
+    Returns:
+        Module placeholder, or None if the module is not installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    # Bind submodules on their package (which find_spec imported) as the
+    # import system does; later imports find sys.modules and skip that step
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+# Standard library modules only some code paths need
+asyncio = _lazy_import('asyncio')
+inspect = _lazy_import('inspect')
+sqlite3 = _lazy_import('sqlite3')
+
+# The validation daemon and its thin client only
+http_client = _lazy_import('http.client')
+http_server = _lazy_import('http.server')
+socketserver = _lazy_import('socketserver')
+
+# XML CMDB exports only
+ElementTree = _lazy_import('xml.etree.ElementTree')
+
+# PyYAML is only needed for YAML rule files
+yaml = _lazy_import('yaml')
+
+# Third-party imports; requests loads on the first API call
+requests = _lazy_import('requests')
+if requests is None:
     print("ERROR: 'requests' library required. Install with: pip install requests")
     sys.exit(1)
 
@@ -44,597 +125,6209 @@ class ServiceNowConfig:
         self.password = os.getenv('SNOW_PASSWORD', '')
         self.api_version = 'v2'
         
-        # API endpoints
-        self.base_url = f"https://{self.instance}/api/now/{self.api_version}"
+        # API endpoints (SNOW_URL_SCHEME=http only for local mocks)
+        self.url_scheme = os.getenv('SNOW_URL_SCHEME', 'https')
+        self.instance_url = f"{self.url_scheme}://{self.instance}"
+        self.base_url = f"{self.instance_url}/api/now/{self.api_version}"
+        self.batch_endpoint = '/api/now/v1/batch'
+        self.batch_size = int(os.getenv('SNOW_BATCH_SIZE', '100'))
         self.cmdb_table = os.getenv('SNOW_CMDB_TABLE', 'cmdb_ci_vm_instance')
         self.incident_table = 'incident'
         
-        # Timeouts
+        # Timeouts and retries (exponential backoff with full jitter)
         self.timeout = 30
-        self.retry_attempts = 3
-        self.retry_delay = 5
-
+        self.retry_attempts = int(os.getenv('SNOW_RETRY_ATTEMPTS', '3'))
+        self.retry_delay = float(os.getenv('SNOW_RETRY_DELAY', '1'))
+        self.retry_max_delay = float(os.getenv('SNOW_RETRY_MAX_DELAY', '30'))
+        self.retry_budget = float(os.getenv('SNOW_RETRY_BUDGET', '0.2'))
+        self._retry_policy = None
+        
+        # Bulk queries - keep request URLs under common proxy/server limits
+        self.max_url_length = int(os.getenv('SNOW_MAX_URL_LENGTH', '8000'))
+        self.page_size = int(os.getenv('SNOW_PAGE_SIZE', '1000'))
+        
+        # JSON decoder for API responses: auto (orjson, then ujson, when
+        # installed), orjson, ujson or json
+        self.json_decoder = os.getenv('SNOW_JSON_DECODER', 'auto')
+        
+        # VMs fetched, compared and reported together in batch validation
+        self.validation_chunk_size = int(os.getenv('SNOW_VALIDATION_CHUNK_SIZE', '5000'))
+        
+        # Batch run checkpoint, saved after every chunk (disabled unless set)
+        self.checkpoint_path = os.getenv('SNOW_CHECKPOINT_FILE', '')
+        
+        # Concurrency - requests kept in flight by the async client
+        self.max_concurrency = int(os.getenv('SNOW_MAX_CONCURRENCY', '20'))
+        
+        # Adaptive concurrency (AIMD): the in-flight limit starts at the
+        # client's concurrency (SNOW_MAX_CONCURRENCY by default), halves
+        # (down to SNOW_CONCURRENCY_MIN) on throttling, timeouts or p95
+        # latency over SNOW_CONCURRENCY_LATENCY_TARGET seconds (0 = twice
+        # the baseline p95 it learns), and grows back by one while the
+        # instance is healthy
+        self.adaptive_concurrency = (
+            os.getenv('SNOW_ADAPTIVE_CONCURRENCY', 'true').lower() == 'true'
+        )
+        self.min_concurrency = int(os.getenv('SNOW_CONCURRENCY_MIN', '2'))
+        self.concurrency_latency_target = float(
+            os.getenv('SNOW_CONCURRENCY_LATENCY_TARGET', '0')
+        )
+        
+        # Identical GETs in flight share one call; successful responses are
+        # memoized for SNOW_MEMO_TTL seconds (0 disables the memo). Keep it
+        # short: a memoized record can hide a CI update for that long.
+        self.memo_ttl = float(os.getenv('SNOW_MEMO_TTL', '5'))
+        self.memo_size = int(os.getenv('SNOW_MEMO_SIZE', '1024'))
+        self.memo_max_bytes = int(os.getenv('SNOW_MEMO_MAX_MB', '64')) * 1024 * 1024
+        
+        # Client-side rate limit in requests/sec (0 disables). Point
+        # SNOW_RATE_LIMIT_FILE at a shared path to pace all jobs on a runner.
+        self.rate_limit = float(os.getenv('SNOW_RATE_LIMIT', '0'))
+        self.rate_limit_burst = int(os.getenv('SNOW_RATE_LIMIT_BURST', '10'))
+        self.rate_limit_file = os.getenv('SNOW_RATE_LIMIT_FILE', '')
+        
+        # Local CMDB snapshot cache (disabled unless a path is set)
+        self.cache_path = os.getenv('SNOW_CACHE_PATH', '')
+        self.cache_ttl = int(os.getenv('SNOW_CACHE_TTL', '300'))
+        
+        # CMDB export file (JSON, NDJSON, CSV or XML) that replaces the
+        # Table API for CMDB reads - maintenance windows and large audits
+        self.cmdb_export_path = os.getenv('SNOW_CMDB_EXPORT', '')
+        
+        # Validation rules file (YAML or JSON); built-in rules if unset
+        self.rules_path = os.getenv('SNOW_RULES_FILE', '')
+        
+        # Incident deduplication - reuse open incidents for repeated failures
+        self.incident_dedup = os.getenv('SNOW_INCIDENT_DEDUP', 'true').lower() == 'true'
+        self.incident_index_path = os.getenv('SNOW_INCIDENT_INDEX', ':memory:')
+        self.incident_update_interval = int(
+            os.getenv('SNOW_INCIDENT_UPDATE_INTERVAL', '3600')
+        )
+        
+        # Validation daemon - host:port or unix:/path/to/socket. Jobs must
+        # carry SNOW_DAEMON_TOKEN, or the token the daemon writes to
+        # SNOW_DAEMON_TOKEN_FILE (readable only by the user running it).
+        self.daemon_address = os.getenv('SNOW_DAEMON_ADDR', '127.0.0.1:8765')
+        self.daemon_token = os.getenv('SNOW_DAEMON_TOKEN', '')
+        self.daemon_token_file = os.getenv(
+            'SNOW_DAEMON_TOKEN_FILE', os.path.expanduser('~/.servicenow_cmdb_daemon.token')
+        )
+        
+        # Watch mode - persisted pass/fail state and CMDB poll interval
+        self.watch_state_path = os.getenv('SNOW_WATCH_STATE', 'cmdb_watch_state.db')
+        self.watch_interval = int(os.getenv('SNOW_WATCH_INTERVAL', '60'))
+        
+        # Instrumentation - OpenMetrics text file and optional spans
+        # (SNOW_TRACE_FILE for JSON lines, SNOW_OTEL=true for OpenTelemetry)
+        self.metrics_file = os.getenv('SNOW_METRICS_FILE', '')
+        self.trace_file = os.getenv('SNOW_TRACE_FILE', '')
+        self.otel_enabled = os.getenv('SNOW_OTEL', 'false').lower() == 'true'
+    
     def validate(self) -> bool:
         """Validate configuration is complete."""
         if not self.password:
+            if self.cmdb_export_path:
+                # CMDB reads come from the export; only incidents need the API
+                logging.warning("SNOW_PASSWORD not set - validating offline, incidents will fail")
+                return True
             logging.warning("SNOW_PASSWORD not set - running in demo mode")
             return False
         return all([self.instance, self.username, self.password])
+    
+    @property
+    def retry_policy(self) -> 'RetryPolicy':
+        """Retry policy shared by every client built from this config."""
+        if self._retry_policy is None:
+            self._retry_policy = RetryPolicy(
+                max_attempts=self.retry_attempts,
+                base_delay=self.retry_delay,
+                max_delay=self.retry_max_delay,
+                budget_ratio=self.retry_budget
+            )
+        return self._retry_policy
 
 
-#--------------------------------------------------------------
-# Logging Setup
-#--------------------------------------------------------------
-
-def setup_logging(verbose: bool = False) -> logging.Logger:
-    """Configure logging with appropriate level and format."""
-    level = logging.DEBUG if verbose else logging.INFO
+class RetryPolicy:
+    """
+    Retry policy for ServiceNow API requests.
     
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s | %(levelname)-8s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    - Exponential backoff with full jitter, so throttled clients spread out
+      instead of retrying in lockstep
+    - Retry-After headers on 429/503 responses are honoured, up to max_delay
+    - Only transient statuses are retried; other 4xx errors fail fast
+    - A global retry budget caps retries to a fraction of requests made,
+      so a struggling instance is not hit with a retry storm
+    """
     
-    return logging.getLogger(__name__)
+    # Statuses worth retrying - everything else is treated as permanent
+    RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+    
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget_ratio: float = 0.2,
+        budget_min_retries: int = 10
+    ):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_min_retries = budget_min_retries
+        self._requests = 0
+        self._retries = 0
+        self._lock = threading.Lock()
+    
+    def is_retryable(self, status_code: int) -> bool:
+        """Return True if a response status is worth retrying."""
+        return status_code in self.RETRYABLE_STATUSES
+    
+    def record_request(self):
+        """Count a new (non-retry) request towards the retry budget."""
+        with self._lock:
+            self._requests += 1
+    
+    def acquire_retry(self) -> bool:
+        """Take one retry from the budget; False once the budget is spent."""
+        with self._lock:
+            allowed = self.budget_min_retries + self.budget_ratio * self._requests
+            if self._retries >= allowed:
+                return False
+            self._retries += 1
+            return True
+    
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Compute the wait before the next attempt.
+        
+        Args:
+            attempt: Zero-based number of the attempt that just failed
+            retry_after: Server-requested delay in seconds, if any
+            
+        Returns:
+            Delay in seconds
+        """
+        if retry_after is not None:
+            # Small jitter on top so clients told the same delay do not collide;
+            # capped so a huge or bogus header cannot stall a run for hours
+            return min(retry_after + random.uniform(0, self.base_delay), self.max_delay)
+        
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+    
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Parse a Retry-After header given in seconds or as an HTTP date."""
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
 
 
 #--------------------------------------------------------------
-# ServiceNow API Client
+# Rate Limiting
 #--------------------------------------------------------------
 
-class ServiceNowClient:
-    """Client for interacting with ServiceNow REST API."""
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by clients in one process.
     
-    def __init__(self, config: ServiceNowConfig):
-        self.config = config
-        self.session = requests.Session()
-        self.session.auth = HTTPBasicAuth(config.username, config.password)
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        })
-        self.logger = logging.getLogger(__name__)
-
-    def _make_request(
-        self, 
-        method: str, 
-        endpoint: str, 
-        params: Optional[Dict] = None,
-        data: Optional[Dict] = None
-    ) -> Tuple[bool, Dict]:
+    Callers reserve a token up front and sleep until it becomes valid,
+    so concurrent callers are spaced evenly at the target rate rather
+    than waking together.
+    """
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> float:
         """
-        Make HTTP request to ServiceNow API with retry logic.
+        Take one token, sleeping until it is available.
         
         Returns:
-            Tuple of (success: bool, response_data: dict)
+            Seconds spent waiting
         """
-        url = f"{self.config.base_url}/{endpoint}"
-        
-        for attempt in range(self.config.retry_attempts):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+    
+    def _reserve(self) -> float:
+        """Reserve a token and return how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return max(-self._tokens / self.rate, 0.0)
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a locked file.
+    
+    Every process pointing at the same file draws from one bucket, so
+    parallel pipeline jobs on a runner stay under a combined rate.
+    """
+    
+    def __init__(self, rate: float, burst: int, path: str):
+        super().__init__(rate, burst)
+        self.path = path
+    
+    def _reserve(self) -> float:
+        """Reserve a token from the shared file state."""
+        # The thread lock serializes this process; flock serializes processes
+        with self._lock, open(self.path, 'a+') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
             try:
-                self.logger.debug(f"API Request: {method} {url}")
-                
-                response = self.session.request(
-                    method=method,
-                    url=url,
-                    params=params,
-                    json=data,
-                    timeout=self.config.timeout
-                )
+                f.seek(0)
+                try:
+                    tokens, updated = (float(v) for v in f.read().split())
+                except ValueError:
+                    tokens, updated = float(self.burst), time.time()
                 
-                # Log response status
-                self.logger.debug(f"Response Status: {response.status_code}")
+                now = time.time()
+                tokens = min(self.burst, tokens + max(now - updated, 0.0) * self.rate)
+                tokens -= 1
                 
-                # Handle response
-                if response.status_code == 200:
-                    return True, response.json()
-                elif response.status_code == 201:
-                    return True, response.json()
-                elif response.status_code == 401:
-                    self.logger.error("Authentication failed - check credentials")
-                    return False, {"error": "Authentication failed"}
-                elif response.status_code == 404:
-                    self.logger.warning("Resource not found")
-                    return False, {"error": "Not found"}
-                else:
-                    self.logger.warning(
-                        f"Request failed with status {response.status_code}: "
-                        f"{response.text[:200]}"
-                    )
-                    
-            except requests.exceptions.Timeout:
-                self.logger.warning(f"Request timeout (attempt {attempt + 1})")
-            except requests.exceptions.ConnectionError as e:
-                self.logger.warning(f"Connection error (attempt {attempt + 1}): {e}")
-            except requests.exceptions.RequestException as e:
-                self.logger.error(f"Request failed: {e}")
-                return False, {"error": str(e)}
-            
-            # Wait before retry
-            if attempt < self.config.retry_attempts - 1:
-                import time
-                time.sleep(self.config.retry_delay)
+                f.seek(0)
+                f.truncate()
+                f.write(f"{tokens} {now}")
+                f.flush()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
         
-        return False, {"error": "Max retries exceeded"}
+        return max(-tokens / self.rate, 0.0)
 
 
-#--------------------------------------------------------------
-# CMDB Functions
-#--------------------------------------------------------------
+_rate_limiters: Dict[Tuple, TokenBucket] = {}
+_rate_limiters_lock = threading.Lock()
 
-def get_cmdb_record(
-    client: ServiceNowClient, 
-    vm_name: str,
-    additional_filters: Optional[Dict] = None
-) -> Optional[Dict]:
+
+def get_rate_limiter(config: 'ServiceNowConfig') -> Optional[TokenBucket]:
     """
-    Retrieve a VM record from ServiceNow CMDB.
+    Return the rate limiter shared by all clients for this instance and user.
     
     Args:
-        client: ServiceNow API client
-        vm_name: Name of the VM to look up
-        additional_filters: Optional additional query filters
+        config: ServiceNow configuration
         
     Returns:
-        CMDB record dict if found, None otherwise
+        TokenBucket, or None when rate limiting is disabled
     """
-    logger = logging.getLogger(__name__)
-    logger.info(f"Looking up CMDB record for VM: {vm_name}")
+    if config.rate_limit <= 0:
+        return None
     
-    # Build query parameters
-    query = f"name={vm_name}"
-    if additional_filters:
-        for key, value in additional_filters.items():
-            query += f"^{key}={value}"
+    key = (config.instance, config.username, config.rate_limit_file)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            if config.rate_limit_file and fcntl is not None:
+                limiter = FileTokenBucket(
+                    config.rate_limit, config.rate_limit_burst, config.rate_limit_file
+                )
+            else:
+                if config.rate_limit_file:
+                    logging.warning(
+                        "File locking unavailable on this platform - "
+                        "rate limit applies to this process only"
+                    )
+                limiter = TokenBucket(config.rate_limit, config.rate_limit_burst)
+            _rate_limiters[key] = limiter
     
-    params = {
-        'sysparm_query': query,
-        'sysparm_limit': 1,
-        'sysparm_display_value': 'true',
-        'sysparm_fields': ','.join([
-            'sys_id',
-            'name',
-            'ip_address',
-            'cpu_count',
-            'ram',
-            'disk_space',
-            'state',
-            'os',
-            'os_version',
-            'environment',
-            'managed_by',
-            'sys_created_on',
-            'sys_updated_on',
-            'correlation_id',
-            'discovery_source'
-        ])
-    }
+    return limiter
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on requests in flight, driven by observed API latency.
     
-    # Make API request
-    endpoint = f"table/{client.config.cmdb_table}"
-    success, response = client._make_request('GET', endpoint, params=params)
+    The limit starts at max_limit, the static limit it replaces. Every
+    attempt reports its latency and status. Once a window of at least one
+    sample per allowed request is complete, the limit grows by one if p95
+    latency and the error rate are healthy and is multiplied by BACKOFF
+    (always dropping by at least one) if not. 429s and timeouts back off
+    at once. After a decrease, reports from requests sent at the old
+    limit are ignored, so one burst of throttling cuts the limit once
+    rather than to the minimum.
     
-    if not success:
-        logger.error(f"Failed to query CMDB: {response.get('error', 'Unknown error')}")
-        return None
+    Without a fixed latency target, the target is LATENCY_TOLERANCE times
+    a baseline p95 that follows the fastest window seen and drifts up
+    when the instance stays slow, so a busy afternoon becomes the new
+    normal instead of pinning the limit at its minimum.
+    """
     
-    # Parse response
-    result = response.get('result', [])
+    BACKOFF = 0.5
+    LATENCY_TOLERANCE = 2.0
+    BASELINE_DRIFT = 0.05
+    MAX_ERROR_RATE = 0.05
+    MIN_WINDOW = 10
     
-    if not result:
-        logger.warning(f"No CMDB record found for VM: {vm_name}")
-        return None
+    # Statuses (as in snow_request_duration_seconds) that mean the
+    # instance is overloaded, and those counted as errors
+    OVERLOAD_STATUSES = frozenset({'429', '408', 'timeout'})
+    ERROR_STATUSES = frozenset({'500', '502', '503', '504', 'connection_error', 'error'})
     
-    record = result[0]
-    logger.info(f"Found CMDB record: sys_id={record.get('sys_id')}")
+    def __init__(self, min_limit: int, max_limit: int, latency_target: float = 0.0):
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = min(max(min_limit, 1), self.max_limit)
+        self.latency_target = latency_target
+        self.baseline = None
+        self._limit = self.max_limit
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._ignore = 0
+        self._lock = threading.Lock()
+        METRICS.set('snow_concurrency_limit', self._limit)
     
-    return record
+    @property
+    def limit(self) -> int:
+        """Requests currently allowed in flight."""
+        return self._limit
+    
+    def record(self, latency: float, status: str):
+        """
+        Report one attempt.
+        
+        Args:
+            latency: Seconds the attempt took
+            status: HTTP status code as a string, 'timeout', 'connection_error'
+                or 'error'
+        """
+        with self._lock:
+            if self._ignore > 0:
+                self._ignore -= 1
+                return
+            if status in self.OVERLOAD_STATUSES:
+                self._decrease('throttled' if status == '429' else 'timeout')
+                return
+            
+            self._latencies.append(latency)
+            if status in self.ERROR_STATUSES:
+                self._errors += 1
+            if len(self._latencies) < max(self._limit, self.MIN_WINDOW):
+                return
+            
+            ordered = sorted(self._latencies)
+            p95 = ordered[(len(ordered) * 95 - 1) // 100]
+            error_rate = self._errors / len(ordered)
+            self._latencies = []
+            self._errors = 0
+            
+            if error_rate > self.MAX_ERROR_RATE:
+                self._decrease('errors')
+            elif p95 > self._target(p95):
+                self._decrease('latency')
+            elif self._limit < self.max_limit:
+                self._limit += 1
+                METRICS.set('snow_concurrency_limit', self._limit)
+                METRICS.inc('snow_concurrency_adjustments_total', direction='up', reason='healthy')
+    
+    def _target(self, p95: float) -> float:
+        """p95 latency allowed for a window, updating the baseline with its p95."""
+        if self.latency_target > 0:
+            return self.latency_target
+        
+        if self.baseline is None or p95 < self.baseline:
+            self.baseline = p95
+        target = self.baseline * self.LATENCY_TOLERANCE
+        self.baseline += (p95 - self.baseline) * self.BASELINE_DRIFT
+        return target
+    
+    def _decrease(self, reason: str):
+        """Cut the limit multiplicatively; the caller holds the lock."""
+        logger = logging.getLogger(__name__)
+        previous = self._limit
+        self._limit = max(self.min_limit, min(previous - 1, int(previous * self.BACKOFF)))
+        # Requests already in flight were sent at the previous limit
+        self._ignore = previous
+        self._latencies = []
+        self._errors = 0
+        
+        if self._limit != previous:
+            logger.info(f"Concurrency limit {previous} -> {self._limit} ({reason})")
+            METRICS.set('snow_concurrency_limit', self._limit)
+            METRICS.inc('snow_concurrency_adjustments_total', direction='down', reason=reason)
 
 
-def get_cmdb_records_by_environment(
-    client: ServiceNowClient,
-    environment: str
-) -> list:
+_concurrency_limits: Dict[Tuple, AdaptiveConcurrencyLimit] = {}
+_concurrency_limits_lock = threading.Lock()
+
+
+def get_concurrency_limit(
+    config: 'ServiceNowConfig',
+    max_limit: Optional[int] = None
+) -> Optional[AdaptiveConcurrencyLimit]:
     """
-    Retrieve all VM records for a specific environment.
+    Return the adaptive concurrency limit shared by clients of this instance.
+    
+    Clients with the same concurrency share one limit, so the limit never
+    grows past the requests its clients can actually keep in flight.
     
     Args:
-        client: ServiceNow API client
-        environment: Environment name (dev, prod, etc.)
-        
+        config: ServiceNow configuration
+        max_limit: Client's concurrency (default: config.max_concurrency)
+    
     Returns:
-        List of CMDB records
+        AdaptiveConcurrencyLimit, or None when adaptive concurrency is disabled
     """
-    logger = logging.getLogger(__name__)
-    logger.info(f"Querying CMDB records for environment: {environment}")
-    
-    params = {
-        'sysparm_query': f"environment={environment}",
-        'sysparm_display_value': 'true',
-        'sysparm_fields': 'sys_id,name,ip_address,state,environment'
-    }
-    
-    endpoint = f"table/{client.config.cmdb_table}"
-    success, response = client._make_request('GET', endpoint, params=params)
-    
-    if not success:
-        return []
+    if not config.adaptive_concurrency:
+        return None
     
-    records = response.get('result', [])
-    logger.info(f"Found {len(records)} records in environment: {environment}")
+    max_limit = max_limit or config.max_concurrency
+    key = (config.instance, config.username, max_limit)
+    with _concurrency_limits_lock:
+        limit = _concurrency_limits.get(key)
+        if limit is None:
+            limit = _concurrency_limits[key] = AdaptiveConcurrencyLimit(
+                config.min_concurrency,
+                max_limit,
+                config.concurrency_latency_target
+            )
     
-    return records
+    return limit
 
 
 #--------------------------------------------------------------
-# Validation Functions
+# Metrics and Tracing
 #--------------------------------------------------------------
 
-def validate_sync(
-    expected: Dict[str, Any], 
-    actual: Optional[Dict[str, Any]]
-) -> Tuple[bool, list]:
+# Histogram buckets in seconds, from a fast API call to a slow fleet run
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class MetricsRegistry:
     """
-    Validate that CMDB record matches expected values from Terraform/Morpheus.
+    Thread-safe counters, gauges and histograms with labels.
     
-    Args:
-        expected: Expected values from provisioning
-        actual: Actual values from CMDB
-        
-    Returns:
-        Tuple of (validation_passed: bool, discrepancies: list)
+    Rendered in the OpenMetrics text format, for a textfile collector
+    (write) or a scrape endpoint (render). Counter names end in _total.
     """
-    logger = logging.getLogger(__name__)
-    logger.info("Validating CMDB sync...")
     
-    discrepancies = []
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._values: Dict[str, Dict[Tuple, Any]] = {}
     
-    # Check if record exists
-    if actual is None:
-        discrepancies.append({
-            'field': 'record',
-            'expected': 'exists',
-            'actual': 'not found',
-            'severity': 'critical'
-        })
-        return False, discrepancies
+    def _register(self, name: str, kind: str, help_text: str, buckets: Tuple = ()):
+        with self._lock:
+            self._metrics[name] = {'type': kind, 'help': help_text, 'buckets': buckets}
+            self._values.setdefault(name, {})
     
-    # Define validation rules
-    validation_rules = {
-        'name': {
-            'required': True,
-            'severity': 'critical'
-        },
-        'ip_address': {
-            'required': False,
-            'severity': 'warning'
-        },
-        'cpu_count': {
-            'required': False,
-            'severity': 'warning',
-            'transform': lambda x: str(x) if x else None
-        },
-        'environment': {
-            'required': True,
-            'severity': 'high'
-        },
-        'state': {
-            'required': False,
-            'expected_values': ['On', 'Running', 'Powered On'],
-            'severity': 'warning'
-        }
-    }
+    def counter(self, name: str, help_text: str):
+        """Register a counter; the name must end in _total."""
+        if not name.endswith('_total'):
+            raise ValueError(f"Counter name must end in _total: {name}")
+        self._register(name, 'counter', help_text)
     
-    # Validate each field
-    for field, rules in validation_rules.items():
-        expected_value = expected.get(field)
-        actual_value = actual.get(field)
-        
-        # Apply transformation if specified
-        if 'transform' in rules and expected_value:
-            expected_value = rules['transform'](expected_value)
-        
-        # Skip if expected value not provided and not required
-        if expected_value is None and not rules.get('required'):
-            continue
-        
-        # Check for expected values list
-        if 'expected_values' in rules:
-            if actual_value not in rules['expected_values']:
-                discrepancies.append({
-                    'field': field,
-                    'expected': f"one of {rules['expected_values']}",
-                    'actual': actual_value,
-                    'severity': rules['severity']
-                })
-            continue
-        
-        # Standard comparison
-        if expected_value and str(expected_value) != str(actual_value):
-            discrepancies.append({
-                'field': field,
-                'expected': expected_value,
-                'actual': actual_value,
-                'severity': rules['severity']
-            })
+    def gauge(self, name: str, help_text: str):
+        """Register a gauge."""
+        self._register(name, 'gauge', help_text)
     
-    # Determine overall pass/fail
-    critical_issues = [d for d in discrepancies if d['severity'] == 'critical']
-    high_issues = [d for d in discrepancies if d['severity'] == 'high']
+    def histogram(self, name: str, help_text: str, buckets: Tuple = LATENCY_BUCKETS):
+        """Register a histogram with the given upper bounds."""
+        self._register(name, 'histogram', help_text, tuple(sorted(buckets)))
     
-    passed = len(critical_issues) == 0 and len(high_issues) == 0
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Add to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + amount
     
-    # Log results
-    if passed:
-        logger.info("[OK] CMDB validation PASSED")
-        if discrepancies:
-            logger.warning(f"  (with {len(discrepancies)} minor discrepancies)")
-    else:
-        logger.error("[FAIL] CMDB validation FAILED")
-        for d in discrepancies:
-            logger.error(f"  [{d['severity'].upper()}] {d['field']}: "
-                        f"expected '{d['expected']}', got '{d['actual']}'")
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name][key] = value
     
-    return passed, discrepancies
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation in a histogram."""
+        key = tuple(sorted(labels.items()))
+        buckets = self._metrics[name]['buckets']
+        with self._lock:
+            state = self._values[name].get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = self._values[name][key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            state[0][bisect_left(buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+    
+    def value(self, name: str, **labels) -> Any:
+        """Current value of a counter or gauge, or (sum, count) of a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values[name].get(key)
+            if self._metrics[name]['type'] == 'histogram':
+                return (state[1], state[2]) if state else (0.0, 0)
+            return state or 0
+    
+    def reset(self):
+        """Drop all recorded values, keeping registrations."""
+        with self._lock:
+            for values in self._values.values():
+                values.clear()
+    
+    def render(self) -> str:
+        """Render every metric in the OpenMetrics text format."""
+        lines = []
+        with self._lock:
+            for name, meta in self._metrics.items():
+                family = name[:-len('_total')] if meta['type'] == 'counter' else name
+                lines.append(f"# TYPE {family} {meta['type']}")
+                lines.append(f"# HELP {family} {meta['help']}")
+                
+                for key, state in sorted(self._values[name].items()):
+                    if meta['type'] != 'histogram':
+                        lines.append(f"{name}{_format_labels(key)} {_format_number(state)}")
+                        continue
+                    
+                    cumulative = 0
+                    bounds = list(meta['buckets']) + [float('inf')]
+                    for bound, hits in zip(bounds, state[0]):
+                        cumulative += hits
+                        labels = _format_labels(key + (('le', _format_number(bound)),))
+                        lines.append(f"{family}_bucket{labels} {cumulative}")
+                    lines.append(f"{family}_sum{_format_labels(key)} {_format_number(state[1])}")
+                    lines.append(f"{family}_count{_format_labels(key)} {state[2]}")
+        
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+    
+    def write(self, path: str):
+        """Write the rendered metrics to path, replacing it atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
 
 
-#--------------------------------------------------------------
+def _format_labels(key: Tuple) -> str:
+    if not key:
+        return ''
+    pairs = []
+    for label, value in key:
+        value = str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        pairs.append(f'{label}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def metrics_endpoint(endpoint: str) -> str:
+    """
+    Endpoint label for metrics, without the API prefix or record sys_ids.
+    
+    'table/incident/<sys_id>' becomes 'table/incident/{sys_id}' so each
+    table has one time series per operation instead of one per record.
+    """
+    parts = endpoint.strip('/').split('/')
+    if parts[:2] == ['api', 'now']:
+        parts = parts[3:]
+    if len(parts) > 2 and parts[0] == 'table':
+        parts = parts[:2] + ['{sys_id}']
+    return '/'.join(parts)
+
+
+# Process-wide registry, exported with --metrics-file or the daemon's /metrics
+METRICS = MetricsRegistry()
+METRICS.histogram(
+    'snow_request_duration_seconds',
+    'ServiceNow API latency per attempt, by method, endpoint and status.'
+)
+METRICS.counter(
+    'snow_request_retries_total',
+    'ServiceNow API retries, by method, endpoint and reason.'
+)
+METRICS.counter(
+    'snow_requests_coalesced_total',
+    'GETs answered without a network call, by endpoint and source (memo/inflight).'
+)
+METRICS.histogram(
+    'snow_rate_limit_wait_seconds',
+    'Time spent waiting on the client-side rate limiter before a request.'
+)
+METRICS.gauge(
+    'snow_concurrency_limit',
+    'Requests the async client currently allows in flight (adaptive concurrency).'
+)
+METRICS.counter(
+    'snow_concurrency_adjustments_total',
+    'Adaptive concurrency limit changes, by direction and reason.'
+)
+METRICS.counter(
+    'snow_request_bytes_total',
+    'Request body bytes sent to ServiceNow, by endpoint.'
+)
+METRICS.counter(
+    'snow_response_bytes_total',
+    'Response body bytes received from ServiceNow (compressed size), by endpoint.'
+)
+METRICS.counter(
+    'cmdb_records_fetched_total',
+    'CMDB records read from paged Table API queries, by endpoint.'
+)
+METRICS.gauge(
+    'cmdb_records_per_second',
+    'Records per second of the most recent paged query, by endpoint.'
+)
+METRICS.histogram(
+    'cmdb_validation_duration_seconds',
+    'Time to validate one VM (single) or a whole fleet (fleet).'
+)
+METRICS.counter(
+    'cmdb_validations_total',
+    'VMs validated, by result.'
+)
+
+
+class SpanRecorder:
+    """
+    Optional OpenTelemetry-style spans around the main workflow steps.
+    
+    Disabled until configured. Spans go to a JSON lines file (one span per
+    line with trace/span/parent ids, unix-nanosecond start and end times,
+    attributes and status), to the OpenTelemetry API when the
+    opentelemetry package is installed, or both. Exporters for the
+    OpenTelemetry API are set up the usual way (e.g. opentelemetry-instrument).
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self._file = None
+        self._tracer = None
+        self._lock = threading.Lock()
+        self._current = contextvars.ContextVar('cmdb_span', default=None)
+    
+    def configure(self, trace_file: str = '', otel: bool = False):
+        """Enable the JSON lines sink and/or the OpenTelemetry API."""
+        logger = logging.getLogger(__name__)
+        self.close()
+        
+        if trace_file:
+            self._file = open(trace_file, 'a', encoding='utf-8')
+        if otel:
+            # Optional, and only imported when spans are wanted
+            try:
+                from opentelemetry import trace as otel_trace
+            except ImportError:
+                logger.warning("opentelemetry is not installed - OpenTelemetry spans disabled")
+            else:
+                self._tracer = otel_trace.get_tracer(__name__)
+        
+        self.enabled = bool(self._file or self._tracer)
+    
+    def close(self):
+        """Flush and disable all sinks."""
+        self.enabled = False
+        self._tracer = None
+        if self._file:
+            self._file.close()
+            self._file = None
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Record the enclosed block as a span (no-op while disabled)."""
+        if not self.enabled:
+            yield
+            return
+        
+        # OpenTelemetry only accepts primitive attribute values
+        attributes = {
+            k: v if isinstance(v, (str, bool, int, float)) else str(v)
+            for k, v in attributes.items() if v is not None
+        }
+        parent = self._current.get()
+        trace_id = parent[0] if parent else os.urandom(16).hex()
+        span_id = os.urandom(8).hex()
+        token = self._current.set((trace_id, span_id))
+        otel_span = (
+            self._tracer.start_as_current_span(name, attributes=attributes)
+            if self._tracer else nullcontext()
+        )
+        
+        start = time.time_ns()
+        status = 'OK'
+        try:
+            with otel_span:
+                yield
+        except Exception:
+            status = 'ERROR'
+            raise
+        finally:
+            self._current.reset(token)
+            if self._file:
+                line = json.dumps({
+                    'name': name,
+                    'trace_id': trace_id,
+                    'span_id': span_id,
+                    'parent_span_id': parent[1] if parent else None,
+                    'start_time_unix_nano': start,
+                    'end_time_unix_nano': time.time_ns(),
+                    'attributes': attributes,
+                    'status': status
+                }, default=str)
+                with self._lock:
+                    if self._file:
+                        self._file.write(line + '\n')
+                        self._file.flush()
+
+
+TRACER = SpanRecorder()
+
+
+def traced(name: str, *attribute_args: str):
+    """
+    Decorator that wraps each call in a TRACER span.
+    
+    Args:
+        name: Span name
+        attribute_args: Argument names recorded as span attributes
+    """
+    def decorator(func):
+        signature = None
+        signature_lock = threading.Lock()
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal signature
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            # Resolved on first traced call so untraced runs never load inspect;
+            # the lock keeps worker threads from racing that lazy import
+            if signature is None:
+                with signature_lock:
+                    if signature is None:
+                        signature = inspect.signature(func)
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            attributes = {a: arguments.get(a) for a in attribute_args}
+            with TRACER.span(name, **attributes):
+                return func(*args, **kwargs)
+        
+        return wrapper
+    return decorator
+
+
+#--------------------------------------------------------------
+# Logging Setup
+#--------------------------------------------------------------
+
+def setup_logging(verbose: bool = False) -> logging.Logger:
+    """Configure logging with appropriate level and format."""
+    level = logging.DEBUG if verbose else logging.INFO
+    
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s | %(levelname)-8s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    
+    return logging.getLogger(__name__)
+
+
+#--------------------------------------------------------------
+# JSON Decoding
+#--------------------------------------------------------------
+
+# Optional decoders for API responses, most preferred first; 'json' (the
+# standard library) is always available and is the fallback
+FAST_JSON_DECODERS = ('orjson', 'ujson')
+
+_json_decoders: Dict[str, Any] = {}
+_json_decoders_lock = threading.Lock()
+
+
+def _fast_loads(loads):
+    """Wrap a fast decoder so documents it rejects are retried with json.loads."""
+    def decode(data: bytes) -> Any:
+        try:
+            return loads(data)
+        except ValueError:
+            # Valid JSON outside the fast decoder's range (NaN, huge integers)
+            # decodes; invalid JSON raises the standard json error
+            return json.loads(data)
+    return decode
+
+
+def get_json_decoder(name: str = 'auto') -> Tuple[str, Any]:
+    """
+    Resolve a JSON decoder backend, importing it once on first use.
+    
+    Runs that never decode an API response never import a backend. A named
+    backend that is not installed falls back to the standard library with
+    a warning.
+    
+    Args:
+        name: 'auto' (first installed of FAST_JSON_DECODERS), 'orjson',
+            'ujson' or 'json'
+        
+    Returns:
+        Tuple of (backend name, loads function taking UTF-8 bytes and
+        raising ValueError on invalid JSON)
+        
+    Raises:
+        ValueError: If name is not a known backend
+    """
+    resolved = _json_decoders.get(name)
+    if resolved is not None:
+        return resolved
+    
+    if name not in ('auto', 'json', *FAST_JSON_DECODERS):
+        raise ValueError(
+            f"Unknown JSON decoder '{name}' "
+            f"(expected one of auto, json, {', '.join(FAST_JSON_DECODERS)})"
+        )
+    
+    with _json_decoders_lock:
+        resolved = _json_decoders.get(name)
+        if resolved is None:
+            resolved = ('json', json.loads)
+            for candidate in (FAST_JSON_DECODERS if name == 'auto' else (name,)):
+                if candidate == 'json':
+                    break
+                if importlib.util.find_spec(candidate) is None:
+                    if name != 'auto':
+                        logging.getLogger(__name__).warning(
+                            f"JSON decoder '{name}' is not installed - using json"
+                        )
+                    continue
+                module = importlib.import_module(candidate)
+                resolved = (candidate, _fast_loads(module.loads))
+                break
+            _json_decoders[name] = resolved
+    
+    return resolved
+
+
+#--------------------------------------------------------------
+# Request Coalescing
+#--------------------------------------------------------------
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, Future] = {}
+    
+    def do(self, key: Any, fn, *args, **kwargs) -> Any:
+        """
+        Run fn once per key at a time; concurrent callers share its result.
+        
+        Exceptions raised by fn propagate to every waiting caller.
+        """
+        return self.do_shared(key, fn, *args, **kwargs)[0]
+    
+    def do_shared(self, key: Any, fn, *args, **kwargs) -> Tuple[Any, bool]:
+        """Like do(), also returning whether the result came from another caller's run."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        
+        if not leader:
+            return call.result(), True
+        
+        try:
+            call.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        
+        return call.result(), False
+
+
+class ResponseMemo:
+    """
+    Short-lived, size-bounded LRU cache of parsed GET responses.
+    
+    Entries expire ttl seconds after they are stored. The least recently
+    used entries are evicted once there are more than max_entries, or once
+    their response bodies add up to more than max_bytes. Keys start with
+    a scope (the table) so writes can drop the reads they make stale.
+    Cached responses are shared between callers and must not be modified.
+    """
+    
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple, Tuple[float, int, Any]]' = OrderedDict()
+        self._bytes = 0
+    
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+    
+    def put(self, key: Tuple, value: Any, size: int):
+        """Store a value, evicting least recently used entries over the limits."""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+    
+    def invalidate(self, scope: str):
+        """Drop every entry in a scope."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == scope]:
+                self._drop(key)
+    
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _drop(self, key: Tuple):
+        self._bytes -= self._entries.pop(key)[1]
+
+
+def memo_scope(endpoint: str) -> str:
+    """Scope of an endpoint for ResponseMemo: 'table/<name>', or the endpoint itself."""
+    return '/'.join(metrics_endpoint(endpoint).split('/')[:2])
+
+
+#--------------------------------------------------------------
+# ServiceNow API Client
+#--------------------------------------------------------------
+
+class ServiceNowClient:
+    """Client for interacting with ServiceNow REST API."""
+    
+    def __init__(self, config: ServiceNowConfig, pool_size: Optional[int] = None):
+        self.config = config
+        # Connections kept for concurrent use (the async client's limit)
+        self.pool_size = pool_size or config.max_concurrency
+        # Created on first request so cache hits never load requests
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.rate_limiter = get_rate_limiter(config)
+        self.concurrency = get_concurrency_limit(config, self.pool_size)
+        self.rules = get_validation_rules(config.rules_path)
+        self.inflight = SingleFlight()
+        self.memo = (
+            ResponseMemo(config.memo_ttl, config.memo_size, config.memo_max_bytes)
+            if config.memo_ttl > 0 else None
+        )
+        self.cache = (
+            CMDBCache(config.cache_path, config.cache_ttl)
+            if config.cache_path else None
+        )
+        self.export = (
+            open_cmdb_export(config.cmdb_export_path, config.cmdb_table)
+            if config.cmdb_export_path else None
+        )
+        self.incident_index = (
+            IncidentIndex(config.incident_index_path)
+            if config.incident_dedup else None
+        )
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def session(self) -> 'requests.Session':
+        """HTTP session, built on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.auth = requests.auth.HTTPBasicAuth(
+                        self.config.username, self.config.password
+                    )
+                    session.headers.update({
+                        'Content-Type': 'application/json',
+                        'Accept': 'application/json',
+                        # Compressed responses; requests decodes them transparently
+                        'Accept-Encoding': 'gzip, deflate'
+                    })
+                    
+                    # Size the connection pool for concurrent use from worker threads
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_maxsize=self.pool_size
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+    
+    @property
+    def decode_json(self):
+        """loads(bytes) of the configured JSON decoder, imported on first use."""
+        return get_json_decoder(self.config.json_decoder)[1]
+    
+    def close(self):
+        """Close the HTTP session if one was opened, and any CMDB export."""
+        if self._session is not None:
+            self._session.close()
+        if self.export is not None:
+            self.export.close()
+    
+    def _make_request(
+        self, 
+        method: str, 
+        endpoint: str, 
+        params: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        memoize: bool = True,
+        decode: bool = True
+    ) -> Tuple[bool, Dict]:
+        """
+        Make HTTP request to ServiceNow API with retry logic.
+        
+        Identical GETs in flight at the same time share one call, and
+        successful GET responses are memoized for config.memo_ttl seconds.
+        The shared response must not be modified. Successful writes drop
+        memoized reads of the same table (all of them for the Batch API).
+        
+        Args:
+            memoize: Use the memo for this GET; False for reads that must
+                see the latest data, which are still coalesced in flight
+            decode: Parse the response body; False returns the raw bytes on
+                success so the caller can decode them on another thread
+        
+        Returns:
+            Tuple of (success: bool, response_data: dict)
+        """
+        scope = memo_scope(endpoint)
+        if method != 'GET':
+            success, body, _ = self._send(method, endpoint, params, data, decode)
+            if success and self.memo is not None:
+                if endpoint == self.config.batch_endpoint:
+                    self.memo.clear()
+                else:
+                    self.memo.invalidate(scope)
+            return success, body
+        
+        key = (scope, endpoint, json.dumps(params, sort_keys=True, default=str), decode)
+        memo = self.memo if memoize else None
+        if memo is not None:
+            body = memo.get(key)
+            if body is not None:
+                METRICS.inc('snow_requests_coalesced_total', endpoint=scope, source='memo')
+                return True, body
+        
+        result, shared = self.inflight.do_shared(
+            key, self._fetch, key, endpoint, params, memo, decode
+        )
+        if shared:
+            METRICS.inc('snow_requests_coalesced_total', endpoint=scope, source='inflight')
+        return result
+    
+    def _fetch(
+        self,
+        key: Tuple,
+        endpoint: str,
+        params: Optional[Dict],
+        memo: Optional[ResponseMemo],
+        decode: bool = True
+    ) -> Tuple[bool, Dict]:
+        """GET on behalf of every caller waiting on the same key."""
+        success, body, size = self._send('GET', endpoint, params, decode=decode)
+        if success and memo is not None:
+            memo.put(key, body, size)
+        return success, body
+    
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        decode: bool = True
+    ) -> Tuple[bool, Dict, int]:
+        """
+        Send one request over the network, retrying transient failures.
+        
+        Returns:
+            Tuple of (success: bool, response_data: dict, body_bytes: int);
+            response_data is the raw body on success when decode is False.
+            A failure answered with a permanent HTTP status carries it as
+            status_code; timeouts and exhausted retries have none
+        """
+        loads = self.decode_json if decode else None
+        
+        # Endpoints starting with '/' are paths from the instance root
+        if endpoint.startswith('/'):
+            url = f"{self.config.instance_url}{endpoint}"
+        else:
+            url = f"{self.config.base_url}/{endpoint}"
+        policy = self.config.retry_policy
+        policy.record_request()
+        label = metrics_endpoint(endpoint)
+        
+        for attempt in range(policy.max_attempts):
+            retry_after = None
+            reason = None
+            
+            # Every attempt, retries included, counts against the rate limit
+            if self.rate_limiter:
+                waited = self.rate_limiter.acquire()
+                if waited > 0:
+                    self.logger.debug(f"Rate limited: waited {waited:.3f}s")
+                    METRICS.observe('snow_rate_limit_wait_seconds', waited)
+            
+            started = time.perf_counter()
+            try:
+                self.logger.debug(f"API Request: {method} {url}")
+                
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    json=data,
+                    timeout=self.config.timeout
+                )
+                
+                # Log response status
+                elapsed = time.perf_counter() - started
+                self.logger.debug(
+                    f"Response Status: {response.status_code} ({elapsed * 1000:.1f}ms)"
+                )
+                self._record_metrics(method, label, response, elapsed)
+                if self.concurrency is not None:
+                    self.concurrency.record(elapsed, str(response.status_code))
+                
+                # Handle response
+                if response.status_code in (200, 201):
+                    if loads is None:
+                        return True, response.content, len(response.content)
+                    try:
+                        return True, loads(response.content), len(response.content)
+                    except ValueError as e:
+                        self.logger.error(f"Invalid JSON response: {e}")
+                        return False, {"error": f"Invalid JSON response: {e}"}, 0
+                elif response.status_code == 401:
+                    self.logger.error("Authentication failed - check credentials")
+                    return False, {"error": "Authentication failed", "status_code": 401}, 0
+                elif response.status_code == 404:
+                    self.logger.warning("Resource not found")
+                    return False, {"error": "Not found", "status_code": 404}, 0
+                elif not policy.is_retryable(response.status_code):
+                    self.logger.error(
+                        f"Request failed with status {response.status_code}: "
+                        f"{response.text[:200]}"
+                    )
+                    return False, {
+                        "error": f"HTTP {response.status_code}",
+                        "status_code": response.status_code
+                    }, 0
+                else:
+                    self.logger.warning(
+                        f"Request failed with status {response.status_code}: "
+                        f"{response.text[:200]}"
+                    )
+                    retry_after = policy.parse_retry_after(
+                        response.headers.get('Retry-After')
+                    )
+                    reason = str(response.status_code)
+                    
+            except requests.exceptions.Timeout:
+                self.logger.warning(f"Request timeout (attempt {attempt + 1})")
+                reason = 'timeout'
+            except requests.exceptions.ConnectionError as e:
+                self.logger.warning(f"Connection error (attempt {attempt + 1}): {e}")
+                reason = 'connection_error'
+            except requests.exceptions.RequestException as e:
+                self.logger.error(f"Request failed: {e}")
+                elapsed = time.perf_counter() - started
+                METRICS.observe(
+                    'snow_request_duration_seconds', elapsed,
+                    method=method, endpoint=label, status='error'
+                )
+                if self.concurrency is not None:
+                    self.concurrency.record(elapsed, 'error')
+                return False, {"error": str(e)}, 0
+            
+            if reason in ('timeout', 'connection_error'):
+                elapsed = time.perf_counter() - started
+                METRICS.observe(
+                    'snow_request_duration_seconds', elapsed,
+                    method=method, endpoint=label, status=reason
+                )
+                if self.concurrency is not None:
+                    self.concurrency.record(elapsed, reason)
+            
+            # Wait before retry
+            if attempt < policy.max_attempts - 1:
+                if not policy.acquire_retry():
+                    self.logger.error("Retry budget exhausted - not retrying")
+                    return False, {"error": "Retry budget exhausted"}, 0
+                METRICS.inc(
+                    'snow_request_retries_total', method=method, endpoint=label, reason=reason
+                )
+                delay = policy.compute_delay(attempt, retry_after)
+                self.logger.debug(f"Retrying in {delay:.2f}s (attempt {attempt + 2})")
+                time.sleep(delay)
+        
+        return False, {"error": "Max retries exceeded"}, 0
+    
+    def _record_metrics(
+        self,
+        method: str,
+        endpoint: str,
+        response: 'requests.Response',
+        elapsed: float
+    ):
+        """Record latency and bytes for one response."""
+        METRICS.observe(
+            'snow_request_duration_seconds', elapsed,
+            method=method, endpoint=endpoint, status=str(response.status_code)
+        )
+        
+        # Content-Length is the size on the wire, before gzip decoding
+        received = response.headers.get('Content-Length')
+        METRICS.inc(
+            'snow_response_bytes_total',
+            int(received) if received else len(response.content),
+            endpoint=endpoint
+        )
+        body = response.request.body if response.request is not None else None
+        if body:
+            METRICS.inc('snow_request_bytes_total', len(body), endpoint=endpoint)
+
+
+class AsyncServiceNowClient:
+    """
+    Asyncio client for ServiceNow REST API with bounded parallelism.
+    
+    Requests run on a thread pool over a pooled ServiceNowClient session,
+    so retries and status-code handling match the synchronous client.
+    At most max_concurrency requests are in flight at any time; with
+    adaptive concurrency enabled, the limit within that follows the
+    client's AdaptiveConcurrencyLimit, which is capped at the client's
+    pool size (max_concurrency unless a client is passed in).
+    """
+    
+    def __init__(
+        self,
+        config: ServiceNowConfig,
+        max_concurrency: Optional[int] = None,
+        client: Optional[ServiceNowClient] = None
+    ):
+        self.config = config
+        # Kept on the instance; the caller's config is left unchanged
+        self.max_concurrency = (
+            max_concurrency or (client.pool_size if client else config.max_concurrency)
+        )
+        # A caller's client (and its incident index) is shared, not closed
+        self._owns_client = client is None
+        self.client = client or ServiceNowClient(config, pool_size=self.max_concurrency)
+        self.cache = self.client.cache
+        self.export = self.client.export
+        self.incident_index = self.client.incident_index
+        self.rules = self.client.rules
+        self.concurrency = self.client.concurrency
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix='snow'
+        )
+        self._slots = None
+        self._in_flight = 0
+    
+    @property
+    def limit(self) -> int:
+        """Requests currently allowed in flight."""
+        if self.concurrency is None:
+            return self.max_concurrency
+        return min(self.concurrency.limit, self.max_concurrency)
+    
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        data: Optional[Dict] = None
+    ) -> Tuple[bool, Dict]:
+        """
+        Make HTTP request to ServiceNow API without blocking the event loop.
+        
+        Returns:
+            Tuple of (success: bool, response_data: dict)
+        """
+        # Created on first use so it binds to the running event loop. A
+        # condition rather than a semaphore, since the limit changes.
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+        
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                partial(self.client._make_request, method, endpoint, params, data)
+            )
+        finally:
+            async with self._slots:
+                self._in_flight -= 1
+                # Wake as many waiters as now fit - the limit may have grown
+                self._slots.notify(max(self.limit - self._in_flight, 0))
+    
+    def close(self):
+        """Release worker threads and pooled connections."""
+        self._executor.shutdown(wait=True)
+        if self._owns_client:
+            self.client.close()
+    
+    async def __aenter__(self) -> 'AsyncServiceNowClient':
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+#--------------------------------------------------------------
+# CMDB Snapshot Cache
+#--------------------------------------------------------------
+
+class CMDBCache:
+    """
+    On-disk SQLite cache of CMDB records, keyed by sys_id and name.
+    
+    Entries expire after ttl seconds. refresh() pulls only records whose
+    sys_updated_on is newer than the last sync watermark. An incremental
+    refresh cannot see deleted or renamed CIs, so unchanged entries keep
+    their age; once the last full load is older than the TTL, refresh()
+    does a full load instead, which re-stamps every record it returns and
+    drops the ones it did not.
+    """
+    
+    # Re-read this much before the watermark to absorb clock skew
+    WATERMARK_OVERLAP = timedelta(minutes=2)
+    
+    def __init__(self, path: str, ttl: int = 300):
+        self.path = path
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS records (
+                sys_id TEXT PRIMARY KEY,
+                name TEXT,
+                environment TEXT,
+                sys_updated_on TEXT,
+                fetched_at REAL,
+                data TEXT
+            );
+            CREATE INDEX IF NOT EXISTS records_name ON records (name);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+    
+    def get(self, name: str) -> Optional[Dict]:
+        """Return the cached record for a VM name, or None if missing/expired."""
+        return self.get_many([name]).get(name)
+    
+    def get_many(self, names: List[str]) -> Dict[str, Dict]:
+        """Return unexpired cached records for the given VM names."""
+        cutoff = time.time() - self.ttl
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT name, data FROM records "
+                    f"WHERE fetched_at >= ? AND name IN ({','.join('?' * len(chunk))})",
+                    [cutoff, *chunk]
+                )
+                for name, data in rows:
+                    found.setdefault(name, json.loads(data))
+        return found
+    
+    def put(self, record: Dict):
+        """Store or replace a single record."""
+        self.put_many([record])
+    
+    def put_many(self, records: Iterable[Dict]):
+        """Store or replace records in one transaction."""
+        now = time.time()
+        rows = [
+            (r.get('sys_id'), r.get('name'), r.get('environment'),
+             r.get('sys_updated_on'), now, json.dumps(r, default=json_default))
+            for r in records if r.get('sys_id')
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+    
+    def evict_expired(self) -> int:
+        """Delete expired entries and return how many were removed."""
+        cutoff = time.time() - self.ttl
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM records WHERE fetched_at < ?", (cutoff,)
+            )
+        return cursor.rowcount
+    
+    def get_watermark(self, scope: str) -> Optional[str]:
+        """Return the last sync watermark for a scope, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (f"watermark:{scope}",)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set_watermark(self, scope: str, watermark: str):
+        """Record the sync watermark for a scope."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                (f"watermark:{scope}", watermark)
+            )
+    
+    def refresh(
+        self,
+        client: 'ServiceNowClient',
+        environment: Optional[str] = None
+    ) -> int:
+        """
+        Pull records changed since the last watermark into the cache.
+        
+        The first refresh of a scope, one after the watermark is lost and
+        one whose last full load is older than the TTL are full loads.
+        Watermarks are taken from the local UTC clock, so the integration
+        user's timezone should be UTC.
+        
+        Args:
+            client: ServiceNow API client
+            environment: Limit the refresh to one environment
+            
+        Returns:
+            Number of records fetched
+            
+        Raises:
+            RuntimeError: If a page fails; the watermark is left where it
+                was and a full load drops nothing
+        """
+        scope = f"{client.config.cmdb_table}:{environment or '*'}"
+        watermark = self.get_watermark(scope)
+        last_full_load = float(self.get_watermark(f"full:{scope}") or 0)
+        load_started = time.time()
+        if load_started - last_full_load >= self.ttl:
+            watermark = None
+        started = datetime.now(timezone.utc) - self.WATERMARK_OVERLAP
+        
+        self.logger.info(
+            f"Refreshing CMDB cache for {scope} "
+            f"({'since ' + watermark if watermark else 'full load'})"
+        )
+        
+        fetched = 0
+        batch = []
+        for record in get_cmdb_records_changed_since(
+            client, watermark, environment, strict=True
+        ):
+            batch.append(record)
+            if len(batch) >= client.config.page_size:
+                self.put_many(batch)
+                fetched += len(batch)
+                batch = []
+        self.put_many(batch)
+        fetched += len(batch)
+        
+        if watermark is None:
+            # Every live record was just stored; anything older is gone
+            # from the CMDB (deleted, renamed or moved out of the scope)
+            with self._lock, self._conn:
+                if environment:
+                    cursor = self._conn.execute(
+                        "DELETE FROM records WHERE fetched_at < ? AND environment = ?",
+                        (load_started, environment)
+                    )
+                else:
+                    cursor = self._conn.execute(
+                        "DELETE FROM records WHERE fetched_at < ?", (load_started,)
+                    )
+            if cursor.rowcount:
+                self.logger.info(f"Dropped {cursor.rowcount} records no longer in the CMDB")
+            self.set_watermark(f"full:{scope}", str(load_started))
+        
+        self.set_watermark(scope, started.strftime('%Y-%m-%d %H:%M:%S'))
+        self.logger.info(f"CMDB cache refresh complete: {fetched} records updated")
+        
+        return fetched
+    
+    def close(self):
+        """Close the underlying database."""
+        self._conn.close()
+
+
+#--------------------------------------------------------------
+# CMDB Export Files
+#--------------------------------------------------------------
+
+class CMDBExport(abc.ABC):
+    """
+    Read-only CMDB data source backed by a bulk export of the CMDB table.
+    
+    The export is memory-mapped rather than loaded. The first open scans it
+    once and saves a compact name -> (offset, length) hash table next to it
+    as <export>.idx; later opens map that file, so a lookup is one hash
+    probe plus decoding a single record. The index is rebuilt whenever the
+    export's size or modification time changes.
+    
+    Subclasses implement _records() and _decode() for one file format.
+    """
+    
+    INDEX_MAGIC = b'CMDBIDX1'
+    # magic, export size, export mtime_ns, slot count, record count
+    INDEX_HEADER = struct.Struct('<8sQqQQ')
+    # name hash, record offset, record length (0 marks an empty slot)
+    INDEX_SLOT = struct.Struct('<QQI')
+    
+    def __init__(self, path: str, table: str = 'cmdb_ci_vm_instance'):
+        self.path = path
+        self.table = table
+        self.logger = logging.getLogger(__name__)
+        self._file = open(path, 'rb')
+        # Zero-length files cannot be mapped
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        )
+        self._index = None
+        self._slots = 0
+        self.count = 0
+        self._load_index()
+        # Lookups touch one record each; readahead would only bloat RSS
+        self._advise(self._data, 'MADV_RANDOM')
+    
+    @staticmethod
+    def _advise(mapping: Any, advice: str):
+        """Give the kernel an access pattern hint where madvise is available."""
+        if isinstance(mapping, mmap.mmap) and hasattr(mmap, advice):
+            mapping.madvise(getattr(mmap, advice))
+    
+    @staticmethod
+    def _hash(name: str) -> int:
+        """Stable 64-bit hash (hash() is salted per process, so cannot be saved)."""
+        return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'little')
+    
+    @staticmethod
+    def _raw_values(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce reference fields ({'value': ..., 'link': ...}) to their raw value."""
+        return {
+            k: v.get('value', '') if isinstance(v, dict) else v
+            for k, v in record.items()
+        }
+    
+    @staticmethod
+    def _project(record: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+        """Keep only the requested fields, like sysparm_fields on the API."""
+        if fields is None:
+            return record
+        return {f: record[f] for f in fields if f in record}
+    
+    @abc.abstractmethod
+    def _records(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """Yield (offset, length, record) for every record in file order."""
+    
+    @abc.abstractmethod
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        """Decode the bytes of one record."""
+    
+    def _load_index(self):
+        """Map the saved index, or build it if missing or stale."""
+        stat = os.stat(self.path)
+        index_path = f"{self.path}.idx"
+        try:
+            with open(index_path, 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, size, mtime, slots, count = self.INDEX_HEADER.unpack_from(index)
+            expected_length = self.INDEX_HEADER.size + slots * self.INDEX_SLOT.size
+            if (magic == self.INDEX_MAGIC and size == stat.st_size
+                    and mtime == stat.st_mtime_ns and len(index) == expected_length):
+                self._advise(index, 'MADV_RANDOM')
+                self._index, self._slots, self.count = index, slots, count
+                self.logger.info(f"Loaded index of {count} records for {self.path}")
+                return
+            index.close()
+        except (OSError, ValueError, struct.error):
+            pass
+        
+        self._build_index(stat, index_path)
+    
+    def _build_index(self, stat: os.stat_result, index_path: str):
+        """Scan the export once and save an open-addressing hash table."""
+        started = time.perf_counter()
+        # Compact arrays, not a dict: ~20 bytes per record while building
+        hashes, offsets, lengths = array('Q'), array('Q'), array('I')
+        self._advise(self._data, 'MADV_SEQUENTIAL')
+        for offset, length, record in self._records():
+            name = record.get('name')
+            if name:
+                hashes.append(self._hash(name))
+                offsets.append(offset)
+                lengths.append(length)
+        
+        # Power of two at least twice the record count keeps probes short
+        slots = 1 << max(4, (2 * len(hashes) - 1).bit_length())
+        mask = slots - 1
+        header_size, slot_size = self.INDEX_HEADER.size, self.INDEX_SLOT.size
+        table = bytearray(header_size + slots * slot_size)
+        
+        count = 0
+        for name_hash, offset, length in zip(hashes, offsets, lengths):
+            i = name_hash & mask
+            while True:
+                position = header_size + i * slot_size
+                slot_hash, slot_offset, slot_length = self.INDEX_SLOT.unpack_from(table, position)
+                if not slot_length:
+                    self.INDEX_SLOT.pack_into(table, position, name_hash, offset, length)
+                    count += 1
+                    break
+                # First record wins if the export holds duplicate names
+                if slot_hash == name_hash and (
+                    self._name_at(slot_offset, slot_length) == self._name_at(offset, length)
+                ):
+                    break
+                i = (i + 1) & mask
+        
+        self.INDEX_HEADER.pack_into(
+            table, 0, self.INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, slots, count
+        )
+        self._index, self._slots, self.count = table, slots, count
+        
+        try:
+            temp_path = f"{index_path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(table)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            # Read-only export directory: keep the index for this run only
+            self.logger.warning(f"Could not save index {index_path}: {e}")
+        
+        self.logger.info(
+            f"Indexed {count} records in {self.path} "
+            f"({time.perf_counter() - started:.1f}s)"
+        )
+    
+    def _name_at(self, offset: int, length: int) -> Optional[str]:
+        """Name of the record stored at offset."""
+        return self._decode(self._data[offset:offset + length]).get('name')
+    
+    def get(self, name: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """
+        Look up one record by name.
+        
+        Args:
+            name: VM name
+            fields: Fields to return (all fields if None)
+            
+        Returns:
+            The record, or None if the export has no VM of that name
+        """
+        if not self._slots:
+            return None
+        
+        name_hash = self._hash(name)
+        mask = self._slots - 1
+        i = name_hash & mask
+        while True:
+            slot_hash, offset, length = self.INDEX_SLOT.unpack_from(
+                self._index, self.INDEX_HEADER.size + i * self.INDEX_SLOT.size
+            )
+            if not length:
+                return None
+            if slot_hash == name_hash:
+                record = self._decode(self._data[offset:offset + length])
+                if record.get('name') == name:
+                    return self._project(record, fields)
+            i = (i + 1) & mask
+    
+    def get_many(
+        self,
+        names: Iterable[str],
+        fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, Dict]:
+        """Look up many records by name; missing VMs are omitted."""
+        fields = list(fields) if fields is not None else None
+        found = {}
+        for name in names:
+            record = self.get(name, fields)
+            if record is not None:
+                found[name] = record
+        return found
+    
+    def scan(self, fields: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """Stream every record in file order, one at a time."""
+        fields = list(fields) if fields is not None else None
+        self._advise(self._data, 'MADV_SEQUENTIAL')
+        try:
+            for _, _, record in self._records():
+                yield self._project(record, fields)
+        finally:
+            self._advise(self._data, 'MADV_RANDOM')
+    
+    def close(self):
+        """Unmap the export and its index."""
+        for mapping in (self._index, self._data):
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+        self._file.close()
+
+
+class NDJSONExport(CMDBExport):
+    """Newline-delimited JSON export: one record object per line."""
+    
+    def _records(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        data = self._data
+        size = len(data)
+        position = 0
+        while position < size:
+            end = data.find(b'\n', position)
+            if end < 0:
+                end = size
+            line = data[position:end]
+            if line.strip():
+                yield position, end - position, self._decode(line)
+            position = end + 1
+    
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        return self._raw_values(json.loads(raw))
+
+
+class JSONExport(CMDBExport):
+    """
+    JSON export: a top-level array of records, or an object holding them
+    under "records" (JSONv2 unload) or "result" (Table API response).
+    
+    Records are decoded one at a time from a sliding window over the map.
+    """
+    
+    ARRAY_START = re.compile(rb'\A\s*\[|"(?:records|result)"\s*:\s*\[')
+    WINDOW = 1 << 20
+    # A record this large means the file is malformed, not that it continues
+    MAX_RECORD_SIZE = 16 << 20
+    
+    def _records(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        data = self._data
+        match = self.ARRAY_START.search(data)
+        if not match:
+            raise ValueError(f"No array of records found in {self.path}")
+        
+        decoder = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        read_at = match.end()
+        offset = read_at
+        buf = ''
+        pos = 0
+        
+        while True:
+            # Separators are one byte each, so offset tracks them directly
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+                offset += 1
+            if pos == len(buf):
+                if read_at >= len(data):
+                    raise ValueError(f"Unterminated array of records in {self.path}")
+                buf = utf8.decode(data[read_at:read_at + self.WINDOW])
+                pos = 0
+                read_at += self.WINDOW
+                continue
+            if buf[pos] == ']':
+                return
+            
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if read_at >= len(data) or len(buf) - pos > self.MAX_RECORD_SIZE:
+                    raise ValueError(f"Invalid JSON record at byte {offset} in {self.path}: {e}")
+                # The record continues past the window
+                buf = buf[pos:] + utf8.decode(data[read_at:read_at + self.WINDOW])
+                pos = 0
+                read_at += self.WINDOW
+                continue
+            
+            length = len(buf[pos:end].encode('utf-8'))
+            if isinstance(record, dict):
+                yield offset, length, self._raw_values(record)
+            offset += length
+            pos = end
+    
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        return self._raw_values(json.loads(raw))
+
+
+class CSVExport(CMDBExport):
+    """CSV export with a header row of field names (quoted fields may span lines)."""
+    
+    def __init__(self, path: str, table: str = 'cmdb_ci_vm_instance'):
+        self._header = None
+        super().__init__(path, table)
+    
+    def _spans(self, position: int = 0) -> Iterator[Tuple[int, int]]:
+        """Yield (offset, length) of each CSV row, keeping quoted newlines inside it."""
+        data = self._data
+        size = len(data)
+        while position < size:
+            end = position
+            quotes = 0
+            while True:
+                newline = data.find(b'\n', end)
+                newline = size if newline < 0 else newline + 1
+                quotes += data[end:newline].count(b'"')
+                end = newline
+                if quotes % 2 == 0 or end >= size:
+                    break
+            yield position, end - position
+            position = end
+    
+    @property
+    def _columns(self) -> Tuple[List[str], int]:
+        """Field names and the offset of the first data row."""
+        if self._header is None:
+            first = next(self._spans(), (0, 0))
+            row = next(csv.reader([bytes(self._data[:first[1]]).decode('utf-8-sig')]), [])
+            if 'name' not in row:
+                raise ValueError(f"CSV export {self.path} has no 'name' column")
+            self._header = (row, first[1])
+        return self._header
+    
+    def _records(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        for offset, length in self._spans(self._columns[1]):
+            record = self._decode(self._data[offset:offset + length])
+            if record:
+                yield offset, length, record
+    
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        row = next(csv.reader([raw.decode('utf-8')]), [])
+        return dict(zip(self._columns[0], row)) if row else {}
+
+
+class XMLExport(CMDBExport):
+    """
+    XML export: an unload document with one <table_name> element per
+    record, or a Table API response with one <result> element per record.
+    """
+    
+    def _records(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        pattern = re.compile(
+            rb'<(' + re.escape(self.table.encode()) + rb'|result)[\s>].*?</\1\s*>', re.S
+        )
+        for match in pattern.finditer(self._data):
+            yield match.start(), match.end() - match.start(), self._decode(match.group())
+    
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        element = ElementTree.fromstring(raw)
+        return {child.tag: child.text or '' for child in element}
+
+
+# Export readers by file extension
+CMDB_EXPORT_FORMATS = {
+    '.json': JSONExport,
+    '.ndjson': NDJSONExport,
+    '.jsonl': NDJSONExport,
+    '.csv': CSVExport,
+    '.xml': XMLExport
+}
+
+
+def open_cmdb_export(path: str, table: str = 'cmdb_ci_vm_instance') -> CMDBExport:
+    """
+    Open a CMDB export, building its index on first use.
+    
+    Args:
+        path: Export file; the format follows the extension
+        table: CMDB table name (the record element in XML unloads)
+        
+    Returns:
+        CMDBExport for the file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    export_class = CMDB_EXPORT_FORMATS.get(extension)
+    if export_class is None:
+        raise ValueError(
+            f"Unsupported CMDB export '{path}' "
+            f"(expected one of {', '.join(CMDB_EXPORT_FORMATS)})"
+        )
+    return export_class(path, table)
+
+
+#--------------------------------------------------------------
+# CMDB Functions
+#--------------------------------------------------------------
+
+# Fields every query needs for joins, keyset paging and the local cache
+CMDB_KEY_FIELDS = ['sys_id', 'name', 'environment', 'sys_updated_on']
+
+# Characters that cannot appear inside a value of an encoded IN query
+ENCODED_QUERY_RESERVED = (',', '^')
+
+# Fields returned for environment-wide scans
+CMDB_INVENTORY_FIELDS = ['sys_id', 'name', 'ip_address', 'state', 'environment']
+
+# Field profiles per use case; None means derived from the validation rules
+CMDB_QUERY_PROFILES = {
+    'validation': None,
+    'inventory': CMDB_INVENTORY_FIELDS
+}
+
+# Longest keyset condition appended to paged queries (sys_id is 32 hex chars)
+KEYSET_QUERY_SUFFIX = '^sys_id>' + 'f' * 32 + '^ORDERBYsys_id'
+
+# Placeholder for fields a compact record does not have
+_ABSENT = object()
+
+
+class RecordSchema:
+    """
+    Field layout shared by every CMDBRecord with the same requested fields.
+    
+    Field names are interned and held once here instead of once per record.
+    Values of low-cardinality fields (environment, state, os, ...) are
+    pooled so equal strings from different pages share one object; a field
+    stops pooling once it has more than POOL_LIMIT distinct values, so
+    unique fields such as sys_id and name never grow a pool.
+    
+    Fields a record has that the schema does not are appended, so records
+    built earlier simply lack them.
+    """
+    
+    POOL_LIMIT = 1024
+    
+    def __init__(self, fields: Iterable[str]):
+        # Replaced rather than mutated, so readers never need the lock
+        self.fields = ()
+        self.pools = ()
+        self.index = {}
+        self._lock = threading.Lock()
+        for field in fields:
+            self._add(field)
+    
+    def _add(self, field: str):
+        field = sys.intern(field)
+        if field in self.index:
+            return
+        # Index last: a field in index always has a slot
+        position = len(self.fields)
+        self.fields = self.fields + (field,)
+        self.pools = self.pools + ((position, {}),)
+        self.index[field] = position
+    
+    def _stop_pooling(self, pool: Dict):
+        with self._lock:
+            self.pools = tuple(p for p in self.pools if p[1] is not pool)
+    
+    def compact(self, record: Dict[str, Any]) -> 'CMDBRecord':
+        """Convert a record dict to a CMDBRecord using this layout."""
+        if type(record) is CMDBRecord and record.schema is self:
+            return record
+        if not self.index.keys() >= record.keys():
+            with self._lock:
+                for field in record:
+                    self._add(field)
+        
+        # Pools first: fields is never older than the pools read with it
+        pools = self.pools
+        row = list(map(record.get, self.fields, repeat(_ABSENT)))
+        for position, pool in pools:
+            value = row[position]
+            if type(value) is str:
+                row[position] = pool.setdefault(value, value)
+                if len(pool) > self.POOL_LIMIT:
+                    self._stop_pooling(pool)
+        return CMDBRecord(self, tuple(row))
+
+
+_record_schemas: Dict[Tuple[str, ...], RecordSchema] = {}
+_record_schemas_lock = threading.Lock()
+
+
+def get_record_schema(fields: Iterable[str]) -> RecordSchema:
+    """Return the shared RecordSchema for a field list, creating it once."""
+    key = tuple(fields)
+    with _record_schemas_lock:
+        schema = _record_schemas.get(key)
+        if schema is None:
+            schema = _record_schemas[key] = RecordSchema(key)
+    return schema
+
+
+class CMDBRecord(Mapping):
+    """
+    Read-only CMDB record stored as a tuple of values plus a shared schema.
+    
+    Behaves like the record dict it replaces for reading (record['name'],
+    record.get('ram'), iteration, dict(record), == with dicts) at roughly a
+    third of the memory, which matters once a run holds 100k+ records.
+    json.dumps needs default=json_default to encode it.
+    """
+    
+    __slots__ = ('schema', 'row')
+    
+    def __init__(self, schema: RecordSchema, row: Tuple):
+        self.schema = schema
+        self.row = row
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self.schema.index.get(key)
+        if i is None or i >= len(self.row):
+            return default
+        value = self.row[i]
+        return default if value is _ABSENT else value
+    
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+    
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, _ABSENT) is not _ABSENT
+    
+    def __iter__(self) -> Iterator[str]:
+        return (
+            field for field, value in zip(self.schema.fields, self.row)
+            if value is not _ABSENT
+        )
+    
+    def __len__(self) -> int:
+        return sum(value is not _ABSENT for value in self.row)
+    
+    def __repr__(self) -> str:
+        return f"CMDBRecord({dict(self)!r})"
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps default: compact records and discrepancies as objects, others as strings."""
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+
+def cmdb_query_params(
+    profile: str = 'validation',
+    rules: Optional[Dict[str, 'ValidationRule']] = None
+) -> Dict[str, str]:
+    """
+    Projection parameters for a CMDB query profile.
+    
+    Only the fields the profile needs are requested, as raw values without
+    reference links, which skips server-side display value resolution and
+    keeps payloads small. Choice fields (state, environment) come back as
+    raw values, so their rules compare case-insensitively.
+    
+    Args:
+        profile: Key of CMDB_QUERY_PROFILES
+        rules: Validation rules for the 'validation' profile
+            (defaults to VALIDATION_RULES)
+        
+    Returns:
+        sysparm_fields, sysparm_display_value and
+        sysparm_exclude_reference_link parameters
+    """
+    fields = CMDB_QUERY_PROFILES[profile]
+    if fields is None:
+        fields = list(rules or VALIDATION_RULES)
+    
+    return {
+        'sysparm_fields': ','.join(dict.fromkeys(CMDB_KEY_FIELDS + list(fields))),
+        'sysparm_display_value': 'false',
+        'sysparm_exclude_reference_link': 'true'
+    }
+
+
+@traced('get_cmdb_record', 'vm_name')
+def get_cmdb_record(
+    client: ServiceNowClient, 
+    vm_name: str,
+    additional_filters: Optional[Dict] = None,
+    strict: bool = False
+) -> Optional[Dict]:
+    """
+    Retrieve a VM record from ServiceNow CMDB.
+    
+    Args:
+        client: ServiceNow API client
+        vm_name: Name of the VM to look up
+        additional_filters: Optional additional query filters
+        strict: Raise RuntimeError if the lookup fails instead of returning None
+        
+    Returns:
+        CMDB record dict if found, None otherwise
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Looking up CMDB record for VM: {vm_name}")
+    
+    # Offline: the export file stands in for the Table API
+    if client.export is not None:
+        return _get_export_record(client, vm_name, additional_filters)
+    
+    # Serve from the local snapshot when possible
+    if client.cache and not additional_filters:
+        record = client.cache.get(vm_name)
+        if record:
+            logger.info(f"Found cached CMDB record: sys_id={record.get('sys_id')}")
+            return record
+    
+    # Make API request
+    endpoint = f"table/{client.config.cmdb_table}"
+    params = _cmdb_record_params(vm_name, additional_filters, client.rules)
+    success, response = client._make_request('GET', endpoint, params=params)
+    if strict and not success:
+        raise RuntimeError(
+            f"CMDB lookup failed for {vm_name}: {response.get('error', 'Unknown error')}"
+        )
+    
+    record = _parse_cmdb_record_response(vm_name, success, response)
+    if record and client.cache and not additional_filters:
+        client.cache.put(record)
+    
+    return record
+
+
+def _export_fields(
+    client: ServiceNowClient,
+    profile: str = 'validation',
+    additional_filters: Optional[Dict] = None
+) -> List[str]:
+    """Fields the API would return for a profile, plus any filtered fields."""
+    fields = cmdb_query_params(profile, client.rules)['sysparm_fields'].split(',')
+    return fields + [f for f in additional_filters or {} if f not in fields]
+
+
+def _matches_filters(record: Dict, additional_filters: Optional[Dict]) -> bool:
+    """Apply field=value filters the way the encoded query would."""
+    return all(
+        str(record.get(key, '')) == str(value)
+        for key, value in (additional_filters or {}).items()
+    )
+
+
+def _get_export_record(
+    client: ServiceNowClient,
+    vm_name: str,
+    additional_filters: Optional[Dict] = None
+) -> Optional[Dict]:
+    """Look up one VM in the CMDB export instead of the Table API."""
+    logger = logging.getLogger(__name__)
+    record = client.export.get(vm_name, _export_fields(client, 'validation', additional_filters))
+    if record is None or not _matches_filters(record, additional_filters):
+        logger.warning(f"No CMDB record found for VM: {vm_name}")
+        return None
+    
+    logger.info(f"Found CMDB record in export: sys_id={record.get('sys_id')}")
+    return record
+
+
+def _iter_export_records(
+    client: ServiceNowClient,
+    fields: List[str],
+    environment: Optional[str] = None,
+    watermark: Optional[str] = None,
+    strict: bool = False
+) -> Iterator[Dict]:
+    """
+    Scan the CMDB export the way _iter_table_records pages the API.
+    
+    Args:
+        client: ServiceNow API client with an export
+        fields: Fields to return
+        environment: Only records in this environment
+        watermark: Only records updated at or after this timestamp
+        strict: Raise RuntimeError if the export is malformed instead of stopping early
+        
+    Yields:
+        CMDB records in file order
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        for record in client.export.scan(fields):
+            if environment and record.get('environment') != environment:
+                continue
+            # 'YYYY-MM-DD HH:MM:SS' strings compare in time order
+            if watermark and (record.get('sys_updated_on') or '') < watermark:
+                continue
+            yield record
+    except ValueError as e:
+        message = f"Failed to read CMDB export: {e}"
+        if strict:
+            raise RuntimeError(message)
+        logger.error(message)
+
+
+def _cmdb_record_params(
+    vm_name: str,
+    additional_filters: Optional[Dict] = None,
+    rules: Optional[Dict[str, 'ValidationRule']] = None
+) -> Dict[str, Any]:
+    """Build query parameters for a single VM lookup."""
+    query = f"name={vm_name}"
+    if additional_filters:
+        for key, value in additional_filters.items():
+            query += f"^{key}={value}"
+    
+    return {
+        'sysparm_query': query,
+        'sysparm_limit': 1,
+        **cmdb_query_params(rules=rules)
+    }
+
+
+def _parse_cmdb_record_response(
+    vm_name: str,
+    success: bool,
+    response: Dict
+) -> Optional[Dict]:
+    """Extract the CMDB record from a single VM lookup response."""
+    logger = logging.getLogger(__name__)
+    
+    if not success:
+        logger.error(f"Failed to query CMDB: {response.get('error', 'Unknown error')}")
+        return None
+    
+    # Parse response
+    result = response.get('result', [])
+    
+    if not result:
+        logger.warning(f"No CMDB record found for VM: {vm_name}")
+        return None
+    
+    record = result[0]
+    logger.info(f"Found CMDB record: sys_id={record.get('sys_id')}")
+    
+    return record
+
+
+# A "sys_id" key and its string value in a raw Table API page
+SYS_ID_MEMBER = re.compile(rb'"sys_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _peek_page(body: bytes) -> Tuple[int, Optional[str]]:
+    """
+    Count the records in a raw Table API page and find its last sys_id
+    without decoding it.
+    
+    Records are flat (reference links are excluded), so each has exactly
+    one "sys_id" key, and in sys_id order the last key belongs to the last
+    record. Quotes inside JSON strings are escaped, so values cannot match.
+    
+    Returns:
+        Tuple of (record count, last sys_id); (0, None) if the page has
+        no sys_id keys or the last one cannot be read
+    """
+    position = body.rfind(b'"sys_id"')
+    match = SYS_ID_MEMBER.match(body, position) if position >= 0 else None
+    if match is None:
+        return 0, None
+    return body.count(b'"sys_id"'), json.loads(b'"' + match.group(1) + b'"')
+
+
+def _iter_table_records(
+    client: ServiceNowClient,
+    endpoint: str,
+    params: Dict,
+    page_size: Optional[int] = None,
+    prefetch: bool = False,
+    strict: bool = False,
+    transform=None
+) -> Iterator[Dict]:
+    """
+    Page through a Table API query, yielding records as they arrive.
+    
+    Uses keyset paging on sys_id (sys_id>last ORDERBYsys_id), which stays
+    cheap on deep pages and does not skip rows when earlier rows change.
+    Only one page is held in memory at a time (three with prefetch).
+    
+    With prefetch, pages are downloaded as raw bytes and decoded (and
+    transformed) on a worker thread. The next page's keyset is read from
+    the raw bytes with _peek_page, so page n+1 downloads while page n
+    decodes and page n-1 is consumed, and large scans stay network-bound.
+    A decoded page that disagrees with its peek falls back to fetching
+    one page after another from the page's real last sys_id.
+    
+    Args:
+        client: ServiceNow API client
+        endpoint: Table API endpoint
+        params: Query parameters; sysparm_fields must include sys_id
+        page_size: Records per request (defaults to config.page_size)
+        prefetch: Fetch the next page while the caller consumes this one
+        strict: Raise RuntimeError if a page fails instead of stopping early
+        transform: Function applied to every record as its page is decoded
+        
+    Yields:
+        CMDB records in sys_id order
+    """
+    logger = logging.getLogger(__name__)
+    page_size = page_size or client.config.page_size
+    base_query = params.get('sysparm_query', '')
+    
+    def fetch_page(last_sys_id: Optional[str], decode: bool = True) -> Tuple[bool, Any]:
+        query = base_query
+        if last_sys_id:
+            query += f"^sys_id>{last_sys_id}" if query else f"sys_id>{last_sys_id}"
+        query += '^ORDERBYsys_id' if query else 'ORDERBYsys_id'
+        
+        page_params = dict(params)
+        page_params['sysparm_query'] = query
+        page_params['sysparm_limit'] = page_size
+        # Scans and change polls must see current data; never memoized
+        return client._make_request(
+            'GET', endpoint, params=page_params, memoize=False, decode=decode
+        )
+    
+    def failed(last_sys_id: Optional[str], response: Dict) -> str:
+        return (
+            f"Failed to fetch page after sys_id={last_sys_id}: "
+            f"{response.get('error', 'Unknown error')}"
+        )
+    
+    def records(response: Any) -> List:
+        page = response.get('result', [])
+        return list(map(transform, page)) if transform else page
+    
+    def decode_page(body: bytes) -> List:
+        return records(client.decode_json(body))
+    
+    def sequential(last_sys_id: Optional[str]):
+        """Fetch, decode and hand over one page at a time."""
+        while True:
+            success, response = fetch_page(last_sys_id)
+            if not success:
+                return failed(last_sys_id, response)
+            page = records(response)
+            yield page
+            if len(page) < page_size or not page[-1].get('sys_id'):
+                return None
+            last_sys_id = page[-1].get('sys_id')
+    
+    def pipelined():
+        """Download, decode and hand over consecutive pages concurrently."""
+        # Pending download and the sys_id it starts after
+        download, after = submit(downloader, fetch_page, None, False), None
+        decoding = None
+        while download is not None or decoding is not None:
+            current = error = None
+            if download is not None:
+                success, body = download.result()
+                if success:
+                    count, last = _peek_page(body)
+                    start, download = after, None
+                    if last is not None and count >= page_size:
+                        download, after = submit(downloader, fetch_page, last, False), last
+                    current = (submit(decoder, decode_page, body), count, last, start)
+                else:
+                    download, error = None, failed(after, body)
+            
+            if decoding is not None:
+                future, count, last, start = decoding
+                try:
+                    page = future.result()
+                except ValueError as e:
+                    return f"Invalid JSON in page after sys_id={start}: {e}"
+                yield page
+                if last is None or len(page) != count or (
+                    page and page[-1].get('sys_id') != last
+                ):
+                    # Anything downloaded after this page used the wrong keyset
+                    if len(page) < page_size or not page[-1].get('sys_id'):
+                        return None
+                    logger.warning(
+                        f"Page ending at sys_id={page[-1].get('sys_id')} did not match "
+                        f"the keyset read from its raw body - fetching the rest page by page"
+                    )
+                    return (yield from sequential(page[-1].get('sys_id')))
+            
+            if error:
+                return error
+            decoding = current
+        return None
+    
+    def submit(executor: ThreadPoolExecutor, fn, *args) -> Future:
+        future = executor.submit(fn, *args)
+        queued.add(future)
+        future.add_done_callback(queued.discard)
+        return future
+    
+    # One thread downloads while the other decodes the previous page
+    downloader = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    decoder = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    # Unfinished prefetch work, cancelled if the scan stops early
+    queued = set()
+    label = metrics_endpoint(endpoint)
+    started = time.perf_counter()
+    fetched = 0
+    try:
+        pages = pipelined() if prefetch else sequential(None)
+        while True:
+            try:
+                page = next(pages)
+            except StopIteration as stop:
+                error = stop.value
+                break
+            fetched += len(page)
+            if page:
+                METRICS.inc('cmdb_records_fetched_total', len(page), endpoint=label)
+            yield from page
+        
+        if error:
+            if strict:
+                raise RuntimeError(error)
+            logger.error(error)
+    finally:
+        if prefetch:
+            for future in list(queued):
+                future.cancel()
+            downloader.shutdown(wait=False)
+            decoder.shutdown(wait=False)
+        elapsed = time.perf_counter() - started
+        if fetched and elapsed > 0:
+            METRICS.set('cmdb_records_per_second', fetched / elapsed, endpoint=label)
+
+
+def _partition_in_query_values(values: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Split values into those that can go in an IN list and the rest.
+    
+    Values containing ENCODED_QUERY_RESERVED characters would split the
+    list or the query, so they must be looked up one at a time.
+    
+    Returns:
+        (in_list_values, single_values)
+    """
+    in_list = []
+    single = []
+    for value in values:
+        if any(c in value for c in ENCODED_QUERY_RESERVED):
+            single.append(value)
+        else:
+            in_list.append(value)
+    return in_list, single
+
+
+def _chunk_in_query_values(
+    values: List[str],
+    fixed_length: int,
+    max_length: int
+) -> Iterable[List[str]]:
+    """
+    Split values into chunks whose URL-encoded IN list fits the URL budget.
+    
+    Args:
+        values: Values to place in the IN list
+        fixed_length: Encoded length of the URL without the IN list
+        max_length: Maximum total URL length
+    
+    Yields:
+        Lists of values, each small enough for one request
+    """
+    # Every value costs its encoded length plus an encoded comma (%2C)
+    separator_length = len(quote(','))
+    budget = max(max_length - fixed_length, 1)
+    
+    chunk = []
+    used = 0
+    for value in values:
+        cost = len(quote(value, safe='')) + (separator_length if chunk else 0)
+        if chunk and used + cost > budget:
+            yield chunk
+            chunk = []
+            cost = len(quote(value, safe=''))
+            used = 0
+        chunk.append(value)
+        used += cost
+    
+    if chunk:
+        yield chunk
+
+
+def get_cmdb_records_bulk(
+    client: ServiceNowClient,
+    vm_names: List[str],
+    additional_filters: Optional[Dict] = None,
+    strict: bool = False
+) -> Dict[str, Dict]:
+    """
+    Retrieve many VM records from ServiceNow CMDB using nameIN queries.
+    
+    Names are packed into as few requests as the URL length limit allows.
+    Names containing encoded-query separators are looked up individually.
+    
+    Args:
+        client: ServiceNow API client
+        vm_names: Names of the VMs to look up
+        additional_filters: Optional additional query filters
+        strict: Raise RuntimeError if a request fails; otherwise the VMs it
+            covered are missing from the result, as if not in the CMDB
+    
+    Returns:
+        Dict mapping VM name to CMDBRecord (missing VMs are omitted)
+    """
+    logger = logging.getLogger(__name__)
+    
+    # De-duplicate while keeping input order
+    names = list(dict.fromkeys(vm_names))
+    logger.info(f"Looking up CMDB records for {len(names)} VMs")
+    
+    if client.export is not None:
+        fields = _export_fields(client, 'validation', additional_filters)
+        schema = get_record_schema(fields)
+        records = {
+            name: schema.compact(record)
+            for name, record in client.export.get_many(names, fields).items()
+            if _matches_filters(record, additional_filters)
+        }
+        logger.info(f"Found {len(records)} of {len(names)} CMDB records in {client.export.path}")
+        return records
+    
+    endpoint = f"table/{client.config.cmdb_table}"
+    base_params = cmdb_query_params(rules=client.rules)
+    schema = get_record_schema(base_params['sysparm_fields'].split(','))
+    
+    # Serve what we can from the local snapshot
+    records = {}
+    use_cache = client.cache is not None and not additional_filters
+    if use_cache:
+        records = {
+            name: schema.compact(record)
+            for name, record in client.cache.get_many(names).items()
+        }
+        if records:
+            logger.info(f"Found {len(records)} records in local cache")
+    
+    bulk_names, single_names = _partition_in_query_values(
+        name for name in names if name not in records
+    )
+    
+    filter_query = ''
+    if additional_filters:
+        for key, value in additional_filters.items():
+            filter_query += f"^{key}={value}"
+    
+    # Length of everything in the URL except the names themselves
+    fixed_length = len(
+        f"{client.config.base_url}/{endpoint}?"
+        f"{urlencode(base_params)}&sysparm_limit=000000&"
+        f"{urlencode({'sysparm_query': 'nameIN' + filter_query + KEYSET_QUERY_SUFFIX})}"
+    )
+    
+    chunks = _chunk_in_query_values(
+        bulk_names, fixed_length, client.config.max_url_length
+    )
+    for chunk in chunks:
+        params = dict(base_params)
+        params['sysparm_query'] = f"nameIN{','.join(chunk)}{filter_query}"
+        
+        fetched = list(_iter_table_records(client, endpoint, params, strict=strict))
+        for record in fetched:
+            # First record wins if the CMDB holds duplicate names
+            name = record.get('name')
+            if name not in records:
+                records[name] = schema.compact(record)
+        if use_cache:
+            client.cache.put_many(fetched)
+    
+    for name in single_names:
+        record = get_cmdb_record(client, name, additional_filters, strict=strict)
+        if record:
+            records[name] = schema.compact(record)
+    
+    logger.info(f"Found {len(records)} of {len(names)} CMDB records")
+    
+    return records
+
+
+def get_cmdb_records_by_environment(
+    client: ServiceNowClient,
+    environment: str,
+    page_size: Optional[int] = None,
+    prefetch: bool = False,
+    profile: str = 'inventory',
+    strict: bool = False
+) -> Iterator[Dict]:
+    """
+    Stream all VM records for a specific environment.
+    
+    Records are fetched page by page, so memory use does not grow with
+    the size of the environment.
+    
+    Args:
+        client: ServiceNow API client
+        environment: Environment name (dev, prod, etc.)
+        page_size: Records per request (defaults to config.page_size)
+        prefetch: Download the next page, and decode the current one, while
+            the caller processes the previous one
+        profile: Key of CMDB_QUERY_PROFILES selecting the returned fields
+        strict: Raise RuntimeError if a page fails instead of stopping early
+        
+    Yields:
+        CMDB records as CMDBRecord
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Querying CMDB records for environment: {environment}")
+    
+    params = {
+        'sysparm_query': f"environment={environment}",
+        **cmdb_query_params(profile, client.rules)
+    }
+    
+    fields = params['sysparm_fields'].split(',')
+    schema = get_record_schema(fields)
+    if client.export is not None:
+        records = map(
+            schema.compact,
+            _iter_export_records(client, fields, environment, strict=strict)
+        )
+    else:
+        # Compacted on the decoding thread when prefetching
+        records = _iter_table_records(
+            client, f"table/{client.config.cmdb_table}", params,
+            page_size=page_size, prefetch=prefetch, strict=strict,
+            transform=schema.compact
+        )
+    
+    count = 0
+    for record in records:
+        count += 1
+        yield record
+    
+    logger.info(f"Found {count} records in environment: {environment}")
+
+
+def get_cmdb_records_changed_since(
+    client: ServiceNowClient,
+    watermark: Optional[str],
+    environment: Optional[str] = None,
+    strict: bool = False
+) -> Iterator[Dict]:
+    """
+    Stream VM records updated at or after a watermark.
+    
+    Callers that advance a watermark afterwards should pass strict, so
+    changes on a page that failed are not skipped for good.
+    
+    Args:
+        client: ServiceNow API client
+        watermark: 'YYYY-MM-DD HH:MM:SS' timestamp, or None for every record
+        environment: Limit the query to one environment
+        strict: Raise RuntimeError if a page fails instead of stopping early
+        
+    Yields:
+        CMDB records with the validation profile fields
+    """
+    if client.export is not None:
+        yield from _iter_export_records(
+            client, _export_fields(client), environment, watermark, strict
+        )
+        return
+    
+    conditions = []
+    if environment:
+        conditions.append(f"environment={environment}")
+    if watermark:
+        conditions.append(f"sys_updated_on>={watermark}")
+    
+    params = {
+        'sysparm_query': '^'.join(conditions),
+        **cmdb_query_params(rules=client.rules)
+    }
+    
+    endpoint = f"table/{client.config.cmdb_table}"
+    yield from _iter_table_records(client, endpoint, params, prefetch=True, strict=strict)
+
+
+#--------------------------------------------------------------
+# Validation Functions
+#--------------------------------------------------------------
+
+# Default validation rules; SNOW_RULES_FILE replaces them (see load_validation_rules)
+DEFAULT_RULE_SPEC = {
+    'name': {
+        'required': True,
+        'severity': 'critical'
+    },
+    'ip_address': {
+        'required': False,
+        'severity': 'warning'
+    },
+    'cpu_count': {
+        'compare': 'number',
+        'severity': 'warning'
+    },
+    'ram': {
+        'compare': 'size',
+        'unit': 'MB',
+        'severity': 'warning'
+    },
+    'disk_space': {
+        'compare': 'size',
+        'unit': 'GB',
+        'tolerance': 1,
+        'severity': 'warning'
+    },
+    'environment': {
+        'required': True,
+        'severity': 'high',
+        'ignore_case': True
+    },
+    'state': {
+        'required': False,
+        'compare': 'allowed',
+        'values': ['On', 'Running', 'Powered On'],
+        'severity': 'warning',
+        'ignore_case': True
+    }
+}
+
+
+class Severity(str, Enum):
+    """Discrepancy severity; members compare and serialize as their value."""
+    
+    CRITICAL = 'critical'
+    HIGH = 'high'
+    MEDIUM = 'medium'
+    LOW = 'low'
+    WARNING = 'warning'
+    INFO = 'info'
+    
+    def __str__(self) -> str:
+        return self.value
+
+
+# Severities that make a validation fail
+FAILING_SEVERITIES = (Severity.CRITICAL, Severity.HIGH)
+
+# Size units for 'size' rules, in MB
+SIZE_UNITS_MB = {'KB': 1 / 1024, 'MB': 1, 'GB': 1024, 'TB': 1024 * 1024}
+
+SIZE_PATTERN = re.compile(r'^\s*(-?[0-9]*\.?[0-9]+)\s*([KMGT])?(?:I?B)?\s*$', re.IGNORECASE)
+
+
+def _casefold(value: Any) -> Any:
+    """Case-fold strings (raw choice values are lower case); pass others through."""
+    return value.casefold() if isinstance(value, str) else value
+
+
+def _to_number(value: Any) -> Optional[float]:
+    """Parse a numeric value, or None if it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Discrepancy(Mapping):
+    """
+    One failed check, read like the dict it replaces.
+    
+    d['field'], d.get('severity'), dict(d) and comparisons with dicts all
+    work, but each instance is a four-slot object instead of a four-key
+    dict, so the discrepancies of a large run take a fraction of the
+    memory. json.dumps needs default=json_default to encode it.
+    """
+    
+    __slots__ = ('field', 'expected', 'actual', 'severity')
+    KEYS = __slots__
+    
+    def __init__(self, field: str, expected: Any, actual: Any, severity: 'Severity'):
+        self.field = field
+        self.expected = expected
+        self.actual = actual
+        self.severity = severity
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+    
+    def __len__(self) -> int:
+        return len(self.KEYS)
+    
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class ValidationRule:
+    """
+    One validation rule compiled into a predicate.
+    
+    Comparisons:
+        exact    expected and actual are equal as strings (the default)
+        number   numeric equality within 'tolerance'
+        size     numeric equality after converting both sides to 'unit'
+                 ('4 GB' == 4096 for unit MB); bare numbers are in 'unit'
+        allowed  actual is one of 'values'
+        regex    actual matches 'pattern'
+    
+    'tolerance' is absolute, or relative to the expected value when given
+    as a percentage ('5%'). 'ignore_case' applies to exact, allowed and
+    regex rules. Everything is resolved once here, so checking a record
+    is a single predicate call per rule.
+    """
+    
+    COMPARISONS = ('exact', 'number', 'size', 'allowed', 'regex')
+    
+    def __init__(self, field: str, spec: Dict[str, Any]):
+        self.field = sys.intern(field) if isinstance(field, str) else field
+        severity = spec.get('severity')
+        if not severity:
+            raise ValueError(f"Rule '{field}' has no severity")
+        try:
+            self.severity = Severity(str(severity).lower())
+        except ValueError:
+            raise ValueError(
+                f"Rule '{field}' has unknown severity '{severity}' "
+                f"(expected one of {', '.join(Severity)})"
+            )
+        self.required = bool(spec.get('required', False))
+        self.ignore_case = bool(spec.get('ignore_case', False))
+        
+        values = spec.get('values', spec.get('expected_values'))
+        self.compare = spec.get('compare') or ('allowed' if values is not None else 'exact')
+        if self.compare not in self.COMPARISONS:
+            raise ValueError(
+                f"Rule '{field}' has unknown comparison '{self.compare}' "
+                f"(expected one of {', '.join(self.COMPARISONS)})"
+            )
+        
+        self.values = list(values or [])
+        self.allowed = frozenset(
+            map(_casefold, self.values) if self.ignore_case else self.values
+        )
+        
+        self.pattern = None
+        if self.compare == 'regex':
+            if not spec.get('pattern'):
+                raise ValueError(f"Rule '{field}' needs a pattern")
+            try:
+                self.pattern = re.compile(
+                    spec['pattern'], re.IGNORECASE if self.ignore_case else 0
+                )
+            except re.error as e:
+                raise ValueError(f"Rule '{field}' has an invalid pattern: {e}")
+        
+        self.unit = str(spec.get('unit', 'MB')).upper()
+        if self.unit not in SIZE_UNITS_MB:
+            raise ValueError(f"Rule '{field}' has unknown unit '{self.unit}'")
+        
+        tolerance = str(spec.get('tolerance', 0)).strip()
+        self.relative = tolerance.endswith('%')
+        self.tolerance = _to_number(tolerance.rstrip('%'))
+        if self.tolerance is None or self.tolerance < 0:
+            raise ValueError(f"Rule '{field}' has an invalid tolerance '{tolerance}'")
+        if self.relative:
+            self.tolerance /= 100
+        
+        # Shared by every discrepancy this rule reports
+        self.description = None
+        if self.compare == 'allowed':
+            self.description = f"one of {self.values}"
+        elif self.compare == 'regex':
+            self.description = f"matches {self.pattern.pattern}"
+        
+        # Allowed-value and regex rules check the actual value on its own,
+        # so they run whenever the rule is required
+        self.checks_actual = self.compare in ('allowed', 'regex')
+        self.matches = {
+            'exact': self._match_exact_folded if self.ignore_case else self._match_exact,
+            'number': self._match_number,
+            'size': self._match_size,
+            'allowed': self._match_allowed,
+            'regex': self._match_regex
+        }[self.compare]
+    
+    def _match_exact(self, expected: Any, actual: Any) -> bool:
+        return str(expected) == str(actual)
+    
+    def _match_exact_folded(self, expected: Any, actual: Any) -> bool:
+        return str(expected).casefold() == str(actual).casefold()
+    
+    def _within(self, expected: Optional[float], actual: Optional[float]) -> bool:
+        if expected is None or actual is None:
+            return False
+        limit = self.tolerance * abs(expected) if self.relative else self.tolerance
+        return abs(expected - actual) <= limit
+    
+    def _match_number(self, expected: Any, actual: Any) -> bool:
+        return self._within(_to_number(expected), _to_number(actual))
+    
+    def _match_size(self, expected: Any, actual: Any) -> bool:
+        return self._within(self.to_unit(expected), self.to_unit(actual))
+    
+    def _match_allowed(self, expected: Any, actual: Any) -> bool:
+        return (_casefold(actual) if self.ignore_case else actual) in self.allowed
+    
+    def _match_regex(self, expected: Any, actual: Any) -> bool:
+        return actual is not None and self.pattern.search(str(actual)) is not None
+    
+    def to_unit(self, value: Any) -> Optional[float]:
+        """Convert a size ('4 GB', '4096', 4096) to this rule's unit."""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            pass
+        match = SIZE_PATTERN.match(str(value)) if value is not None else None
+        if not match:
+            return None
+        number, suffix = match.groups()
+        if not suffix:
+            return float(number)
+        return float(number) * SIZE_UNITS_MB[suffix.upper() + 'B'] / SIZE_UNITS_MB[self.unit]
+    
+    def describe(self, expected: Any) -> Any:
+        """Expected value as reported in a discrepancy."""
+        return expected if self.description is None else self.description
+    
+    def check(self, expected: Any, actual: Any) -> Optional[Discrepancy]:
+        """
+        Check one value.
+        
+        Returns:
+            Discrepancy, or None if the value passes or is not checked
+        """
+        if self.checks_actual:
+            applies = expected is not None or self.required
+        else:
+            applies = bool(expected)
+        if not applies or self.matches(expected, actual):
+            return None
+        return Discrepancy(self.field, self.describe(expected), actual, self.severity)
+    
+    def failures(self, expected: List, actual: List) -> List[int]:
+        """Positions in aligned expected/actual columns that fail this rule."""
+        if self.compare == 'exact' and not self.ignore_case:
+            return [
+                i for i, e, a in zip(count(), expected, actual)
+                if e and str(e) != str(a)
+            ]
+        
+        if self.compare == 'allowed':
+            folded = map(_casefold, actual) if self.ignore_case else actual
+            allowed, required = self.allowed, self.required
+            return [
+                i for i, e, a in zip(count(), expected, folded)
+                if (e is not None or required) and a not in allowed
+            ]
+        
+        if self.compare in ('number', 'size'):
+            convert = _to_number if self.compare == 'number' else self.to_unit
+            tolerance, relative = self.tolerance, self.relative
+            hits = []
+            for i, e, a in zip(count(), expected, actual):
+                if not e:
+                    continue
+                e, a = convert(e), convert(a)
+                if e is None or a is None or abs(e - a) > (
+                    tolerance * abs(e) if relative else tolerance
+                ):
+                    hits.append(i)
+            return hits
+        
+        matches = self.matches
+        if self.checks_actual:
+            required = self.required
+            return [
+                i for i, e, a in zip(count(), expected, actual)
+                if (e is not None or required) and not matches(e, a)
+            ]
+        return [
+            i for i, e, a in zip(count(), expected, actual)
+            if e and not matches(e, a)
+        ]
+
+
+def compile_rules(spec: Dict[str, Dict[str, Any]]) -> Dict[str, ValidationRule]:
+    """
+    Compile a field -> rule spec mapping into ValidationRule objects.
+    
+    Raises:
+        ValueError: If a rule is malformed
+    """
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("Validation rules must be a non-empty mapping of field to rule")
+    
+    rules = {}
+    for field, rule_spec in spec.items():
+        if not isinstance(rule_spec, dict):
+            raise ValueError(f"Rule '{field}' must be a mapping")
+        rules[field] = ValidationRule(field, rule_spec)
+    return rules
+
+
+def load_validation_rules(path: str) -> Dict[str, ValidationRule]:
+    """
+    Load and compile validation rules from a YAML or JSON file.
+    
+    The file holds a 'rules' mapping of CMDB field to rule spec, using the
+    keys described on ValidationRule plus 'severity' and 'required', e.g.:
+    
+        rules:
+          ram: {compare: size, unit: MB, tolerance: 5%, severity: warning}
+          os: {compare: regex, pattern: '^(Linux|Windows)', severity: warning}
+    
+    Args:
+        path: Rules file (.yaml/.yml needs PyYAML)
+        
+    Returns:
+        Compiled rules keyed by field
+        
+    Raises:
+        ValueError: If the file cannot be parsed or a rule is malformed
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    
+    if path.endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ValueError(f"PyYAML is required to read {path} (pip install pyyaml)")
+        try:
+            document = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML in {path}: {e}")
+    else:
+        try:
+            document = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON in {path}: {e}")
+    
+    if not isinstance(document, dict) or 'rules' not in document:
+        raise ValueError(f"{path} has no 'rules' mapping")
+    
+    return compile_rules(document['rules'])
+
+
+# Validation rules shared by single-VM and fleet validation
+VALIDATION_RULES = compile_rules(DEFAULT_RULE_SPEC)
+
+_rule_sets: Dict[str, Dict[str, ValidationRule]] = {}
+_rule_sets_lock = threading.Lock()
+
+
+def get_validation_rules(path: str = '') -> Dict[str, ValidationRule]:
+    """
+    Return the compiled rules for a rules file, compiling it only once.
+    
+    Args:
+        path: Rules file, or '' for the built-in VALIDATION_RULES
+        
+    Returns:
+        Compiled rules keyed by field
+    """
+    if not path:
+        return VALIDATION_RULES
+    
+    with _rule_sets_lock:
+        rules = _rule_sets.get(path)
+        if rules is None:
+            rules = _rule_sets[path] = load_validation_rules(path)
+            logging.getLogger(__name__).info(
+                f"Loaded {len(rules)} validation rules from {path}"
+            )
+    
+    return rules
+
+
+@traced('validate_sync')
+def validate_sync(
+    expected: Dict[str, Any], 
+    actual: Optional[Dict[str, Any]],
+    rules: Optional[Dict[str, ValidationRule]] = None
+) -> Tuple[bool, list]:
+    """
+    Validate that CMDB record matches expected values from Terraform/Morpheus.
+    
+    Args:
+        expected: Expected values from provisioning
+        actual: Actual values from CMDB
+        rules: Compiled validation rules (defaults to VALIDATION_RULES)
+        
+    Returns:
+        Tuple of (validation_passed: bool, discrepancies: list)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Validating CMDB sync...")
+    started = time.perf_counter()
+    
+    discrepancies = []
+    
+    # Check if record exists
+    if actual is None:
+        discrepancies.append(
+            Discrepancy('record', 'exists', 'not found', Severity.CRITICAL)
+        )
+        _record_validation('single', started, passed=0, failed=1)
+        return False, discrepancies
+    
+    # Validate each field
+    for field, rule in (rules or VALIDATION_RULES).items():
+        discrepancy = rule.check(expected.get(field), actual.get(field))
+        if discrepancy:
+            discrepancies.append(discrepancy)
+    
+    # Determine overall pass/fail
+    critical_issues = [d for d in discrepancies if d['severity'] == Severity.CRITICAL]
+    high_issues = [d for d in discrepancies if d['severity'] == Severity.HIGH]
+    
+    passed = len(critical_issues) == 0 and len(high_issues) == 0
+    _record_validation('single', started, passed=int(passed), failed=int(not passed))
+    
+    # Log results
+    if passed:
+        logger.info("[OK] CMDB validation PASSED")
+        if discrepancies:
+            logger.warning(f"  (with {len(discrepancies)} minor discrepancies)")
+    else:
+        logger.error("[FAIL] CMDB validation FAILED")
+        for d in discrepancies:
+            logger.error(f"  [{d['severity'].upper()}] {d['field']}: "
+                        f"expected '{d['expected']}', got '{d['actual']}'")
+    
+    return passed, discrepancies
+
+
+def _record_validation(mode: str, started: float, passed: int, failed: int):
+    """Record validation duration and per-VM results."""
+    METRICS.observe(
+        'cmdb_validation_duration_seconds', time.perf_counter() - started, mode=mode
+    )
+    if passed:
+        METRICS.inc('cmdb_validations_total', passed, result='passed')
+    if failed:
+        METRICS.inc('cmdb_validations_total', failed, result='failed')
+
+
+#--------------------------------------------------------------
+# Fleet Comparison Engine
+#--------------------------------------------------------------
+
+class FleetSnapshot:
+    """
+    Column-oriented set of VM records keyed by name.
+    
+    Each validated field is held as one list aligned with names, so rules
+    can be evaluated over a whole column at a time.
+    """
+    
+    def __init__(self, names: List[str], columns: Dict[str, List]):
+        self.names = names
+        self.columns = columns
+    
+    @classmethod
+    def from_mapping(
+        cls,
+        records: Dict[str, Optional[Mapping]],
+        fields: Iterable[str] = VALIDATION_RULES
+    ) -> 'FleetSnapshot':
+        """
+        Build a snapshot from a name -> record mapping.
+        
+        Names mapped to None (records not found) are left out.
+        """
+        names = list(records)
+        values = list(records.values())
+        if None in values:
+            names = [n for n, r in zip(names, values) if r is not None]
+            values = [r for r in values if r is not None]
+        
+        # The records' own get (dict.get or CMDBRecord.get) when they share a type
+        types = set(map(type, values))
+        get = types.pop().get if len(types) == 1 else Mapping.get
+        columns = {
+            field: list(map(get, values, repeat(field)))
+            for field in fields
+        }
+        return cls(names, columns)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class DiscrepancyTable:
+    """
+    Compact discrepancy table with one list per column.
+    
+    Rows carry the same field/expected/actual/severity semantics as the
+    discrepancies returned by validate_sync, plus the VM name.
+    """
+    
+    COLUMNS = ('vm_name', 'field', 'expected', 'actual', 'severity')
+    
+    def __init__(self):
+        self.vm_name = []
+        self.field = []
+        self.expected = []
+        self.actual = []
+        self.severity = []
+    
+    def extend(
+        self,
+        vm_names: List[str],
+        field: str,
+        expected: List,
+        actual: List,
+        severity: Severity
+    ):
+        """Append rows for one field and severity."""
+        self.vm_name.extend(vm_names)
+        self.field.extend([field] * len(vm_names))
+        self.expected.extend(expected)
+        self.actual.extend(actual)
+        self.severity.extend([severity] * len(vm_names))
+    
+    def __len__(self) -> int:
+        return len(self.vm_name)
+    
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield rows as discrepancy dicts."""
+        for row in zip(*(getattr(self, c) for c in self.COLUMNS)):
+            yield dict(zip(self.COLUMNS, row))
+    
+    def by_vm(self) -> Dict[str, list]:
+        """Group rows per VM as validate_sync-style discrepancy lists."""
+        grouped = {}
+        for vm_name, field, expected, actual, severity in zip(
+            self.vm_name, self.field, self.expected, self.actual, self.severity
+        ):
+            grouped.setdefault(vm_name, []).append(
+                Discrepancy(field, expected, actual, severity)
+            )
+        return grouped
+    
+    def failed_vms(self) -> set:
+        """Return names of VMs with critical or high discrepancies."""
+        return {
+            vm_name for vm_name, severity in zip(self.vm_name, self.severity)
+            if severity in FAILING_SEVERITIES
+        }
+
+
+def compare_fleet(
+    expected: FleetSnapshot,
+    actual: FleetSnapshot,
+    rules: Optional[Dict[str, ValidationRule]] = None
+) -> DiscrepancyTable:
+    """
+    Compare expected and actual fleets column by column.
+    
+    Equivalent to calling validate_sync for every expected VM, but the
+    join is a single hash lookup per VM and each rule is one pass over
+    its columns.
+    
+    Args:
+        expected: Expected values per VM (e.g. from Terraform outputs)
+        actual: CMDB records per VM
+        rules: Compiled validation rules (defaults to VALIDATION_RULES)
+        
+    Returns:
+        Table of discrepancies for every VM in the expected fleet
+    """
+    logger = logging.getLogger(__name__)
+    rules = rules or VALIDATION_RULES
+    table = DiscrepancyTable()
+    started = time.perf_counter()
+    
+    # Hash join on name; -1 points at a trailing None for missing records
+    index = dict(zip(actual.names, count()))
+    positions = list(map(index.get, expected.names, repeat(-1)))
+    
+    missing = [n for n, pos in zip(expected.names, positions) if pos < 0]
+    table.extend(
+        missing, 'record', ['exists'] * len(missing),
+        ['not found'] * len(missing), Severity.CRITICAL
+    )
+    
+    # Only VMs with a CMDB record are checked field by field
+    rows = [i for i, pos in zip(count(), positions) if pos >= 0]
+    names = list(map(expected.names.__getitem__, rows))
+    matched = list(map(positions.__getitem__, rows))
+    
+    for field, rule in rules.items():
+        expected_column = expected.columns.get(field) or [None] * len(expected)
+        actual_column = actual.columns.get(field) or [None] * len(actual)
+        exp = list(map(expected_column.__getitem__, rows))
+        act = list(map(actual_column.__getitem__, matched))
+        
+        hits = rule.failures(exp, act)
+        table.extend(
+            [names[i] for i in hits], field, [rule.describe(exp[i]) for i in hits],
+            [act[i] for i in hits], rule.severity
+        )
+    
+    failing = len(table.failed_vms())
+    _record_validation('fleet', started, passed=len(expected) - failing, failed=failing)
+    logger.info(
+        f"Compared {len(expected)} VMs: {len(table)} discrepancies, {failing} failing"
+    )
+    
+    return table
+
+
+#--------------------------------------------------------------
 # Incident Management
 #--------------------------------------------------------------
 
-def create_incident_on_failure(
+class IncidentIndex:
+    """
+    Local SQLite index of open incidents keyed by validation fingerprint.
+    
+    Also remembers fingerprints confirmed to have no open incident, for
+    negative_ttl seconds, so a batched lookup is not repeated per VM.
+    """
+    
+    def __init__(self, path: str = ':memory:', negative_ttl: int = 300):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS incidents (
+                fingerprint TEXT PRIMARY KEY,
+                number TEXT,
+                sys_id TEXT,
+                updated_at REAL,
+                checked_at REAL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS incidents_number ON incidents (number)"
+        )
+    
+    def get(self, fingerprint: str) -> Optional[Dict]:
+        """
+        Look up a fingerprint.
+        
+        Returns:
+            Dict with number/sys_id/updated_at (number is None when known to
+            have no open incident), or None if the index cannot tell
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT number, sys_id, updated_at, checked_at FROM incidents "
+                "WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        if row is None:
+            return None
+        number, sys_id, updated_at, checked_at = row
+        if number is None and time.time() - checked_at > self.negative_ttl:
+            return None
+        return {'number': number, 'sys_id': sys_id, 'updated_at': updated_at}
+    
+    def record_open(
+        self,
+        fingerprint: str,
+        number: str,
+        sys_id: str,
+        updated_at: Optional[float] = None
+    ):
+        """Remember the open incident for a fingerprint."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO incidents VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, number, sys_id, updated_at or now, now)
+            )
+    
+    def record_absent(self, fingerprint: str):
+        """Remember that a fingerprint has no open incident right now."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO incidents VALUES (?, NULL, NULL, NULL, ?)",
+                (fingerprint, time.time())
+            )
+    
+    def touch(self, fingerprint: str):
+        """Mark an incident as updated now."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE incidents SET updated_at = ? WHERE fingerprint = ?",
+                (time.time(), fingerprint)
+            )
+    
+    def forget_number(self, number: str):
+        """Drop an incident (e.g. once resolved)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM incidents WHERE number = ?", (number,))
+
+
+def incident_fingerprint(vm_name: str, environment: str, discrepancies: list) -> str:
+    """
+    Stable fingerprint for a failure: the VM, its environment and the set
+    of discrepancies, independent of order and time.
+    """
+    parts = sorted(
+        f"{d['field']}|{d['severity']}|{d['expected']}|{d['actual']}"
+        for d in discrepancies
+    )
+    digest = hashlib.sha256('\n'.join([vm_name, environment, *parts]).encode())
+    return digest.hexdigest()
+
+
+def _incident_correlation_id(vm_name: str, fingerprint: str) -> str:
+    """Correlation ID stored on the incident so repeated runs can find it."""
+    return f"cmdb-sync-{vm_name}-{fingerprint[:16]}"
+
+
+def _open_incident_params(correlation_ids: List[str]) -> Dict[str, Any]:
+    """Build query parameters to find open incidents by correlation ID."""
+    if len(correlation_ids) == 1:
+        query = f"correlation_id={correlation_ids[0]}"
+    else:
+        query = f"correlation_idIN{','.join(correlation_ids)}"
+    return {
+        'sysparm_query': f"{query}^active=true",
+        'sysparm_fields': 'sys_id,number,correlation_id,sys_updated_on'
+    }
+
+
+def _record_open_incidents(
+    index: IncidentIndex,
+    fingerprints: Dict[str, str],
+    incidents: Iterable[Dict]
+):
+    """
+    Store open incidents found for a set of correlation IDs in the index.
+    
+    Args:
+        index: Local incident index
+        fingerprints: Fingerprint per correlation ID that was queried
+        incidents: Open incident records returned by ServiceNow
+    """
+    found = set()
+    for incident in incidents:
+        fingerprint = fingerprints.get(incident.get('correlation_id'))
+        if fingerprint and fingerprint not in found:
+            found.add(fingerprint)
+            # Keep our last-update time for incidents we already track;
+            # unknown ones count as stale so the next repeat adds a note
+            known = index.get(fingerprint) or {}
+            updated_at = (
+                known.get('updated_at')
+                if known.get('number') == incident.get('number') else None
+            )
+            index.record_open(
+                fingerprint, incident.get('number'), incident.get('sys_id'),
+                updated_at or 1.0
+            )
+    
+    for fingerprint in fingerprints.values():
+        if fingerprint not in found:
+            index.record_absent(fingerprint)
+
+
+def prefetch_open_incidents(
+    client: ServiceNowClient,
+    failures: Dict[str, Tuple[str, list]]
+) -> int:
+    """
+    Look up open incidents for many failures in batched queries.
+    
+    Args:
+        client: ServiceNow API client
+        failures: (environment, discrepancies) per failed VM name
+        
+    Returns:
+        Number of failures that already have an open incident
+    """
+    logger = logging.getLogger(__name__)
+    if client.incident_index is None or not failures:
+        return 0
+    
+    fingerprints = {}
+    for vm_name, (environment, discrepancies) in failures.items():
+        fingerprint = incident_fingerprint(vm_name, environment, discrepancies)
+        fingerprints[_incident_correlation_id(vm_name, fingerprint)] = fingerprint
+    
+    endpoint = f"table/{client.config.incident_table}"
+    fixed_length = len(
+        f"{client.config.base_url}/{endpoint}?"
+        f"{urlencode(_open_incident_params(['', '']))}{KEYSET_QUERY_SUFFIX}"
+        f"&sysparm_limit=000000"
+    )
+    
+    # IDs from VM names with IN-list separators are looked up one at a time
+    bulk_ids, single_ids = _partition_in_query_values(fingerprints)
+    chunks = chain(
+        _chunk_in_query_values(bulk_ids, fixed_length, client.config.max_url_length),
+        ([correlation_id] for correlation_id in single_ids)
+    )
+    for chunk in chunks:
+        params = _open_incident_params(chunk)
+        _record_open_incidents(
+            client.incident_index,
+            {cid: fingerprints[cid] for cid in chunk},
+            _iter_table_records(client, endpoint, params)
+        )
+    
+    existing = sum(
+        1 for fp in fingerprints.values()
+        if (client.incident_index.get(fp) or {}).get('number')
+    )
+    logger.info(f"Found {existing} open incidents for {len(fingerprints)} failures")
+    
+    return existing
+
+
+def _recent_update(client, existing: Dict) -> bool:
+    """True if an existing incident was updated within the update interval."""
+    return time.time() - existing['updated_at'] < client.config.incident_update_interval
+
+
+def _work_note_payload(discrepancies: list) -> Dict[str, str]:
+    """Build the work note added when a known failure repeats."""
+    return {
+        'work_notes': (
+            f"CMDB sync validation failed again at {datetime.now().isoformat()} "
+            f"with the same {len(discrepancies)} discrepancies."
+        )
+    }
+
+
+def _incident_on_failure_steps(
+    client: Any,
+    vm_name: str,
+    environment: str,
+    discrepancies: list,
+    additional_details: Optional[str] = None
+) -> Iterator[Tuple[str, str, Optional[Dict], Optional[Dict]]]:
+    """
+    Plan of create_incident_on_failure, shared by the sync and async versions.
+    
+    A generator that yields (method, endpoint, params, data) requests and
+    is sent each (success, response) in return; its return value is the
+    incident number. Run it with _run_steps or _async_run_steps.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Creating incident for CMDB sync failure: {vm_name}")
+    
+    fingerprint = incident_fingerprint(vm_name, environment, discrepancies)
+    correlation_id = _incident_correlation_id(vm_name, fingerprint)
+    endpoint = f"table/{client.config.incident_table}"
+    index = client.incident_index
+    
+    # Reuse an open incident for the same failure instead of opening another
+    if index is not None:
+        existing = index.get(fingerprint)
+        if existing is None:
+            params = _open_incident_params([correlation_id])
+            success, response = yield 'GET', endpoint, params, None
+            if success:
+                _record_open_incidents(
+                    index, {correlation_id: fingerprint}, response.get('result', [])
+                )
+                existing = index.get(fingerprint)
+        
+        if existing and existing['number']:
+            if _recent_update(client, existing):
+                logger.info(f"[OK] Incident {existing['number']} already open")
+                return existing['number']
+            
+            success, response = yield (
+                'PATCH', f"{endpoint}/{existing['sys_id']}",
+                None, _work_note_payload(discrepancies)
+            )
+            if success:
+                index.touch(fingerprint)
+                logger.info(f"[OK] Updated open incident: {existing['number']}")
+            else:
+                logger.warning(f"Failed to update incident {existing['number']}")
+            return existing['number']
+    
+    # Create incident
+    incident_data = _build_incident_payload(
+        vm_name, environment, discrepancies, additional_details, correlation_id
+    )
+    success, response = yield 'POST', endpoint, None, incident_data
+    
+    incident_number = _parse_incident_response(success, response)
+    if incident_number and index is not None:
+        index.record_open(
+            fingerprint, incident_number, response['result'].get('sys_id')
+        )
+    
+    return incident_number
+
+
+def _run_steps(client: ServiceNowClient, steps: Iterator) -> Any:
+    """Drive a request plan such as _incident_on_failure_steps to completion."""
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(client._make_request(*request))
+    except StopIteration as done:
+        return done.value
+
+
+@traced('create_incident_on_failure', 'vm_name', 'environment')
+def create_incident_on_failure(
+    client: ServiceNowClient,
+    vm_name: str,
+    environment: str,
+    discrepancies: list,
+    additional_details: Optional[str] = None
+) -> Optional[str]:
+    """
+    Create a ServiceNow incident when CMDB validation fails.
+    
+    An open incident for the same failure is reused: it gets a work note
+    (at most once per incident update interval) instead of a duplicate.
+    
+    Args:
+        client: ServiceNow API client
+        vm_name: Name of the VM with sync issues
+        environment: Environment where the issue occurred
+        discrepancies: List of validation discrepancies
+        additional_details: Optional additional context
+        
+    Returns:
+        Incident number if created successfully, None otherwise
+    """
+    return _run_steps(client, _incident_on_failure_steps(
+        client, vm_name, environment, discrepancies, additional_details
+    ))
+
+
+def _build_incident_payload(
+    vm_name: str,
+    environment: str,
+    discrepancies: list,
+    additional_details: Optional[str] = None,
+    correlation_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the incident record for a failed CMDB validation."""
+    # Build incident description
+    description_lines = [
+        f"CMDB Sync Validation Failed",
+        f"",
+        f"VM Name: {vm_name}",
+        f"Environment: {environment}",
+        f"Timestamp: {datetime.now().isoformat()}",
+        f"",
+        f"Discrepancies Found:",
+        f"-" * 40
+    ]
+    
+    for d in discrepancies:
+        description_lines.append(
+            f"[{d['severity'].upper()}] {d['field']}: "
+            f"expected '{d['expected']}', actual '{d['actual']}'"
+        )
+    
+    if additional_details:
+        description_lines.extend([
+            f"",
+            f"Additional Details:",
+            additional_details
+        ])
+    
+    # Determine impact and urgency based on severity
+    has_critical = any(d['severity'] == Severity.CRITICAL for d in discrepancies)
+    has_high = any(d['severity'] == Severity.HIGH for d in discrepancies)
+    
+    if has_critical:
+        impact = '1'  # High
+        urgency = '1'  # High
+    elif has_high:
+        impact = '2'  # Medium
+        urgency = '2'  # Medium
+    else:
+        impact = '3'  # Low
+        urgency = '3'  # Low
+    
+    # Build incident payload
+    incident_data = {
+        'short_description': f"CMDB Sync Failure: {vm_name} ({environment})",
+        'description': '\n'.join(description_lines),
+        'category': 'Software',
+        'subcategory': 'Integration',
+        'impact': impact,
+        'urgency': urgency,
+        'assignment_group': 'Cloud Operations',
+        'caller_id': 'morpheus.integration',
+        'configuration_item': vm_name,
+        'u_environment': environment,  # Custom field example
+        'correlation_id': correlation_id or _incident_correlation_id(
+            vm_name, incident_fingerprint(vm_name, environment, discrepancies)
+        )
+    }
+    
+    return incident_data
+
+
+def _parse_incident_response(success: bool, response: Dict) -> Optional[str]:
+    """Extract the incident number from an incident create response."""
+    logger = logging.getLogger(__name__)
+    
+    if not success:
+        logger.error(f"Failed to create incident: {response.get('error', 'Unknown error')}")
+        return None
+    
+    result = response.get('result', {})
+    incident_number = result.get('number')
+    
+    if incident_number:
+        logger.info(f"[OK] Created incident: {incident_number}")
+        return incident_number
+    
+    logger.error("Incident created but no number returned")
+    return None
+
+
+def resolve_incident(
+    client: ServiceNowClient,
+    incident_number: str,
+    resolution_notes: str
+) -> bool:
+    """
+    Resolve an existing incident.
+    
+    Args:
+        client: ServiceNow API client
+        incident_number: The incident number to resolve
+        resolution_notes: Notes describing the resolution
+        
+    Returns:
+        True if resolved successfully, False otherwise
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Resolving incident: {incident_number}")
+    
+    # First, get the incident sys_id
+    params = _incident_lookup_params(incident_number)
+    
+    endpoint = f"table/{client.config.incident_table}"
+    success, response = client._make_request('GET', endpoint, params=params)
+    
+    sys_id = _parse_incident_lookup(incident_number, success, response)
+    if not sys_id:
+        return False
+    
+    # Update incident to resolved
+    update_data = _resolution_payload(resolution_notes)
+    
+    endpoint = f"table/{client.config.incident_table}/{sys_id}"
+    success, response = client._make_request('PATCH', endpoint, data=update_data)
+    
+    if success and client.incident_index is not None:
+        client.incident_index.forget_number(incident_number)
+    
+    return _parse_resolve_response(incident_number, success, response)
+
+
+def _incident_lookup_params(incident_number: str) -> Dict[str, Any]:
+    """Build query parameters to find an incident's sys_id by number."""
+    return {
+        'sysparm_query': f"number={incident_number}",
+        'sysparm_limit': 1,
+        'sysparm_fields': 'sys_id'
+    }
+
+
+def _parse_incident_lookup(
+    incident_number: str,
+    success: bool,
+    response: Dict
+) -> Optional[str]:
+    """Extract the incident sys_id from a lookup response."""
+    logger = logging.getLogger(__name__)
+    
+    if not success:
+        logger.error("Failed to find incident")
+        return None
+    
+    result = response.get('result', [])
+    if not result:
+        logger.error(f"Incident {incident_number} not found")
+        return None
+    
+    return result[0].get('sys_id')
+
+
+def _resolution_payload(resolution_notes: str) -> Dict[str, str]:
+    """Build the update that moves an incident to Resolved."""
+    return {
+        'state': '6',  # Resolved
+        'close_code': 'Solved (Permanently)',
+        'close_notes': resolution_notes
+    }
+
+
+def _parse_resolve_response(
+    incident_number: str,
+    success: bool,
+    response: Dict
+) -> bool:
+    """Report the outcome of an incident resolve update."""
+    logger = logging.getLogger(__name__)
+    
+    if success:
+        logger.info(f"[OK] Incident {incident_number} resolved")
+        return True
+    
+    logger.error(f"Failed to resolve incident: {response.get('error')}")
+    return False
+
+
+#--------------------------------------------------------------
+# Async Functions
+#--------------------------------------------------------------
+
+async def async_get_cmdb_record(
+    client: AsyncServiceNowClient,
+    vm_name: str,
+    additional_filters: Optional[Dict] = None
+) -> Optional[Dict]:
+    """Async version of get_cmdb_record."""
+    logger = logging.getLogger(__name__)
+    logger.info(f"Looking up CMDB record for VM: {vm_name}")
+    
+    if client.export is not None:
+        return _get_export_record(client, vm_name, additional_filters)
+    
+    if client.cache and not additional_filters:
+        record = client.cache.get(vm_name)
+        if record:
+            logger.info(f"Found cached CMDB record: sys_id={record.get('sys_id')}")
+            return record
+    
+    endpoint = f"table/{client.config.cmdb_table}"
+    params = _cmdb_record_params(vm_name, additional_filters, client.rules)
+    success, response = await client._make_request('GET', endpoint, params=params)
+    
+    record = _parse_cmdb_record_response(vm_name, success, response)
+    if record and client.cache and not additional_filters:
+        client.cache.put(record)
+    
+    return record
+
+
+async def _async_run_steps(client: AsyncServiceNowClient, steps: Iterator) -> Any:
+    """Async version of _run_steps."""
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(await client._make_request(*request))
+    except StopIteration as done:
+        return done.value
+
+
+async def async_create_incident_on_failure(
+    client: AsyncServiceNowClient,
+    vm_name: str,
+    environment: str,
+    discrepancies: list,
+    additional_details: Optional[str] = None
+) -> Optional[str]:
+    """Async version of create_incident_on_failure."""
+    return await _async_run_steps(client, _incident_on_failure_steps(
+        client, vm_name, environment, discrepancies, additional_details
+    ))
+
+
+async def async_resolve_incident(
+    client: AsyncServiceNowClient,
+    incident_number: str,
+    resolution_notes: str
+) -> bool:
+    """Async version of resolve_incident."""
+    logger = logging.getLogger(__name__)
+    logger.info(f"Resolving incident: {incident_number}")
+    
+    endpoint = f"table/{client.config.incident_table}"
+    params = _incident_lookup_params(incident_number)
+    success, response = await client._make_request('GET', endpoint, params=params)
+    
+    sys_id = _parse_incident_lookup(incident_number, success, response)
+    if not sys_id:
+        return False
+    
+    endpoint = f"table/{client.config.incident_table}/{sys_id}"
+    update_data = _resolution_payload(resolution_notes)
+    success, response = await client._make_request('PATCH', endpoint, data=update_data)
+    
+    if success and client.incident_index is not None:
+        client.incident_index.forget_number(incident_number)
+    
+    return _parse_resolve_response(incident_number, success, response)
+
+
+#--------------------------------------------------------------
+# Bulk Incident Operations
+#--------------------------------------------------------------
+
+# Batch API answers meaning the endpoint is missing or disabled, so no
+# operation ran and they can safely be sent as separate requests instead
+BATCH_UNAVAILABLE_STATUSES = frozenset({400, 404, 405})
+
+
+def _run_batch_api(
+    client: ServiceNowClient,
+    operations: List[Dict[str, Any]]
+) -> Optional[Dict[str, Tuple[int, Dict]]]:
+    """
+    Send Table API operations through the ServiceNow Batch API.
+    
+    Only a first request rejected with BATCH_UNAVAILABLE_STATUSES counts
+    as the Batch API being unavailable. A timeout or 5xx may have run the
+    batch on the server, so its operations are reported as failed rather
+    than resent, which could create duplicate incidents.
+    
+    Args:
+        client: ServiceNow API client
+        operations: Dicts with id, method, endpoint and optional data
+        
+    Returns:
+        (status_code, body) per operation id - failed and unserviced
+        operations get status 0 - or None if the Batch API is unavailable
+    """
+    logger = logging.getLogger(__name__)
+    headers = [
+        {'name': 'Content-Type', 'value': 'application/json'},
+        {'name': 'Accept', 'value': 'application/json'}
+    ]
+    api_path = f"/api/now/{client.config.api_version}"
+    
+    results = {}
+    for start in range(0, len(operations), client.config.batch_size):
+        chunk = operations[start:start + client.config.batch_size]
+        payload = {
+            'batch_request_id': f"cmdb-sync-{start}",
+            'rest_requests': [
+                {
+                    'id': op['id'],
+                    'headers': headers,
+                    'url': f"{api_path}/{op['endpoint']}",
+                    'method': op['method'],
+                    'body': base64.b64encode(
+                        json.dumps(op.get('data') or {}).encode()
+                    ).decode()
+                }
+                for op in chunk
+            ]
+        }
+        
+        success, response = client._make_request(
+            'POST', client.config.batch_endpoint, data=payload
+        )
+        if not success:
+            if not results and response.get('status_code') in BATCH_UNAVAILABLE_STATUSES:
+                logger.warning(
+                    f"Batch API unavailable: {response.get('error', 'Unknown error')}"
+                )
+                return None
+            for op in chunk:
+                results[op['id']] = (0, {'error': response.get('error', 'Batch failed')})
+            continue
+        
+        for served in response.get('serviced_requests', []):
+            try:
+                body = json.loads(base64.b64decode(served.get('body') or '') or b'{}')
+            except ValueError:
+                body = {}
+            results[served.get('id')] = (served.get('status_code', 0), body)
+        
+        for op_id in response.get('unserviced_requests', []):
+            results[op_id] = (0, {'error': 'Not serviced by batch API'})
+    
+    return results
+
+
+def _item_error(status_code: int, body: Dict) -> str:
+    """Describe a failed batch item."""
+    error = body.get('error')
+    if isinstance(error, dict):
+        error = error.get('message')
+    return error or f"HTTP {status_code}"
+
+
+def create_incidents_bulk(
+    client: ServiceNowClient,
+    failures: Dict[str, Tuple[str, list]]
+) -> List[Dict[str, Any]]:
+    """
+    Create or update incidents for many failed VMs in Batch API requests.
+    
+    Open incidents are found with one batched lookup (see
+    prefetch_open_incidents) and get a work note instead of a duplicate.
+    Falls back to concurrent requests if the Batch API is unavailable.
+    
+    Args:
+        client: ServiceNow API client
+        failures: (environment, discrepancies) per failed VM name
+        
+    Returns:
+        One result per VM: vm_name, success, incident_number, action
+        (created/updated/existing) and error
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Creating incidents for {len(failures)} failed VMs")
+    
+    index = client.incident_index
+    prefetch_open_incidents(client, failures)
+    
+    endpoint = f"table/{client.config.incident_table}"
+    results = {}
+    operations = []
+    fingerprints = {}
+    
+    for i, (vm_name, (environment, discrepancies)) in enumerate(failures.items()):
+        fingerprint = incident_fingerprint(vm_name, environment, discrepancies)
+        fingerprints[vm_name] = fingerprint
+        existing = index.get(fingerprint) if index is not None else None
+        
+        if existing and existing['number']:
+            if _recent_update(client, existing):
+                results[vm_name] = {
+                    'vm_name': vm_name, 'success': True, 'action': 'existing',
+                    'incident_number': existing['number'], 'error': None
+                }
+                continue
+            operations.append({
+                'id': str(i), 'vm_name': vm_name, 'action': 'updated',
+                'number': existing['number'], 'method': 'PATCH',
+                'endpoint': f"{endpoint}/{existing['sys_id']}",
+                'data': _work_note_payload(discrepancies)
+            })
+        else:
+            operations.append({
+                'id': str(i), 'vm_name': vm_name, 'action': 'created',
+                'method': 'POST', 'endpoint': endpoint,
+                'data': _build_incident_payload(
+                    vm_name, environment, discrepancies,
+                    correlation_id=_incident_correlation_id(vm_name, fingerprint)
+                )
+            })
+    
+    if operations:
+        responses = _run_batch_api(client, operations)
+        if responses is None:
+            # No Batch API - run the same planned operations concurrently
+            responses = asyncio.run(_run_concurrently(client, operations))
+        
+        for op in operations:
+            status_code, body = responses.get(op['id'], (0, {'error': 'No response'}))
+            record = body.get('result') or {}
+            success = status_code in (200, 201)
+            number = record.get('number') or op.get('number')
+            results[op['vm_name']] = {
+                'vm_name': op['vm_name'], 'success': success, 'action': op['action'],
+                'incident_number': number if success else op.get('number'),
+                'error': None if success else _item_error(status_code, body)
+            }
+            if success and index is not None:
+                fingerprint = fingerprints[op['vm_name']]
+                if op['action'] == 'created':
+                    index.record_open(fingerprint, number, record.get('sys_id'))
+                else:
+                    index.touch(fingerprint)
+    
+    ordered = [results[vm_name] for vm_name in failures if vm_name in results]
+    failed = sum(1 for r in ordered if not r['success'])
+    logger.info(
+        f"Incident bulk create complete: {len(ordered) - failed} succeeded, {failed} failed"
+    )
+    
+    return ordered
+
+
+def resolve_incidents_bulk(
+    client: ServiceNowClient,
+    incident_numbers: List[str],
+    resolution_notes: str
+) -> List[Dict[str, Any]]:
+    """
+    Resolve many incidents with batched lookups and Batch API updates.
+    
+    sys_ids are found with numberIN queries instead of one GET per
+    incident. Falls back to concurrent PATCHes if the Batch API is
+    unavailable.
+    
+    Args:
+        client: ServiceNow API client
+        incident_numbers: Incident numbers to resolve
+        resolution_notes: Notes describing the resolution
+        
+    Returns:
+        One result per incident: incident_number, success and error
+    """
+    logger = logging.getLogger(__name__)
+    numbers = list(dict.fromkeys(incident_numbers))
+    logger.info(f"Resolving {len(numbers)} incidents")
+    
+    endpoint = f"table/{client.config.incident_table}"
+    base_params = {'sysparm_fields': 'sys_id,number'}
+    fixed_length = len(
+        f"{client.config.base_url}/{endpoint}?{urlencode(base_params)}"
+        f"&sysparm_limit=000000&"
+        f"{urlencode({'sysparm_query': 'numberIN' + KEYSET_QUERY_SUFFIX})}"
+    )
+    
+    sys_ids = {}
+    for chunk in _chunk_in_query_values(numbers, fixed_length, client.config.max_url_length):
+        params = dict(base_params, sysparm_query=f"numberIN{','.join(chunk)}")
+        for record in _iter_table_records(client, endpoint, params):
+            sys_ids[record.get('number')] = record.get('sys_id')
+    
+    results = {
+        number: {'incident_number': number, 'success': False, 'error': 'Not found'}
+        for number in numbers if number not in sys_ids
+    }
+    
+    operations = [
+        {
+            'id': str(i), 'number': number, 'method': 'PATCH',
+            'endpoint': f"{endpoint}/{sys_ids[number]}",
+            'data': _resolution_payload(resolution_notes)
+        }
+        for i, number in enumerate(numbers) if number in sys_ids
+    ]
+    
+    responses = _run_batch_api(client, operations) if operations else {}
+    if responses is None:
+        responses = asyncio.run(_run_concurrently(client, operations))
+    
+    for op in operations:
+        status_code, body = responses.get(op['id'], (0, {'error': 'No response'}))
+        success = status_code in (200, 201)
+        results[op['number']] = {
+            'incident_number': op['number'], 'success': success,
+            'error': None if success else _item_error(status_code, body)
+        }
+        if success and client.incident_index is not None:
+            client.incident_index.forget_number(op['number'])
+    
+    ordered = [results[number] for number in numbers]
+    failed = sum(1 for r in ordered if not r['success'])
+    logger.info(
+        f"Incident bulk resolve complete: {len(ordered) - failed} resolved, {failed} failed"
+    )
+    
+    return ordered
+
+
+async def _run_concurrently(
+    client: ServiceNowClient,
+    operations: List[Dict[str, Any]]
+) -> Dict[str, Tuple[int, Dict]]:
+    """
+    Run planned Batch API operations as concurrent requests instead.
+    
+    The fallback when the Batch API is unavailable. Uses the caller's
+    client, so its session and incident index are shared.
+    
+    Returns:
+        (status_code, body) per operation id, like _run_batch_api; the
+        status is 200 for any success and 0 for a failure
+    """
+    async with AsyncServiceNowClient(client.config, client=client) as async_client:
+        responses = await asyncio.gather(*[
+            async_client._make_request(op['method'], op['endpoint'], data=op['data'])
+            for op in operations
+        ])
+    
+    return {
+        op['id']: (200 if success else 0, body)
+        for op, (success, body) in zip(operations, responses)
+    }
+
+
+#--------------------------------------------------------------
+# Terraform Expected Values
+#--------------------------------------------------------------
+
+# Output name suffixes (vmware-vm module and environment outputs) per field
+TERRAFORM_OUTPUT_SUFFIXES = {
+    'name': ('_name',),
+    'ip_address': ('_default_ip_address', '_ip_address', '_ip'),
+    'cpu_count': ('_cpu',),
+    'ram': ('_memory',)
+}
+
+# Terraform resource types that describe a VM, and their attribute names
+TERRAFORM_VM_RESOURCES = {
+    'vsphere_virtual_machine': {
+        'name': 'name',
+        'ip_address': 'default_ip_address',
+        'cpu_count': 'num_cpus',
+        'ram': 'memory'
+    }
+}
+
+
+class _JSONStreamReader:
+    """
+    Incremental reader for one JSON document.
+    
+    Walks the top-level object key by key, decoding one value at a time,
+    and can stream the elements of a top-level array. Memory use is bounded
+    by the largest single value rather than by the file size.
+    """
+    
+    WHITESPACE = ' \t\r\n'
+    
+    def __init__(self, fp, chunk_size: int = 1 << 16):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+    
+    def _fill(self, size: Optional[int] = None) -> bool:
+        """Append more input, dropping what has been consumed."""
+        data = self.fp.read(size or self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos] if self.pos < len(self.buf) else ''
+    
+    def expect(self, char: str):
+        """Consume the next non-whitespace character, which must be char."""
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}")
+        self.pos += 1
+    
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow reads geometrically so huge values are not re-parsed often
+            self._fill(size)
+            size *= 2
+    
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller must consume each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+    
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the decoded elements of an array one at a time."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def _expected_from_outputs(outputs: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Build expected values from Terraform outputs.
+    
+    Outputs are grouped by prefix: vm_name/vm_cpu/vm_memory from the
+    vmware-vm module, or web_server_name/web_server_ip from an environment.
+    Values may be scalars, lists (count) or maps (for_each).
+    """
+    groups = {}
+    for key, output in outputs.items():
+        value = output.get('value') if isinstance(output, dict) else output
+        for field, suffixes in TERRAFORM_OUTPUT_SUFFIXES.items():
+            suffix = next((x for x in suffixes if key.endswith(x)), None)
+            if suffix:
+                groups.setdefault(key[:-len(suffix)], {})[field] = value
+                break
+    
+    expected = {}
+    for fields in groups.values():
+        names = fields.get('name')
+        if names is None:
+            continue
+        
+        if isinstance(names, list):
+            keys = range(len(names))
+        elif isinstance(names, dict):
+            keys = list(names)
+        else:
+            keys = [None]
+        
+        for k in keys:
+            entry = {}
+            for field, value in fields.items():
+                if isinstance(value, (list, dict)) and k is not None:
+                    try:
+                        value = value[k]
+                    except (IndexError, KeyError):
+                        value = None
+                if value not in (None, ''):
+                    entry[field] = value
+            if entry.get('name'):
+                expected[entry['name']] = entry
+    
+    return expected
+
+
+def _expected_from_resource(resource: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield expected values for each instance of a VM resource in tfstate."""
+    attribute_map = TERRAFORM_VM_RESOURCES.get(resource.get('type'))
+    if not attribute_map or resource.get('mode', 'managed') != 'managed':
+        return
+    
+    for instance in resource.get('instances', []):
+        attributes = instance.get('attributes') or {}
+        entry = {
+            field: attributes.get(attribute)
+            for field, attribute in attribute_map.items()
+            if attributes.get(attribute) not in (None, '')
+        }
+        disks = attributes.get('disk') or []
+        if disks:
+            entry['disk_space'] = sum(d.get('size', 0) or 0 for d in disks)
+        if entry.get('name'):
+            yield entry
+
+
+def load_terraform_expected(
+    path: str,
+    environment: str
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Load expected values for every VM from Terraform in one pass.
+    
+    Accepts either `terraform output -json` files or terraform.tfstate.
+    State files are streamed resource by resource, so large states are
+    never loaded whole. Managed VM resources take precedence over outputs.
+    
+    Args:
+        path: Path to the outputs JSON or tfstate file
+        environment: Environment name to expect on every VM
+        
+    Returns:
+        Dict mapping VM name to expected values
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Loading Terraform expected values from {path}")
+    
+    from_resources = {}
+    outputs = {}
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _JSONStreamReader(f)
+        for key in reader.iter_object():
+            if key == 'resources' and reader.peek() == '[':
+                for resource in reader.iter_array():
+                    for entry in _expected_from_resource(resource):
+                        from_resources[entry['name']] = entry
+            elif key == 'outputs':
+                # tfstate keeps outputs under one key
+                outputs.update(reader.value() or {})
+            else:
+                value = reader.value()
+                # terraform output -json: every top-level key is an output
+                if isinstance(value, dict) and 'value' in value:
+                    outputs[key] = value
+    
+    expected = _expected_from_outputs(outputs)
+    expected.update(from_resources)
+    
+    for entry in expected.values():
+        entry['environment'] = environment
+    
+    logger.info(f"Loaded expected values for {len(expected)} VMs")
+    
+    return expected
+
+
+#--------------------------------------------------------------
+# Ansible Inventory Expected Values
+#--------------------------------------------------------------
+
+# Host ranges such as web-[01:20] or db-[a:c], with an optional step
+ANSIBLE_HOST_RANGE = re.compile(
+    r'\[([0-9]+|[a-z]):([0-9]+|[a-z])(?::([0-9]+))?\]', re.IGNORECASE
+)
+
+
+def _expand_ansible_hosts(pattern: str) -> List[str]:
+    """Expand Ansible host ranges; leading zeros set the width."""
+    match = ANSIBLE_HOST_RANGE.search(pattern)
+    if not match:
+        return [pattern]
+    
+    start, end = match.group(1), match.group(2)
+    step = int(match.group(3) or 1)
+    if start.isdigit():
+        width = len(start) if start.startswith('0') else 0
+        values = [str(i).zfill(width) for i in range(int(start), int(end) + 1, step)]
+    else:
+        values = [chr(c) for c in range(ord(start), ord(end) + 1, step)]
+    
+    prefix, suffix = pattern[:match.start()], pattern[match.end():]
+    return [host for v in values for host in _expand_ansible_hosts(prefix + v + suffix)]
+
+
+def _is_ip_address(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def load_ansible_inventory(
+    path: str,
+    environment: str,
+    fields: Iterable[str] = VALIDATION_RULES
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Load expected values for every host in an Ansible INI inventory.
+    
+    ansible_host is expected as the IP address when it is one, and
+    variables named after a validated field (cpu_count, ram, ...) are
+    expected as given. Variables apply in Ansible's order: all:vars,
+    parent groups, the host's groups, then the host line. Hosts whose
+    environment variable names another environment are skipped.
+    
+    Args:
+        path: Path to the INI inventory
+        environment: Environment name to expect on every VM
+        fields: Fields taken from inventory variables
+        
+    Returns:
+        Dict mapping host name to expected values
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Loading Ansible inventory from {path}")
+    
+    host_vars: Dict[str, Dict[str, str]] = {}
+    host_groups: Dict[str, set] = {}
+    group_vars: Dict[str, Dict[str, str]] = {}
+    parents: Dict[str, set] = {}
+    section, kind = 'ungrouped', 'hosts'
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section, _, kind = line[1:-1].partition(':')
+                kind = kind or 'hosts'
+                continue
+            
+            tokens = shlex.split(line, comments=True)
+            if not tokens:
+                continue
+            if kind == 'vars':
+                key, _, value = ' '.join(tokens).partition('=')
+                group_vars.setdefault(section, {})[key.strip()] = value.strip()
+            elif kind == 'children':
+                parents.setdefault(tokens[0], set()).add(section)
+            else:
+                variables = dict(token.partition('=')[::2] for token in tokens[1:])
+                for host in _expand_ansible_hosts(tokens[0]):
+                    host_vars.setdefault(host, {}).update(variables)
+                    host_groups.setdefault(host, set()).add(section)
+    
+    def ancestors(group: str, found: set) -> set:
+        for parent in parents.get(group, ()):
+            if parent not in found:
+                found.add(parent)
+                ancestors(parent, found)
+        return found
+    
+    wanted = set(fields) - {'name', 'environment'}
+    expected = {}
+    skipped = 0
+    for host, own_vars in host_vars.items():
+        groups = host_groups[host]
+        inherited = set()
+        for group in groups:
+            ancestors(group, inherited)
+        
+        variables = dict(group_vars.get('all', {}))
+        for group in sorted(inherited - groups) + sorted(groups):
+            variables.update(group_vars.get(group, {}))
+        variables.update(own_vars)
+        
+        if variables.get('environment', environment) != environment:
+            skipped += 1
+            continue
+        
+        entry = {'name': host, 'environment': environment}
+        address = variables.get('ansible_host')
+        if address and _is_ip_address(address):
+            entry['ip_address'] = address
+        entry.update({k: v for k, v in variables.items() if k in wanted})
+        expected[host] = entry
+    
+    logger.info(
+        f"Loaded expected values for {len(expected)} hosts"
+        + (f" ({skipped} in other environments skipped)" if skipped else '')
+    )
+    
+    return expected
+
+
+#--------------------------------------------------------------
+# Streaming Result Output
+#--------------------------------------------------------------
+
+# CSV columns; summary rows fill the count columns instead of the VM ones
+RESULT_CSV_FIELDS = [
+    'type', 'vm_name', 'environment', 'passed', 'sys_id', 'ip_address',
+    'discrepancy_count', 'failed_fields', 'discrepancies', 'incident_number',
+    'total', 'passed_count', 'failed_count', 'expected_count', 'cmdb_count',
+    'matched_count', 'orphan_count', 'missing_count', 'mismatch_count',
+    'duplicate_count', 'error'
+]
+
+
+def compact_result(vm_result: Dict[str, Any]) -> Dict[str, Any]:
+    """One VM's validation result without the full CMDB record."""
+    record = vm_result.get('cmdb_record') or {}
+    return {
+        'type': 'result',
+        'vm_name': vm_result['vm_name'],
+        'environment': vm_result['environment'],
+        'passed': vm_result['passed'],
+        'sys_id': record.get('sys_id'),
+        'discrepancies': vm_result['discrepancies'],
+        'incident_number': vm_result.get('incident_number')
+    }
+
+
+def result_summary(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary record for a run, without the per-VM results or findings."""
+    summary = {'type': 'summary'}
+    summary.update({k: v for k, v in results.items() if not isinstance(v, list)})
+    return summary
+
+
+class ResultWriter(abc.ABC):
+    """
+    Writes one compact line per validated VM as results arrive.
+    
+    Lines are buffered until flush(), which the batch workflow calls after
+    every chunk, so consumers see results while the run continues.
+    
+    In append mode the stream continues the output of an earlier run.
+    A resumed run calls restart() with the offset saved in its checkpoint,
+    dropping lines written after that point (a chunk that never finished,
+    the aborted run's summary) before writing on.
+    """
+    
+    def __init__(self, stream, append: bool = False):
+        self.stream = stream
+        self.append = append
+        self.count = 0
+    
+    def write(self, vm_result: Dict[str, Any]):
+        """Write one VM's result."""
+        self._write(compact_result(vm_result))
+        self.count += 1
+    
+    def write_summary(self, results: Dict[str, Any]):
+        """Write the final summary record."""
+        self._write(result_summary(results))
+    
+    def write_record(self, record: Dict[str, Any]):
+        """Write a record that already has its type, such as a reconciliation finding."""
+        self._write(record)
+        self.count += 1
+    
+    @abc.abstractmethod
+    def _write(self, record: Dict[str, Any]):
+        """Write one record to the stream in this format."""
+    
+    def _start(self):
+        """Write whatever begins a new output (nothing by default)."""
+    
+    def tell(self) -> Optional[int]:
+        """Offset of the flushed output, or None if the stream is not a file."""
+        self.flush()
+        return self.stream.tell() if self.stream.seekable() else None
+    
+    def restart(self, offset: Optional[int]):
+        """
+        Cut earlier output back to offset and continue from there.
+        
+        Args:
+            offset: Offset saved by the resumed run, or None to start the
+                output over
+        """
+        if not self.append:
+            return
+        self.stream.truncate(offset or 0)
+        self.stream.seek(offset or 0)
+        if not offset:
+            self._start()
+    
+    def flush(self):
+        self.stream.flush()
+    
+    def close(self):
+        """Flush, and close the stream unless it is stdout."""
+        self.flush()
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+
+class NDJSONResultWriter(ResultWriter):
+    """One JSON object per line."""
+    
+    def _write(self, record: Dict[str, Any]):
+        self.stream.write(
+            json.dumps(record, separators=(',', ':'), default=json_default) + '\n'
+        )
+
+
+class CSVResultWriter(ResultWriter):
+    """One CSV row per VM; discrepancies are a compact JSON cell."""
+    
+    def __init__(self, stream, append: bool = False):
+        super().__init__(stream, append)
+        self._writer = csv.DictWriter(
+            stream, fieldnames=RESULT_CSV_FIELDS, extrasaction='ignore'
+        )
+        if not append:
+            self._start()
+    
+    def _start(self):
+        self._writer.writeheader()
+    
+    def _write(self, record: Dict[str, Any]):
+        discrepancies = record.get('discrepancies')
+        if discrepancies is not None:
+            record = dict(record)
+            record['discrepancy_count'] = len(discrepancies)
+            record['failed_fields'] = ';'.join(
+                f"{d['field']}:{d['severity']}" for d in discrepancies
+            )
+            record['discrepancies'] = json.dumps(
+                discrepancies, separators=(',', ':'), default=json_default
+            )
+        self._writer.writerow(record)
+
+
+RESULT_WRITERS = {
+    'ndjson': NDJSONResultWriter,
+    'csv': CSVResultWriter
+}
+
+
+def open_result_writer(
+    output_format: str,
+    path: str = '-',
+    append: bool = False
+) -> ResultWriter:
+    """
+    Open a streaming result writer.
+    
+    Args:
+        output_format: 'ndjson' or 'csv'
+        path: Output file, or - for stdout
+        append: Continue an existing file (resumed runs); no new CSV header
+        
+    Returns:
+        ResultWriter for the format
+    """
+    if output_format not in RESULT_WRITERS:
+        raise ValueError(
+            f"Unknown output format '{output_format}' "
+            f"(expected one of {', '.join(RESULT_WRITERS)})"
+        )
+    if path in ('', '-'):
+        return RESULT_WRITERS[output_format](sys.stdout)
+    
+    append = append and os.path.exists(path) and os.path.getsize(path) > 0
+    stream = open(path, 'a' if append else 'w', encoding='utf-8', newline='')
+    return RESULT_WRITERS[output_format](stream, append)
+
+
+#--------------------------------------------------------------
+# Checkpointed Runs
+#--------------------------------------------------------------
+
+def checkpoint_key(
+    environment: str,
+    vm_names: List[str],
+    expected_values: Dict[str, Dict[str, Any]]
+) -> str:
+    """Identify a batch run by its environment, VM list and expected values."""
+    digest = hashlib.sha256(environment.encode())
+    digest.update(json.dumps(vm_names).encode())
+    digest.update(json.dumps(expected_values, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class ValidationCheckpoint:
+    """
+    Progress of one batch validation run, saved after every chunk.
+    
+    Holds the run key, the cursor (VMs processed so far, in input order)
+    and the result of every processed VM including its incident number,
+    so a resumed run skips those VMs without fetching them again or
+    touching their incidents. The cursor and the chunk's results are
+    committed in one transaction.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS results (
+                position INTEGER PRIMARY KEY,
+                name TEXT,
+                passed INTEGER,
+                incident_number TEXT,
+                result TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+    
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def start(self, run_key: str):
+        """Discard any saved progress and begin a new run."""
+        with self._conn:
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [('run_key', run_key), ('cursor', '0'), ('status', 'running')]
+            )
+    
+    def resume(self, run_key: str) -> int:
+        """
+        Return the cursor to continue from, or start over.
+        
+        Args:
+            run_key: checkpoint_key() of the run being resumed
+            
+        Returns:
+            Number of VMs already processed (0 if there is nothing to resume)
+        """
+        logger = logging.getLogger(__name__)
+        saved_key = self._meta('run_key')
+        if saved_key is None:
+            logger.warning(f"No checkpoint in {self.path} - starting from the beginning")
+        elif saved_key != run_key:
+            logger.warning(
+                f"Checkpoint in {self.path} is for a different VM list or expected "
+                f"values - starting from the beginning"
+            )
+        else:
+            return int(self._meta('cursor') or 0)
+        
+        self.start(run_key)
+        return 0
+    
+    def save(
+        self,
+        cursor: int,
+        vm_results: List[Dict[str, Any]],
+        output_offset: Optional[int] = None
+    ):
+        """Record a processed chunk, advance the cursor and note the output offset."""
+        first = cursor - len(vm_results)
+        rows = [
+            (first + i, r['vm_name'], int(r['passed']), r.get('incident_number'),
+             json.dumps(r, separators=(',', ':'), default=json_default))
+            for i, r in enumerate(vm_results)
+        ]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('cursor', ?)", (str(cursor),)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('output_offset', ?)",
+                (None if output_offset is None else str(output_offset),)
+            )
+    
+    def output_offset(self) -> Optional[int]:
+        """Result file offset saved with the cursor, if the output was a file."""
+        value = self._meta('output_offset')
+        return int(value) if value else None
+    
+    def finish(self):
+        """Mark the run complete."""
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('status', 'complete')")
+    
+    def counts(self) -> Tuple[int, int]:
+        """Return (passed, failed) counts of the processed VMs."""
+        passed, total = self._conn.execute(
+            "SELECT COALESCE(SUM(passed), 0), COUNT(*) FROM results"
+        ).fetchone()
+        return passed, total - passed
+    
+    def results(self) -> Iterator[Dict[str, Any]]:
+        """Yield the saved per-VM results in input order."""
+        for (result,) in self._conn.execute("SELECT result FROM results ORDER BY position"):
+            yield json.loads(result)
+    
+    def close(self):
+        """Close the underlying database."""
+        self._conn.close()
+
+
+#--------------------------------------------------------------
+# Main Validation Workflow
+#--------------------------------------------------------------
+
+def _simulate_cmdb_record(
+    vm_name: str,
+    environment: str,
+    expected_values: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Build a fake CMDB record for demo mode."""
+    return {
+        'sys_id': 'demo-sys-id-12345',
+        'name': vm_name,
+        'ip_address': '192.168.1.100',
+        'cpu_count': expected_values.get('cpu_count', '2'),
+        'ram': expected_values.get('ram', '4096'),
+        'disk_space': expected_values.get('disk_space', '40'),
+        'environment': environment,
+        'state': 'On',
+        'managed_by': 'Morpheus'
+    }
+
+
+@traced('run_validation', 'vm_name', 'environment')
+def run_validation(
+    vm_name: str,
+    environment: str,
+    expected_values: Dict[str, Any],
+    create_incident: bool = True,
+    demo_mode: bool = False,
+    client: Optional[ServiceNowClient] = None
+) -> Tuple[bool, Dict]:
+    """
+    Run full CMDB validation workflow.
+    
+    Args:
+        vm_name: Name of the VM to validate
+        environment: Environment name
+        expected_values: Expected values to validate against
+        create_incident: Whether to create incident on failure
+        demo_mode: Run without actual API calls
+        client: Existing client to reuse (a new one is created if omitted)
+        
+    Returns:
+        Tuple of (passed: bool, results: dict)
+    """
+    logger = logging.getLogger(__name__)
+    
+    logger.info("=" * 60)
+    logger.info("  CMDB VALIDATION WORKFLOW")
+    logger.info("=" * 60)
+    logger.info(f"VM Name: {vm_name}")
+    logger.info(f"Environment: {environment}")
+    logger.info(f"Demo Mode: {demo_mode}")
+    logger.info("=" * 60)
+    
+    results = {
+        'vm_name': vm_name,
+        'environment': environment,
+        'timestamp': datetime.now().isoformat(),
+        'passed': False,
+        'cmdb_record': None,
+        'discrepancies': [],
+        'incident_number': None
+    }
+    
+    # Demo mode - simulate validation
+    if demo_mode:
+        logger.info("Running in DEMO MODE - simulating API responses")
+        
+        # Simulate CMDB record
+        simulated_record = _simulate_cmdb_record(
+            vm_name, environment, expected_values
+        )
+        
+        results['cmdb_record'] = simulated_record
+        passed, discrepancies = validate_sync(
+            expected_values, simulated_record,
+            get_validation_rules(ServiceNowConfig().rules_path)
+        )
+        results['passed'] = passed
+        results['discrepancies'] = discrepancies
+        
+        logger.info("Demo validation complete")
+        return passed, results
+    
+    # Production mode
+    if client is None:
+        config = ServiceNowConfig()
+        
+        if not config.validate():
+            logger.error("ServiceNow configuration incomplete")
+            logger.error("Set environment variables: SNOW_INSTANCE, SNOW_USERNAME, SNOW_PASSWORD")
+            results['error'] = "Configuration incomplete"
+            return False, results
+        
+        client = ServiceNowClient(config)
+    
+    # Step 1: Retrieve CMDB record
+    cmdb_record = get_cmdb_record(client, vm_name)
+    results['cmdb_record'] = cmdb_record
+    
+    # Step 2: Validate sync
+    passed, discrepancies = validate_sync(expected_values, cmdb_record, client.rules)
+    results['passed'] = passed
+    results['discrepancies'] = discrepancies
+    
+    # Step 3: Create incident if validation failed
+    if not passed and create_incident:
+        incident_number = create_incident_on_failure(
+            client=client,
+            vm_name=vm_name,
+            environment=environment,
+            discrepancies=discrepancies
+        )
+        results['incident_number'] = incident_number
+    
+    return passed, results
+
+
+@traced('run_batch_validation', 'environment')
+def run_batch_validation(
+    vm_names: List[str],
+    environment: str,
+    expected_values: Dict[str, Dict[str, Any]],
+    create_incident: bool = True,
+    demo_mode: bool = False,
+    writer: Optional[ResultWriter] = None,
+    checkpoint: Optional[ValidationCheckpoint] = None,
+    resume: bool = False
+) -> Tuple[bool, Dict]:
+    """
+    Run CMDB validation for many VMs using bulk CMDB queries.
+    
+    VMs are processed in chunks of config.validation_chunk_size: one set
+    of bulk queries, one columnar comparison and one batch of incidents
+    per chunk. With a writer, each chunk's results are streamed and then
+    dropped, so memory stays flat however large the fleet is.
+    
+    With a checkpoint, progress is saved after every chunk and resume
+    continues after the last saved chunk. Restored results are counted
+    but not written to the writer again; an appending writer is first
+    cut back to the output offset saved with the checkpoint. A failed
+    CMDB lookup aborts the run before its chunk is saved, so resume
+    retries that chunk rather than reporting its VMs as missing.
+    
+    Args:
+        vm_names: Names of the VMs to validate
+        environment: Environment name
+        expected_values: Expected values per VM name
+        create_incident: Whether to create incidents for failed VMs
+        demo_mode: Run without actual API calls
+        writer: Stream per-VM results here instead of collecting them
+        checkpoint: Save progress here after every chunk
+        resume: Continue from the checkpoint instead of starting over
+        
+    Returns:
+        Tuple of (all_passed: bool, results: dict); results['results'] is
+        empty when a writer is given
+    """
+    logger = logging.getLogger(__name__)
+    
+    logger.info("=" * 60)
+    logger.info("  CMDB BATCH VALIDATION WORKFLOW")
+    logger.info("=" * 60)
+    logger.info(f"VM Count: {len(vm_names)}")
+    logger.info(f"Environment: {environment}")
+    logger.info(f"Demo Mode: {demo_mode}")
+    logger.info("=" * 60)
+    
+    results = {
+        'environment': environment,
+        'timestamp': datetime.now().isoformat(),
+        'passed': False,
+        'total': len(vm_names),
+        'passed_count': 0,
+        'failed_count': 0,
+        'results': []
+    }
+    
+    config = ServiceNowConfig()
+    client = None
+    if demo_mode:
+        logger.info("Running in DEMO MODE - simulating API responses")
+        rules = get_validation_rules(config.rules_path)
+    else:
+        if not config.validate():
+            logger.error("ServiceNow configuration incomplete")
+            logger.error("Set environment variables: SNOW_INSTANCE, SNOW_USERNAME, SNOW_PASSWORD")
+            results['error'] = "Configuration incomplete"
+            return False, results
+        
+        # One session and a handful of bulk queries per chunk
+        client = ServiceNowClient(config)
+        rules = client.rules
+    
+    resume_at = 0
+    if checkpoint is not None:
+        run_key = checkpoint_key(environment, vm_names, expected_values)
+        resume_at = checkpoint.resume(run_key) if resume else 0
+        if not resume:
+            checkpoint.start(run_key)
+    
+    if writer and checkpoint is not None:
+        # Drop output the checkpoint does not cover, or all of it if starting over
+        writer.restart(checkpoint.output_offset() if resume_at else None)
+    
+    if resume_at:
+        logger.info(f"Resuming after {resume_at} of {len(vm_names)} VMs from checkpoint")
+        results['passed_count'], results['failed_count'] = checkpoint.counts()
+        if not writer:
+            results['results'].extend(checkpoint.results())
+    
+    chunk_size = max(1, config.validation_chunk_size)
+    for start in range(resume_at, len(vm_names), chunk_size):
+        chunk = vm_names[start:start + chunk_size]
+        try:
+            chunk_results = _validate_chunk(
+                client, chunk, environment, expected_values, rules, create_incident
+            )
+        except RuntimeError as e:
+            # The checkpoint still ends at the previous chunk
+            logger.error(f"CMDB lookup failed - batch validation aborted at VM {start}: {e}")
+            results['error'] = str(e)
+            return False, results
+        
+        for vm_result in chunk_results:
+            if vm_result['passed']:
+                results['passed_count'] += 1
+            else:
+                results['failed_count'] += 1
+            if writer:
+                writer.write(vm_result)
+            else:
+                results['results'].append(vm_result)
+        
+        if writer:
+            writer.flush()
+        
+        # Saved after the flush; a crash in between leaves lines past the
+        # saved offset, which a resumed run cuts off
+        if checkpoint is not None:
+            checkpoint.save(
+                start + len(chunk), chunk_results, writer.tell() if writer else None
+            )
+    
+    if checkpoint is not None:
+        checkpoint.finish()
+    results['passed'] = results['failed_count'] == 0
+    
+    logger.info(
+        f"Batch validation complete: {results['passed_count']} passed, "
+        f"{results['failed_count']} failed"
+    )
+    
+    return results['passed'], results
+
+
+def _validate_chunk(
+    client: Optional[ServiceNowClient],
+    vm_names: List[str],
+    environment: str,
+    expected_values: Dict[str, Dict[str, Any]],
+    rules: Dict[str, ValidationRule],
+    create_incident: bool
+) -> List[Dict[str, Any]]:
+    """Validate one chunk of a batch run (demo records when client is None)."""
+    logger = logging.getLogger(__name__)
+    
+    if client is None:
+        records = {
+            name: _simulate_cmdb_record(
+                name, environment, expected_values.get(name, {})
+            )
+            for name in vm_names
+        }
+    else:
+        # Strict: a failed page must not turn its VMs into "not found" failures
+        records = get_cmdb_records_bulk(client, vm_names, strict=True)
+    
+    # Compare the whole chunk in one columnar pass
+    table = compare_fleet(
+        FleetSnapshot.from_mapping(
+            {n: expected_values.get(n, {}) for n in vm_names}, rules
+        ),
+        FleetSnapshot.from_mapping(records, rules),
+        rules
+    )
+    discrepancies_by_vm = table.by_vm()
+    failed_vms = table.failed_vms()
+    
+    chunk_results = []
+    for vm_name in vm_names:
+        passed = vm_name not in failed_vms
+        vm_result = {
+            'vm_name': vm_name,
+            'environment': environment,
+            'passed': passed,
+            'cmdb_record': records.get(vm_name),
+            'discrepancies': discrepancies_by_vm.get(vm_name, []),
+            'incident_number': None
+        }
+        
+        if not passed:
+            logger.error(
+                f"[FAIL] {vm_name}: " + ', '.join(
+                    f"{d['field']} ({d['severity']})" for d in vm_result['discrepancies']
+                )
+            )
+        chunk_results.append(vm_result)
+    
+    # Create (or update) incidents for all failures in Batch API requests
+    failures = {
+        r['vm_name']: (environment, r['discrepancies'])
+        for r in chunk_results if not r['passed']
+    }
+    if failures and create_incident and client is not None:
+        incident_numbers = {
+            r['vm_name']: r['incident_number']
+            for r in create_incidents_bulk(client, failures)
+        }
+        for vm_result in chunk_results:
+            if vm_result['vm_name'] in incident_numbers:
+                vm_result['incident_number'] = incident_numbers[vm_result['vm_name']]
+    
+    return chunk_results
+
+
+def refresh_cache(environment: str) -> int:
+    """
+    Bring the local CMDB cache up to date for an environment.
+    
+    Args:
+        environment: Environment name
+        
+    Returns:
+        Number of records fetched (0 if the cache is not configured)
+    """
+    logger = logging.getLogger(__name__)
+    config = ServiceNowConfig()
+    
+    if not config.cache_path:
+        logger.warning("SNOW_CACHE_PATH not set - skipping cache refresh")
+        return 0
+    if not config.validate():
+        logger.error("ServiceNow configuration incomplete - skipping cache refresh")
+        return 0
+    
+    client = ServiceNowClient(config)
+    try:
+        fetched = client.cache.refresh(client, environment)
+    except RuntimeError as e:
+        # Records already stored are current; the rest are looked up live
+        logger.error(f"CMDB cache refresh incomplete - keeping the previous watermark: {e}")
+        fetched = 0
+    evicted = client.cache.evict_expired()
+    if evicted:
+        logger.info(f"Evicted {evicted} expired cache entries")
+    
+    return fetched
+
+
+def read_vm_list(path: str) -> List[str]:
+    """
+    Read VM names from a file, one per line.
+    
+    Blank lines and lines starting with '#' are ignored.
+    
+    Args:
+        path: File path, or '-' to read from stdin
+        
+    Returns:
+        List of VM names in file order
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    
+    return [
+        line.strip() for line in lines
+        if line.strip() and not line.strip().startswith('#')
+    ]
+
+
+#--------------------------------------------------------------
+# Reconciliation
+#--------------------------------------------------------------
+
+# Report list per reconciliation record type
+RECONCILE_KINDS = {
+    'orphan': 'orphans',
+    'missing': 'missing',
+    'mismatch': 'mismatches',
+    'duplicate': 'duplicates'
+}
+
+
+def reconcile_environment(
     client: ServiceNowClient,
-    vm_name: str,
     environment: str,
-    discrepancies: list,
-    additional_details: Optional[str] = None
-) -> Optional[str]:
+    expected: Dict[str, Dict[str, Any]],
+    writer: Optional[ResultWriter] = None
+) -> Tuple[bool, Dict[str, Any]]:
     """
-    Create a ServiceNow incident when CMDB validation fails.
+    Reconcile every CMDB CI in an environment against the expected inventory.
+    
+    CMDB records are streamed page by page and joined against a hash index
+    of the expected inventory in one pass: CIs without an expected VM are
+    orphans, expected VMs without a CI are missing, repeated CI names are
+    duplicates, and matched pairs are compared with compare_fleet in
+    chunks of config.validation_chunk_size. Cost is linear in the size of
+    both sides.
     
     Args:
         client: ServiceNow API client
-        vm_name: Name of the VM with sync issues
-        environment: Environment where the issue occurred
-        discrepancies: List of validation discrepancies
-        additional_details: Optional additional context
+        environment: Environment name
+        expected: Expected values per VM name (Terraform or Ansible)
+        writer: Stream one record per finding here instead of collecting them
         
     Returns:
-        Incident number if created successfully, None otherwise
+        Tuple of (in_sync: bool, report: dict); the finding lists are
+        empty when a writer is given
     """
     logger = logging.getLogger(__name__)
-    logger.info("Creating incident for CMDB sync failure...")
+    logger.info(f"Reconciling {environment}: {len(expected)} expected VMs")
     
-    # Build incident description
-    description_lines = [
-        f"CMDB Sync Validation Failed",
-        f"",
-        f"VM Name: {vm_name}",
-        f"Environment: {environment}",
-        f"Timestamp: {datetime.now().isoformat()}",
-        f"",
-        f"Discrepancies Found:",
-        f"-" * 40
-    ]
+    rules = client.rules
+    chunk_size = max(1, client.config.validation_chunk_size)
+    report = {
+        'environment': environment,
+        'timestamp': datetime.now().isoformat(),
+        'passed': False,
+        'expected_count': len(expected),
+        'cmdb_count': 0,
+        'matched_count': 0,
+        'orphan_count': 0,
+        'missing_count': 0,
+        'mismatch_count': 0,
+        'duplicate_count': 0,
+        'failed_count': 0
+    }
+    report.update({key: [] for key in RECONCILE_KINDS.values()})
     
-    for d in discrepancies:
-        description_lines.append(
-            f"[{d['severity'].upper()}] {d['field']}: "
-            f"expected '{d['expected']}', actual '{d['actual']}'"
+    def emit(kind: str, entry: Dict[str, Any]):
+        report[f"{kind}_count"] += 1
+        if writer:
+            writer.write_record({'type': kind, 'environment': environment, **entry})
+        else:
+            report[RECONCILE_KINDS[kind]].append(entry)
+    
+    def compare_matched(matched: Dict[str, Dict]):
+        table = compare_fleet(
+            FleetSnapshot.from_mapping({n: expected[n] for n in matched}, rules),
+            FleetSnapshot.from_mapping(matched, rules),
+            rules
         )
+        failing = table.failed_vms()
+        report['failed_count'] += len(failing)
+        for name, discrepancies in table.by_vm().items():
+            emit('mismatch', {
+                'vm_name': name,
+                'sys_id': matched[name].get('sys_id'),
+                'passed': name not in failing,
+                'discrepancies': discrepancies
+            })
+        if writer:
+            writer.flush()
     
-    if additional_details:
-        description_lines.extend([
-            f"",
-            f"Additional Details:",
-            additional_details
-        ])
+    seen = set()
+    matched = {}
+    try:
+        for record in get_cmdb_records_by_environment(
+            client, environment, prefetch=True, profile='validation', strict=True
+        ):
+            report['cmdb_count'] += 1
+            name = record.get('name')
+            if name in seen:
+                emit('duplicate', {'vm_name': name, 'sys_id': record.get('sys_id')})
+                continue
+            seen.add(name)
+            
+            if name in expected:
+                matched[name] = record
+                report['matched_count'] += 1
+                if len(matched) >= chunk_size:
+                    compare_matched(matched)
+                    matched = {}
+            else:
+                emit('orphan', {
+                    'vm_name': name,
+                    'sys_id': record.get('sys_id'),
+                    'ip_address': record.get('ip_address')
+                })
+    except RuntimeError as e:
+        # A partial scan would report every unseen VM as missing
+        logger.error(f"CMDB scan incomplete - reconciliation aborted: {e}")
+        report['error'] = str(e)
+        return False, report
     
-    # Determine impact and urgency based on severity
-    has_critical = any(d['severity'] == 'critical' for d in discrepancies)
-    has_high = any(d['severity'] == 'high' for d in discrepancies)
+    if matched:
+        compare_matched(matched)
     
-    if has_critical:
-        impact = '1'  # High
-        urgency = '1'  # High
-    elif has_high:
-        impact = '2'  # Medium
-        urgency = '2'  # Medium
-    else:
-        impact = '3'  # Low
-        urgency = '3'  # Low
+    for name in expected:
+        if name not in seen:
+            emit('missing', {'vm_name': name})
     
-    # Build incident payload
-    incident_data = {
-        'short_description': f"CMDB Sync Failure: {vm_name} ({environment})",
-        'description': '\n'.join(description_lines),
-        'category': 'Software',
-        'subcategory': 'Integration',
-        'impact': impact,
-        'urgency': urgency,
-        'assignment_group': 'Cloud Operations',
-        'caller_id': 'morpheus.integration',
-        'configuration_item': vm_name,
-        'u_environment': environment,  # Custom field example
-        'correlation_id': f"cmdb-sync-{vm_name}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    }
+    report['passed'] = not (
+        report['orphan_count'] or report['missing_count']
+        or report['duplicate_count'] or report['failed_count']
+    )
     
-    # Create incident
-    endpoint = f"table/{client.config.incident_table}"
-    success, response = client._make_request('POST', endpoint, data=incident_data)
+    logger.info(
+        f"Reconciliation complete: {report['matched_count']} matched, "
+        f"{report['orphan_count']} orphaned, {report['missing_count']} missing, "
+        f"{report['mismatch_count']} mismatched, {report['duplicate_count']} duplicate"
+    )
     
-    if not success:
-        logger.error(f"Failed to create incident: {response.get('error', 'Unknown error')}")
+    return report['passed'], report
+
+
+#--------------------------------------------------------------
+# Watch Mode
+#--------------------------------------------------------------
+
+def _state_hash(values: Optional[Dict[str, Any]], fields: Iterable[str]) -> Optional[str]:
+    """Hash the given fields of a record or expected-values dict."""
+    if values is None:
         return None
+    subset = {field: values.get(field) for field in fields}
+    return hashlib.sha256(
+        json.dumps(subset, sort_keys=True, default=str).encode()
+    ).hexdigest()[:32]
+
+
+class ValidationStateStore:
+    """
+    Persistent pass/fail state per VM for watch mode.
     
-    result = response.get('result', {})
-    incident_number = result.get('number')
+    Stores a hash of the CMDB record and of the expected values last
+    validated, so unchanged VMs are skipped, and the open incident for
+    failing VMs so it can be resolved when they go green.
+    """
     
-    if incident_number:
-        logger.info(f"[OK] Created incident: {incident_number}")
-        return incident_number
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS vm_state (
+                name TEXT PRIMARY KEY,
+                environment TEXT,
+                passed INTEGER,
+                record_hash TEXT,
+                expected_hash TEXT,
+                incident_number TEXT,
+                checked_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
     
-    logger.error("Incident created but no number returned")
-    return None
+    def get_many(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the stored state for the given VM names."""
+        found = {}
+        with self._lock:
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT name, passed, record_hash, expected_hash, incident_number "
+                    f"FROM vm_state WHERE name IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                for name, passed, record_hash, expected_hash, number in rows:
+                    found[name] = {
+                        'passed': bool(passed),
+                        'record_hash': record_hash,
+                        'expected_hash': expected_hash,
+                        'incident_number': number
+                    }
+        return found
+    
+    def put_many(self, environment: str, states: Dict[str, Dict[str, Any]]):
+        """Store or replace the state of many VMs in one transaction."""
+        now = time.time()
+        rows = [
+            (name, environment, int(s['passed']), s['record_hash'],
+             s['expected_hash'], s['incident_number'], now)
+            for name, s in states.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vm_state VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+    
+    def get_watermark(self, scope: str) -> Optional[str]:
+        """Return the last poll watermark for a scope, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (f"watermark:{scope}",)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set_watermark(self, scope: str, watermark: str):
+        """Record the poll watermark for a scope."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                (f"watermark:{scope}", watermark)
+            )
+    
+    def close(self):
+        """Close the underlying database."""
+        self._conn.close()
 
 
-def resolve_incident(
-    client: ServiceNowClient,
-    incident_number: str,
-    resolution_notes: str
-) -> bool:
+class ValidationWatcher:
     """
-    Resolve an existing incident.
+    Incremental validation driven by CMDB changes and provisioning events.
+    
+    Each poll fetches only CIs updated since the last watermark, plus VMs
+    whose expected values changed (Terraform file edits) or that were
+    named in an event. Of those, only VMs whose record or expected values
+    hash differently from the last validation are re-checked, so API load
+    follows the change rate rather than the fleet size. Incidents are
+    opened when a VM starts failing and resolved when it goes green; a VM
+    whose incident could not be opened or resolved is retried next poll.
+    """
+    
+    def __init__(
+        self,
+        config: ServiceNowConfig,
+        environment: str,
+        terraform_path: Optional[str] = None,
+        common_expected: Optional[Dict[str, Any]] = None,
+        create_incident: bool = True,
+        client: Optional[ServiceNowClient] = None
+    ):
+        self.config = config
+        self.environment = environment
+        self.terraform_path = terraform_path
+        self.common_expected = common_expected or {}
+        self.create_incident = create_incident
+        self.client = client or ServiceNowClient(config)
+        self.state = ValidationStateStore(config.watch_state_path)
+        self.logger = logging.getLogger(__name__)
+        
+        self._terraform_mtime = None
+        self._terraform_expected: Dict[str, Dict[str, Any]] = {}
+        self._event_expected: Dict[str, Dict[str, Any]] = {}
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+    
+    def notify(
+        self,
+        vm_names: Iterable[str],
+        expected_values: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Queue VMs reported by a provisioning event and wake the watcher.
+        
+        Args:
+            vm_names: VMs that were created or changed
+            expected_values: Optional expected values per VM from the event
+            
+        Returns:
+            Number of VMs queued
+        """
+        names = [name for name in vm_names if name]
+        with self._pending_lock:
+            self._pending.update(names)
+            self._event_expected.update(expected_values or {})
+        self._wakeup.set()
+        return len(names)
+    
+    def _expected_values(self) -> Dict[str, Dict[str, Any]]:
+        """Expected values per VM, reloading the Terraform file if it changed."""
+        if self.terraform_path:
+            mtime = os.path.getmtime(self.terraform_path)
+            if mtime != self._terraform_mtime:
+                self.logger.info(f"Loading expected values from {self.terraform_path}")
+                self._terraform_expected = load_terraform_expected(
+                    self.terraform_path, self.environment
+                )
+                self._terraform_mtime = mtime
+        
+        with self._pending_lock:
+            event_expected = dict(self._event_expected)
+        
+        # Expected values from an event override the Terraform ones
+        merged = dict(self._terraform_expected)
+        for name, values in event_expected.items():
+            merged[name] = {**merged.get(name, {}), **values}
+        return merged
+    
+    def _expected_for(self, name: str, expected: Dict[str, Dict[str, Any]]) -> Dict:
+        """Full expected values for one VM."""
+        return {
+            'environment': self.environment,
+            **expected.get(name, {}),
+            **self.common_expected,
+            'name': name
+        }
+    
+    def poll_once(self) -> Dict[str, int]:
+        """
+        Run one incremental validation pass.
+        
+        Returns:
+            Counts of VMs checked for changes, changed (and so validated
+            again), failed and recovered, and of incidents created and
+            resolved
+            
+        Raises:
+            RuntimeError: If a CMDB page fails; the watermark is left
+                where it was, so the next poll sees the same changes
+        """
+        scope = f"{self.config.cmdb_table}:{self.environment}"
+        watermark = self.state.get_watermark(scope)
+        started = datetime.now(timezone.utc) - CMDBCache.WATERMARK_OVERLAP
+        expected = self._expected_values()
+        
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        
+        try:
+            summary = self._poll(watermark, expected, pending)
+        except Exception:
+            # Keep event-fed VMs for the next poll
+            with self._pending_lock:
+                self._pending.update(pending)
+            raise
+        
+        # Only a complete poll moves the watermark
+        self.state.set_watermark(scope, started.strftime('%Y-%m-%d %H:%M:%S'))
+        self.logger.info(
+            f"Watch poll: {summary['changed']} changed, {summary['checked']} checked, "
+            f"{summary['failed']} failing, {summary['recovered']} recovered"
+        )
+        
+        return summary
+    
+    def _poll(
+        self,
+        watermark: Optional[str],
+        expected: Dict[str, Dict[str, Any]],
+        pending: set
+    ) -> Dict[str, int]:
+        """Find changed VMs since the watermark and validate them."""
+        # CIs updated since the last poll (everything on the first poll).
+        # Strict: a failed page raises, so poll_once keeps the old watermark.
+        records = {}
+        for record in get_cmdb_records_changed_since(
+            self.client, watermark, self.environment, strict=True
+        ):
+            records[record.get('name')] = record
+        if self.client.cache is not None and records:
+            self.client.cache.put_many(records.values())
+        
+        # VMs whose expected values changed since they were last validated
+        fields = list(self.client.rules)
+        expected_hashes = {
+            name: _state_hash(self._expected_for(name, expected), fields)
+            for name in set(expected) | set(records) | pending
+        }
+        stored = self.state.get_many(list(expected_hashes))
+        candidates = set(records) | pending | {
+            name for name, h in expected_hashes.items()
+            if name not in stored or stored[name]['expected_hash'] != h
+        }
+        
+        unfetched = [name for name in candidates if name not in records]
+        if unfetched:
+            records.update(get_cmdb_records_bulk(self.client, unfetched, strict=True))
+        
+        # Skip VMs whose record and expected values are unchanged
+        record_hashes = {
+            name: _state_hash(records.get(name), fields) for name in candidates
+        }
+        changed = sorted(
+            name for name in candidates
+            if name not in stored
+            or stored[name]['record_hash'] != record_hashes[name]
+            or stored[name]['expected_hash'] != expected_hashes[name]
+        )
+        
+        summary = {
+            'changed': len(changed), 'checked': len(candidates), 'failed': 0,
+            'recovered': 0, 'incidents_created': 0, 'incidents_resolved': 0
+        }
+        if changed:
+            self._validate(changed, records, expected, stored, record_hashes,
+                           expected_hashes, summary)
+        
+        return summary
+    
+    def _validate(
+        self,
+        names: List[str],
+        records: Dict[str, Dict],
+        expected: Dict[str, Dict[str, Any]],
+        stored: Dict[str, Dict[str, Any]],
+        record_hashes: Dict[str, Optional[str]],
+        expected_hashes: Dict[str, Optional[str]],
+        summary: Dict[str, int]
+    ):
+        """Validate changed VMs, act on pass/fail transitions and save state."""
+        rules = self.client.rules
+        table = compare_fleet(
+            FleetSnapshot.from_mapping(
+                {name: self._expected_for(name, expected) for name in names}, rules
+            ),
+            FleetSnapshot.from_mapping(
+                {n: records[n] for n in names if n in records}, rules
+            ),
+            rules
+        )
+        discrepancies_by_vm = table.by_vm()
+        failed_vms = table.failed_vms()
+        
+        states = {}
+        for name in names:
+            previous = stored.get(name, {})
+            states[name] = {
+                'passed': name not in failed_vms,
+                'record_hash': record_hashes[name],
+                'expected_hash': expected_hashes[name],
+                'incident_number': previous.get('incident_number')
+            }
+        
+        failures = {
+            name: (self.environment, discrepancies_by_vm.get(name, []))
+            for name in names if name in failed_vms
+        }
+        recovered = [
+            name for name in names
+            if name not in failed_vms and states[name]['incident_number']
+        ]
+        summary['failed'] = len(failures)
+        summary['recovered'] = len(recovered)
+        
+        # VMs whose incident could not be opened or resolved keep their
+        # previous state and are validated again on the next poll
+        retry = set()
+        to_resolve = {}
+        owners = {}
+        if failures and self.create_incident:
+            for result in create_incidents_bulk(self.client, failures):
+                if not result['success']:
+                    retry.add(result['vm_name'])
+                    continue
+                state = states[result['vm_name']]
+                previous = state['incident_number']
+                if previous and previous != result['incident_number']:
+                    # New failure fingerprint - close the incident it replaces
+                    to_resolve[previous] = (
+                        f"Superseded by {result['incident_number']}"
+                    )
+                    owners[previous] = result['vm_name']
+                if result['action'] == 'created':
+                    summary['incidents_created'] += 1
+                state['incident_number'] = result['incident_number']
+        
+        for name in recovered:
+            number = states[name]['incident_number']
+            to_resolve[number] = f"CMDB record for {name} is back in sync"
+            owners[number] = name
+        
+        # Group by notes so each distinct note is one bulk resolve
+        by_notes: Dict[str, List[str]] = {}
+        for number, notes in to_resolve.items():
+            by_notes.setdefault(notes, []).append(number)
+        resolved = set()
+        for notes, numbers in by_notes.items():
+            for result in resolve_incidents_bulk(self.client, numbers, notes):
+                if result['success'] or result['error'] == 'Not found':
+                    resolved.add(result['incident_number'])
+        summary['incidents_resolved'] = len(resolved)
+        retry.update(name for number, name in owners.items() if number not in resolved)
+        
+        for name in recovered:
+            if states[name]['incident_number'] in resolved:
+                states[name]['incident_number'] = None
+        
+        if retry:
+            self.logger.warning(
+                f"Incident update failed for {len(retry)} VMs - retrying on the next poll"
+            )
+            with self._pending_lock:
+                self._pending.update(retry)
+        self.state.put_many(
+            self.environment,
+            {name: state for name, state in states.items() if name not in retry}
+        )
+    
+    def run(self, interval: Optional[int] = None):
+        """
+        Poll until stop() is called; events wake the watcher early.
+        
+        Args:
+            interval: Seconds between polls (defaults to config.watch_interval)
+        """
+        interval = interval or self.config.watch_interval
+        self.logger.info(
+            f"Watching {self.environment} every {interval}s "
+            f"(state: {self.config.watch_state_path})"
+        )
+        
+        while not self._stopped.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                # Keep watching; the watermark only advances after a good poll
+                self.logger.error(f"Watch poll failed: {e}")
+            if self.config.metrics_file:
+                METRICS.write(self.config.metrics_file)
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+    
+    def stop(self):
+        """Stop the watch loop after the current poll."""
+        self._stopped.set()
+        self._wakeup.set()
+
+
+#--------------------------------------------------------------
+# Validation Daemon
+#--------------------------------------------------------------
+
+def parse_daemon_address(address: str) -> Tuple[str, Any]:
+    """
+    Parse a daemon address.
+    
+    Returns:
+        ('unix', path) for unix:/path, otherwise ('tcp', (host, port))
+    """
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def daemon_identity(config: ServiceNowConfig) -> Dict[str, str]:
+    """Instance, user and CMDB table a daemon validates against."""
+    return {
+        'instance': config.instance_url,
+        'username': config.username,
+        'cmdb_table': config.cmdb_table
+    }
+
+
+def daemon_token(config: ServiceNowConfig, create: bool = False) -> Optional[str]:
+    """
+    Shared secret that daemon requests must carry.
+    
+    SNOW_DAEMON_TOKEN when set, otherwise the contents of the token file.
+    With create (the daemon side), a missing token file is created with a
+    random token and mode 0600, so by default only processes of the user
+    running the daemon can submit jobs to it.
     
     Args:
-        client: ServiceNow API client
-        incident_number: The incident number to resolve
-        resolution_notes: Notes describing the resolution
+        config: ServiceNow configuration
+        create: Create the token file if it does not exist
         
     Returns:
-        True if resolved successfully, False otherwise
+        The token, or None if there is none to read
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"Resolving incident: {incident_number}")
-    
-    # First, get the incident sys_id
-    params = {
-        'sysparm_query': f"number={incident_number}",
-        'sysparm_limit': 1,
-        'sysparm_fields': 'sys_id'
-    }
+    if config.daemon_token:
+        return config.daemon_token
     
-    endpoint = f"table/{client.config.incident_table}"
-    success, response = client._make_request('GET', endpoint, params=params)
+    path = config.daemon_token_file
+    try:
+        with open(path, encoding='utf-8') as f:
+            token = f.read().strip()
+    except FileNotFoundError:
+        token = ''
+    except OSError:
+        if create:
+            raise
+        return None
     
-    if not success:
-        logger.error("Failed to find incident")
-        return False
+    if token:
+        if create and os.stat(path).st_mode & 0o077:
+            logger.warning(f"Daemon token file {path} is readable by other users")
+        return token
+    if not create:
+        return None
     
-    result = response.get('result', [])
-    if not result:
-        logger.error(f"Incident {incident_number} not found")
-        return False
+    token = os.urandom(32).hex()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    logger.info(f"Daemon token written to {path}")
+    return token
+
+
+_http_classes: Dict[type, type] = {}
+_http_classes_lock = threading.Lock()
+
+
+def _http_class(mixin: type, base: type) -> type:
+    """
+    Combine a daemon mixin with its http.client/http.server base class.
     
-    sys_id = result[0].get('sys_id')
+    The daemon's HTTP classes are mixins so that http.client, http.server
+    and socketserver load only when a daemon is served or contacted.
+    """
+    with _http_classes_lock:
+        combined = _http_classes.get(mixin)
+        if combined is None:
+            combined = _http_classes[mixin] = type(mixin.__name__, (mixin, base), {})
+    return combined
+
+
+class _UnixHTTPConnection:
+    """HTTPConnection over a Unix domain socket (mixin for http.client.HTTPConnection)."""
     
-    # Update incident to resolved
-    update_data = {
-        'state': '6',  # Resolved
-        'close_code': 'Solved (Permanently)',
-        'close_notes': resolution_notes
-    }
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
     
-    endpoint = f"table/{client.config.incident_table}/{sys_id}"
-    success, response = client._make_request('PATCH', endpoint, data=update_data)
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class _ThreadingUnixHTTPServer:
+    """HTTP server listening on a Unix domain socket (mixin for ThreadingUnixStreamServer)."""
     
-    if success:
-        logger.info(f"[OK] Incident {incident_number} resolved")
-        return True
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _ThreadingTCPHTTPServer:
+    """HTTP server listening on a local TCP port (mixin for ThreadingHTTPServer)."""
     
-    logger.error(f"Failed to resolve incident: {response.get('error')}")
-    return False
+    daemon_threads = True
+    request_queue_size = 128
+
 
+class _DaemonRequestHandler:
+    """HTTP handler for the validation daemon (mixin for BaseHTTPRequestHandler)."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def address_string(self) -> str:
+        # Unix socket peers have no host address
+        return self.client_address[0] if self.client_address else 'unix'
+    
+    def log_message(self, format: str, *args):
+        logging.getLogger(__name__).debug(f"Daemon: {format % args}")
+    
+    def _send_json(self, status: int, body: Dict):
+        payload = json.dumps(body, default=json_default).encode()
+        self._send_payload(status, payload, 'application/json')
+    
+    def _send_payload(self, status: int, payload: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _authorized(self) -> bool:
+        """Check the bearer token, answering 401 if it is missing or wrong."""
+        expected = f"Bearer {self.server.validation_daemon.token}".encode()
+        supplied = self.headers.get('Authorization', '').encode()
+        if hmac.compare_digest(supplied, expected):
+            return True
+        
+        # The request body is left unread, so the connection cannot be reused
+        self.close_connection = True
+        self._send_json(401, {'error': 'Missing or invalid daemon token'})
+        return False
+    
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send_payload(200, METRICS.render().encode(), OPENMETRICS_CONTENT_TYPE)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+    
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path == '/events':
+            self._handle_events()
+            return
+        if self.path != '/validate':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        
+        daemon = self.server.validation_daemon
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = json.loads(self.rfile.read(length) or b'{}')
+            # Jobs for another instance, user or table must not run (or open
+            # incidents) with this daemon's credentials
+            identity = daemon_identity(daemon.config)
+            if job.get('identity') != identity:
+                self._send_json(409, {
+                    'error': 'Daemon validates against a different instance, user or table',
+                    'identity': identity
+                })
+                return
+            passed, results = daemon.validate(job)
+        except (ValueError, KeyError, AttributeError) as e:
+            self._send_json(400, {'error': f"Invalid job: {e}"})
+            return
+        
+        self._send_json(200, {'passed': passed, 'results': results})
+    
+    def _handle_events(self):
+        """Queue provisioning events for the watcher (watch mode only)."""
+        watcher = self.server.validation_daemon.watcher
+        if watcher is None:
+            self._send_json(404, {'error': 'Watch mode not enabled'})
+            return
+        
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            event = json.loads(self.rfile.read(length) or b'{}')
+            vm_names = event.get('vm_names') or [event['vm_name']]
+            expected_values = event.get('expected_values') or {}
+            if 'vm_name' in event and expected_values:
+                expected_values = {event['vm_name']: expected_values}
+            queued = watcher.notify(vm_names, expected_values)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_json(400, {'error': f"Invalid event: {e}"})
+            return
+        
+        self._send_json(202, {'queued': queued})
 
-#--------------------------------------------------------------
-# Main Validation Workflow
-#--------------------------------------------------------------
 
-def run_validation(
-    vm_name: str,
-    environment: str,
-    expected_values: Dict[str, Any],
-    create_incident: bool = True,
-    demo_mode: bool = False
-) -> Tuple[bool, Dict]:
+class ValidationDaemon:
     """
-    Run full CMDB validation workflow.
+    Long-running validation service.
     
-    Args:
-        vm_name: Name of the VM to validate
-        environment: Environment name
-        expected_values: Expected values to validate against
-        create_incident: Whether to create incident on failure
-        demo_mode: Run without actual API calls
-        
-    Returns:
-        Tuple of (passed: bool, results: dict)
+    Keeps one warm ServiceNowClient (pooled sessions, rules, incident
+    index) and accepts validation jobs over HTTP on localhost or a Unix
+    socket. POST requests must carry the daemon token, and jobs must name
+    the daemon's instance, user and table (daemon_identity). Identical
+    concurrent jobs are coalesced into a single lookup. With a watcher
+    attached, POST /events queues provisioning events for incremental
+    validation. GET /metrics serves the process metrics in the
+    OpenMetrics text format.
+    
+    Jobs read the live CMDB like a one-shot run: a record can be at most
+    SNOW_MEMO_TTL seconds old (identical lookups share one response), or
+    SNOW_CACHE_TTL seconds when SNOW_CACHE_PATH is set.
     """
-    logger = logging.getLogger(__name__)
     
-    logger.info("=" * 60)
-    logger.info("  CMDB VALIDATION WORKFLOW")
-    logger.info("=" * 60)
-    logger.info(f"VM Name: {vm_name}")
-    logger.info(f"Environment: {environment}")
-    logger.info(f"Demo Mode: {demo_mode}")
-    logger.info("=" * 60)
+    def __init__(self, config: ServiceNowConfig):
+        self.config = config
+        self.token = daemon_token(config, create=True)
+        self.client = ServiceNowClient(config)
+        self.inflight = SingleFlight()
+        self.logger = logging.getLogger(__name__)
+        self.server = None
+        self.watcher: Optional[ValidationWatcher] = None
     
-    results = {
-        'vm_name': vm_name,
-        'environment': environment,
-        'timestamp': datetime.now().isoformat(),
-        'passed': False,
-        'cmdb_record': None,
-        'discrepancies': [],
-        'incident_number': None
-    }
+    def validate(self, job: Dict[str, Any]) -> Tuple[bool, Dict]:
+        """Run (or join) a validation job."""
+        vm_name = job['vm_name']
+        environment = job['environment']
+        expected_values = job.get('expected_values') or {'name': vm_name}
+        create_incident = job.get('create_incident', True)
+        
+        key = json.dumps(
+            [vm_name, environment, expected_values, create_incident],
+            sort_keys=True, default=str
+        )
+        return self.inflight.do(
+            key, run_validation,
+            vm_name=vm_name,
+            environment=environment,
+            expected_values=expected_values,
+            create_incident=create_incident,
+            client=self.client
+        )
     
-    # Demo mode - simulate validation
-    if demo_mode:
-        logger.info("Running in DEMO MODE - simulating API responses")
+    def serve_forever(self):
+        """Listen on config.daemon_address until interrupted."""
+        kind, address = parse_daemon_address(self.config.daemon_address)
+        handler = _http_class(_DaemonRequestHandler, http_server.BaseHTTPRequestHandler)
         
-        # Simulate CMDB record
-        simulated_record = {
-            'sys_id': 'demo-sys-id-12345',
-            'name': vm_name,
-            'ip_address': '192.168.1.100',
-            'cpu_count': expected_values.get('cpu_count', '2'),
-            'environment': environment,
-            'state': 'On',
-            'managed_by': 'Morpheus'
-        }
+        if kind == 'unix':
+            if os.path.exists(address):
+                os.unlink(address)
+            server_class = _http_class(
+                _ThreadingUnixHTTPServer, socketserver.ThreadingUnixStreamServer
+            )
+            self.server = server_class(address, handler)
+            os.chmod(address, 0o600)
+        else:
+            server_class = _http_class(_ThreadingTCPHTTPServer, http_server.ThreadingHTTPServer)
+            self.server = server_class(address, handler)
         
-        results['cmdb_record'] = simulated_record
-        passed, discrepancies = validate_sync(expected_values, simulated_record)
-        results['passed'] = passed
-        results['discrepancies'] = discrepancies
+        self.server.validation_daemon = self
+        self.logger.info(f"Validation daemon listening on {self.config.daemon_address}")
         
-        logger.info("Demo validation complete")
-        return passed, results
-    
-    # Production mode
-    config = ServiceNowConfig()
-    
-    if not config.validate():
-        logger.error("ServiceNow configuration incomplete")
-        logger.error("Set environment variables: SNOW_INSTANCE, SNOW_USERNAME, SNOW_PASSWORD")
-        results['error'] = "Configuration incomplete"
-        return False, results
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Validation daemon stopping")
+        finally:
+            self.server.server_close()
+            if kind == 'unix' and os.path.exists(address):
+                os.unlink(address)
+
+
+def daemon_validate(
+    config: ServiceNowConfig,
+    job: Dict[str, Any],
+    timeout: float = 120
+) -> Optional[Tuple[bool, Dict]]:
+    """
+    Submit a validation job to a running daemon.
     
-    client = ServiceNowClient(config)
+    Args:
+        config: ServiceNow configuration (daemon address, token and the
+            instance, user and table the job is for)
+        job: vm_name, environment, expected_values and create_incident
+        timeout: Seconds to wait for the result
+        
+    Returns:
+        (passed, results), or None if no daemon is reachable or it
+        refused the job - the caller then validates locally
+    """
+    logger = logging.getLogger(__name__)
+    address = config.daemon_address
+    token = daemon_token(config)
+    if token is None:
+        return None
+    kind, target = parse_daemon_address(address)
     
-    # Step 1: Retrieve CMDB record
-    cmdb_record = get_cmdb_record(client, vm_name)
-    results['cmdb_record'] = cmdb_record
+    # A missing daemon is refused immediately; the timeout only caps a stuck one
+    if kind == 'unix':
+        conn = _http_class(_UnixHTTPConnection, http_client.HTTPConnection)(target, timeout=1.0)
+    else:
+        conn = http_client.HTTPConnection(target[0], target[1], timeout=1.0)
     
-    # Step 2: Validate sync
-    passed, discrepancies = validate_sync(expected_values, cmdb_record)
-    results['passed'] = passed
-    results['discrepancies'] = discrepancies
+    try:
+        conn.connect()
+        conn.sock.settimeout(timeout)
+        conn.request(
+            'POST', '/validate',
+            body=json.dumps({**job, 'identity': daemon_identity(config)}, default=str),
+            headers={'Content-Type': 'application/json', 'Authorization': f"Bearer {token}"}
+        )
+        response = conn.getresponse()
+        body = json.loads(response.read() or b'{}')
+    except (OSError, http_client.HTTPException, ValueError):
+        return None
+    finally:
+        conn.close()
     
-    # Step 3: Create incident if validation failed
-    if not passed and create_incident:
-        incident_number = create_incident_on_failure(
-            client=client,
-            vm_name=vm_name,
-            environment=environment,
-            discrepancies=discrepancies
+    if response.status != 200:
+        logger.warning(
+            f"Daemon at {address} rejected job - validating locally: "
+            f"{body.get('error', response.status)}"
         )
-        results['incident_number'] = incident_number
+        return None
     
-    return passed, results
+    logger.info(f"Validated via daemon at {address}")
+    return body['passed'], body['results']
 
 
 #--------------------------------------------------------------
@@ -650,28 +6343,123 @@ def parse_args() -> argparse.Namespace:
 Examples:
   # Run validation in demo mode
   python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev --demo
-
+  
   # Run validation with real ServiceNow instance
   export SNOW_INSTANCE=your-instance.service-now.com
   export SNOW_USERNAME=admin
   export SNOW_PASSWORD=your-password
   python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev
-
+  
   # Validate with expected values
   python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev \\
     --expected-cpu 2 --expected-memory 4096
-
+  
   # Output results as JSON
   python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev --json
+  
+  # Serve repeated lookups from a local snapshot refreshed incrementally
+  export SNOW_CACHE_PATH=/var/tmp/cmdb-cache.db
+  python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev --refresh-cache
+  
+  # Validate every VM in a Terraform environment against its outputs/state
+  terraform output -json > outputs.json
+  python servicenow_cmdb_sync.py --terraform outputs.json --environment dev
+  
+  # Find orphaned CIs, VMs without a CI and drift across a whole environment
+  python servicenow_cmdb_sync.py --reconcile --terraform outputs.json --environment dev
+  python servicenow_cmdb_sync.py --reconcile --inventory inventory --environment dev
+  
+  # Validate offline against a table export during a maintenance window
+  python servicenow_cmdb_sync.py --terraform outputs.json --environment dev \\
+    --cmdb-export cmdb_ci_vm_instance.xml --no-incident
+  
+  # Resolve incidents in bulk after a fleet recovers
+  python servicenow_cmdb_sync.py --resolve-incidents incidents.txt --environment dev
+  
+  # Keep a warm daemon; later --vm-name runs are forwarded to it
+  python servicenow_cmdb_sync.py --serve --environment dev &
+  python servicenow_cmdb_sync.py --vm-name dev-web-01 --environment dev
+  
+  # Re-validate only CIs that change; resolve incidents when VMs go green
+  python servicenow_cmdb_sync.py --watch --terraform outputs.json --environment dev
+  
+  # Watch and accept provisioning events on the daemon (POST /events)
+  python servicenow_cmdb_sync.py --serve --watch --environment dev &
+  curl -X POST localhost:8765/events -d '{"vm_names": ["dev-web-01"]}' \\
+    -H "Authorization: Bearer $(cat ~/.servicenow_cmdb_daemon.token)"
+  
+  # Export timings for a node_exporter textfile collector; scrape the daemon
+  python servicenow_cmdb_sync.py --vm-list vms.txt --environment dev \\
+    --metrics-file /var/lib/node_exporter/cmdb_sync.prom
+  curl localhost:8765/metrics
+  
+  # Validate a whole provisioning wave with bulk CMDB queries
+  python servicenow_cmdb_sync.py --vm-list vms.txt --environment dev
+  cat vms.txt | python servicenow_cmdb_sync.py --vm-list - --environment dev
+  
+  # Stream one NDJSON line per VM (CSV also supported) as results arrive
+  python servicenow_cmdb_sync.py --terraform outputs.json --environment dev \\
+    --output-format ndjson | jq -c 'select(.passed == false)'
+  
+  # Checkpoint a long run; after a failure, rerun the same command with --resume
+  python servicenow_cmdb_sync.py --vm-list vms.txt --environment dev \\
+    --checkpoint run.db --output-format ndjson --output results.ndjson
         """
     )
     
-    parser.add_argument(
+    target = parser.add_mutually_exclusive_group()
+    
+    target.add_argument(
         '--vm-name', '-n',
-        required=True,
         help='Name of the VM to validate'
     )
     
+    target.add_argument(
+        '--vm-list', '-l',
+        metavar='FILE',
+        help='File with one VM name per line to validate in bulk (- for stdin)'
+    )
+    
+    parser.add_argument(
+        '--terraform', '-t',
+        metavar='FILE',
+        help='terraform output -json file or terraform.tfstate with expected '
+             'values; validates every VM in it unless --vm-name/--vm-list is given'
+    )
+    
+    parser.add_argument(
+        '--inventory', '-i',
+        metavar='FILE',
+        help='Ansible INI inventory with expected hosts; validates every host in '
+             'it unless --vm-name/--vm-list is given (Terraform values win)'
+    )
+    
+    parser.add_argument(
+        '--reconcile',
+        action='store_true',
+        help='Report orphaned CIs, missing CIs and drift between the whole '
+             'environment in the CMDB and --terraform/--inventory'
+    )
+    
+    parser.add_argument(
+        '--cmdb-export',
+        metavar='FILE',
+        help='Read CMDB records from a table export (.json, .ndjson, .csv or .xml) '
+             'instead of the Table API; indexed once into FILE.idx (SNOW_CMDB_EXPORT)'
+    )
+    
+    parser.add_argument(
+        '--resolve-incidents',
+        metavar='FILE',
+        help='File with one incident number per line to resolve in bulk (- for stdin)'
+    )
+    
+    parser.add_argument(
+        '--resolution-notes',
+        default='CMDB sync validated successfully',
+        help='Close notes used with --resolve-incidents'
+    )
+    
     parser.add_argument(
         '--environment', '-e',
         required=True,
@@ -702,6 +6490,52 @@ Examples:
         help='Do not create incident on failure'
     )
     
+    parser.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Incrementally refresh the local CMDB cache (SNOW_CACHE_PATH) first'
+    )
+    
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Run as a validation daemon on SNOW_DAEMON_ADDR (jobs read the live CMDB; '
+             'identical lookups are shared for up to SNOW_MEMO_TTL seconds)'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Continuously re-validate CIs whose record or expected values change '
+             '(state in SNOW_WATCH_STATE)'
+    )
+    
+    parser.add_argument(
+        '--watch-interval',
+        type=int,
+        metavar='SECONDS',
+        help='Seconds between CMDB polls in watch mode (default: SNOW_WATCH_INTERVAL)'
+    )
+    
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        help='Always validate in this process, even if a daemon is running'
+    )
+    
+    parser.add_argument(
+        '--metrics-file',
+        metavar='FILE',
+        help='Write OpenMetrics text to FILE on exit and after each watch poll '
+             '(default: SNOW_METRICS_FILE)'
+    )
+    
+    parser.add_argument(
+        '--trace-file',
+        metavar='FILE',
+        help='Append spans as JSON lines to FILE (default: SNOW_TRACE_FILE)'
+    )
+    
     parser.add_argument(
         '--demo',
         action='store_true',
@@ -714,13 +6548,311 @@ Examples:
         help='Output results as JSON'
     )
     
+    parser.add_argument(
+        '--output-format',
+        choices=sorted(RESULT_WRITERS),
+        help='Stream one compact line per VM as it is validated, then a summary record'
+    )
+    
+    parser.add_argument(
+        '--output', '-o',
+        metavar='FILE',
+        default='-',
+        help='File for --output-format results (default: stdout)'
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        metavar='FILE',
+        help='Save batch progress to FILE after every chunk '
+             '(default: SNOW_CHECKPOINT_FILE)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue a batch run from its checkpoint; --output is appended to'
+    )
+    
+    parser.add_argument(
+        '--no-summary',
+        action='store_true',
+        help='Omit the final summary record from --output-format results'
+    )
+    
     parser.add_argument(
         '--verbose', '-v',
         action='store_true',
         help='Enable verbose logging'
     )
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not (args.vm_name or args.vm_list or args.terraform or args.inventory
+            or args.resolve_incidents or args.serve or args.watch):
+        parser.error(
+            'one of --vm-name, --vm-list, --terraform, --inventory, '
+            '--resolve-incidents or --watch is required'
+        )
+    if args.reconcile and not (args.terraform or args.inventory):
+        parser.error('--reconcile needs --terraform and/or --inventory')
+    if args.reconcile and (args.vm_name or args.vm_list or args.serve or args.watch
+                           or args.resolve_incidents or args.checkpoint or args.demo):
+        parser.error(
+            '--reconcile covers the whole environment and cannot be combined with '
+            '--vm-name, --vm-list, --serve, --watch, --resolve-incidents, '
+            '--checkpoint or --demo'
+        )
+    if args.inventory and (args.serve or args.watch):
+        parser.error('--inventory is not supported with --serve or --watch')
+    if args.watch and args.demo:
+        parser.error('--watch needs a ServiceNow instance and cannot run with --demo')
+    if args.cmdb_export:
+        if args.watch:
+            parser.error('--watch polls the live CMDB and cannot use --cmdb-export')
+        if os.path.splitext(args.cmdb_export)[1].lower() not in CMDB_EXPORT_FORMATS:
+            parser.error(f"--cmdb-export must be one of: {', '.join(CMDB_EXPORT_FORMATS)}")
+        if not os.path.isfile(args.cmdb_export):
+            parser.error(f"--cmdb-export file not found: {args.cmdb_export}")
+    if args.output_format and args.json:
+        parser.error('--output-format and --json cannot be combined')
+    if args.output_format and (args.serve or args.watch or args.resolve_incidents):
+        parser.error(
+            '--output-format applies to --vm-name, --vm-list, --terraform, '
+            '--inventory and --reconcile runs'
+        )
+    if (args.checkpoint or args.resume) and (
+            args.vm_name or args.serve or args.watch or args.resolve_incidents):
+        parser.error('--checkpoint and --resume apply to --vm-list and --terraform runs')
+    
+    return args
+
+
+def run_resolve_cli(args: argparse.Namespace) -> int:
+    """Resolve the incidents listed in --resolve-incidents in bulk."""
+    logger = logging.getLogger(__name__)
+    numbers = read_vm_list(args.resolve_incidents)
+    if not numbers:
+        logger.error(f"No incident numbers found in {args.resolve_incidents}")
+        return 1
+    
+    if args.demo:
+        results = [
+            {'incident_number': n, 'success': True, 'error': None} for n in numbers
+        ]
+    else:
+        config = ServiceNowConfig()
+        if not config.validate():
+            logger.error("ServiceNow configuration incomplete")
+            return 1
+        results = resolve_incidents_bulk(
+            ServiceNowClient(config), numbers, args.resolution_notes
+        )
+    
+    if args.json:
+        print(json.dumps(results, indent=2, default=json_default))
+    else:
+        for r in results:
+            status = 'RESOLVED' if r['success'] else f"FAILED ({r['error']})"
+            print(f"  {r['incident_number']}: {status}")
+    
+    return 0 if all(r['success'] for r in results) else 1
+
+
+def run_batch_cli(
+    args: argparse.Namespace,
+    common_expected: Dict[str, Any],
+    terraform_expected: Optional[Dict[str, Dict[str, Any]]] = None
+) -> int:
+    """Run bulk validation for --vm-list/--terraform and print the combined results."""
+    terraform_expected = terraform_expected or {}
+    source = args.vm_list or args.terraform or args.inventory
+    vm_names = read_vm_list(args.vm_list) if args.vm_list else list(terraform_expected)
+    if not vm_names:
+        logging.getLogger(__name__).error(f"No VM names found in {source}")
+        return 1
+    
+    # Terraform values per VM, overridden by explicit --expected-* flags
+    expected_values = {
+        name: {**terraform_expected.get(name, {}), **common_expected, 'name': name}
+        for name in vm_names
+    }
+    
+    checkpoint_path = args.checkpoint or ServiceNowConfig().checkpoint_path
+    if args.resume and not checkpoint_path:
+        logging.getLogger(__name__).error(
+            "--resume needs --checkpoint or SNOW_CHECKPOINT_FILE"
+        )
+        return 1
+    checkpoint = ValidationCheckpoint(checkpoint_path) if checkpoint_path else None
+    
+    try:
+        if args.output_format:
+            writer = open_result_writer(args.output_format, args.output, args.resume)
+            try:
+                passed, results = run_batch_validation(
+                    vm_names=vm_names,
+                    environment=args.environment,
+                    expected_values=expected_values,
+                    create_incident=not args.no_incident,
+                    demo_mode=args.demo,
+                    writer=writer,
+                    checkpoint=checkpoint,
+                    resume=args.resume
+                )
+                if not args.no_summary:
+                    writer.write_summary(results)
+            finally:
+                writer.close()
+            return 0 if passed else 1
+        
+        passed, results = run_batch_validation(
+            vm_names=vm_names,
+            environment=args.environment,
+            expected_values=expected_values,
+            create_incident=not args.no_incident,
+            demo_mode=args.demo,
+            checkpoint=checkpoint,
+            resume=args.resume
+        )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    
+    if args.json:
+        print(json.dumps(results, indent=2, default=json_default))
+    else:
+        print()
+        print("=" * 60)
+        print("  BATCH VALIDATION RESULTS")
+        print("=" * 60)
+        print(f"  Status: {'PASSED' if passed else 'FAILED'}")
+        print(f"  Environment: {results['environment']}")
+        print(f"  VMs: {results['total']} "
+              f"({results['passed_count']} passed, {results['failed_count']} failed)")
+        
+        if results.get('error'):
+            print(f"  Error: {results['error']}")
+        
+        for vm_result in results['results']:
+            if vm_result['passed']:
+                continue
+            print(f"    - {vm_result['vm_name']}: "
+                  f"{len(vm_result['discrepancies'])} discrepancies")
+            if vm_result.get('incident_number'):
+                print(f"      Incident: {vm_result['incident_number']}")
+        
+        print("=" * 60)
+    
+    return 0 if passed else 1
+
+
+def run_reconcile_cli(
+    args: argparse.Namespace,
+    common_expected: Dict[str, Any],
+    inventory: Dict[str, Dict[str, Any]]
+) -> int:
+    """Reconcile the environment against --terraform/--inventory and print the report."""
+    logger = logging.getLogger(__name__)
+    config = ServiceNowConfig()
+    if not config.validate():
+        logger.error("ServiceNow configuration incomplete")
+        return 1
+    
+    client = ServiceNowClient(config)
+    common_expected = {k: v for k, v in common_expected.items() if k != 'name'}
+    expected = {
+        name: {**values, **common_expected, 'name': name}
+        for name, values in inventory.items()
+    }
+    
+    if args.output_format:
+        writer = open_result_writer(args.output_format, args.output)
+        try:
+            passed, report = reconcile_environment(
+                client, args.environment, expected, writer
+            )
+            if not args.no_summary:
+                writer.write_summary(report)
+        finally:
+            writer.close()
+        return 0 if passed else 1
+    
+    passed, report = reconcile_environment(client, args.environment, expected)
+    
+    if args.json:
+        print(json.dumps(report, indent=2, default=json_default))
+    else:
+        print()
+        print("=" * 60)
+        print("  RECONCILIATION RESULTS")
+        print("=" * 60)
+        print(f"  Status: {'IN SYNC' if passed else 'OUT OF SYNC'}")
+        print(f"  Environment: {report['environment']}")
+        print(f"  Expected VMs: {report['expected_count']}  "
+              f"CMDB CIs: {report['cmdb_count']}  Matched: {report['matched_count']}")
+        
+        if report.get('error'):
+            print(f"  Error: {report['error']}")
+        
+        print(f"  Orphaned CIs (no VM): {report['orphan_count']}")
+        for orphan in report['orphans']:
+            print(f"    - {orphan['vm_name']} ({orphan['sys_id']})")
+        print(f"  Missing CIs (no CI): {report['missing_count']}")
+        for missing in report['missing']:
+            print(f"    - {missing['vm_name']}")
+        print(f"  Mismatched: {report['mismatch_count']} ({report['failed_count']} failing)")
+        for mismatch in report['mismatches']:
+            print(f"    - {mismatch['vm_name']}: "
+                  f"{len(mismatch['discrepancies'])} discrepancies"
+                  + ('' if mismatch['passed'] else ' [FAIL]'))
+        if report['duplicate_count']:
+            print(f"  Duplicate CIs: {report['duplicate_count']}")
+            for duplicate in report['duplicates']:
+                print(f"    - {duplicate['vm_name']} ({duplicate['sys_id']})")
+        
+        print("=" * 60)
+    
+    return 0 if passed else 1
+
+
+def run_service_cli(
+    args: argparse.Namespace,
+    config: ServiceNowConfig,
+    common_expected: Dict[str, Any]
+) -> int:
+    """Run the daemon (--serve), the watcher (--watch), or both together."""
+    daemon = ValidationDaemon(config) if args.serve else None
+    if not args.watch:
+        daemon.serve_forever()
+        return 0
+    
+    common_expected = {k: v for k, v in common_expected.items() if k != 'name'}
+    watcher = ValidationWatcher(
+        config,
+        environment=args.environment,
+        terraform_path=args.terraform,
+        common_expected=common_expected,
+        create_incident=not args.no_incident,
+        client=daemon.client if daemon else None
+    )
+    
+    if daemon is None:
+        try:
+            watcher.run(args.watch_interval)
+        except KeyboardInterrupt:
+            logging.getLogger(__name__).info("Watch mode stopping")
+        return 0
+    
+    daemon.watcher = watcher
+    thread = threading.Thread(
+        target=watcher.run, args=(args.watch_interval,), name='cmdb-watch', daemon=True
+    )
+    thread.start()
+    try:
+        daemon.serve_forever()
+    finally:
+        watcher.stop()
+    return 0
 
 
 def main() -> int:
@@ -728,7 +6860,27 @@ def main() -> int:
     args = parse_args()
     
     # Setup logging
-    logger = setup_logging(args.verbose)
+    setup_logging(args.verbose)
+    
+    # --cmdb-export overrides SNOW_CMDB_EXPORT for every config built below
+    if args.cmdb_export:
+        os.environ['SNOW_CMDB_EXPORT'] = args.cmdb_export
+    
+    # Instrumentation - spans while running, metrics file on exit
+    config = ServiceNowConfig()
+    args.metrics_file = args.metrics_file or config.metrics_file
+    TRACER.configure(args.trace_file or config.trace_file, config.otel_enabled)
+    try:
+        return run_cli(args)
+    finally:
+        TRACER.close()
+        if args.metrics_file:
+            METRICS.write(args.metrics_file)
+
+
+def run_cli(args: argparse.Namespace) -> int:
+    """Dispatch to the requested mode and print the results."""
+    logger = logging.getLogger(__name__)
     
     # Build expected values from arguments
     expected_values = {
@@ -743,8 +6895,60 @@ def main() -> int:
     if args.expected_ip:
         expected_values['ip_address'] = args.expected_ip
     
+    if args.serve or args.watch:
+        config = ServiceNowConfig()
+        if not config.validate():
+            logger.error("ServiceNow configuration incomplete")
+            return 1
+        config.metrics_file = args.metrics_file
+        return run_service_cli(args, config, expected_values)
+    
+    if args.resolve_incidents:
+        return run_resolve_cli(args)
+    
+    terraform_expected = None
+    if args.inventory:
+        terraform_expected = load_ansible_inventory(
+            args.inventory, args.environment,
+            get_validation_rules(ServiceNowConfig().rules_path)
+        )
+    if args.terraform:
+        from_terraform = load_terraform_expected(args.terraform, args.environment)
+        if terraform_expected:
+            for name, values in from_terraform.items():
+                terraform_expected.setdefault(name, {}).update(values)
+        else:
+            terraform_expected = from_terraform
+    
+    if args.reconcile:
+        return run_reconcile_cli(args, expected_values, terraform_expected)
+    
+    if args.refresh_cache and not args.demo:
+        refresh_cache(args.environment)
+    
+    if args.vm_list or not args.vm_name:
+        return run_batch_cli(args, expected_values, terraform_expected)
+    
+    if terraform_expected and args.vm_name in terraform_expected:
+        expected_values = {**terraform_expected[args.vm_name], **expected_values}
+    
+    # Hand the job to a warm daemon when one is running
+    outcome = None
+    config = ServiceNowConfig()
+    # The daemon reads the live CMDB, so offline export runs stay local
+    if not args.demo and not args.no_daemon and not config.cmdb_export_path:
+        outcome = daemon_validate(
+            config,
+            {
+                'vm_name': args.vm_name,
+                'environment': args.environment,
+                'expected_values': expected_values,
+                'create_incident': not args.no_incident
+            }
+        )
+    
     # Run validation
-    passed, results = run_validation(
+    passed, results = outcome or run_validation(
         vm_name=args.vm_name,
         environment=args.environment,
         expected_values=expected_values,
@@ -753,8 +6957,26 @@ def main() -> int:
     )
     
     # Output results
-    if args.json:
-        print(json.dumps(results, indent=2, default=str))
+    if args.output_format:
+        writer = open_result_writer(args.output_format, args.output)
+        try:
+            writer.write(results)
+            if not args.no_summary:
+                summary = {
+                    'environment': results['environment'],
+                    'timestamp': results['timestamp'],
+                    'passed': passed,
+                    'total': 1,
+                    'passed_count': int(passed),
+                    'failed_count': int(not passed)
+                }
+                if results.get('error'):
+                    summary['error'] = results['error']
+                writer.write_summary(summary)
+        finally:
+            writer.close()
+    elif args.json:
+        print(json.dumps(results, indent=2, default=json_default))
     else:
         print()
         print("=" * 60)
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""
+ServiceNow Mock Server
+======================
+Local stand-in for the ServiceNow REST API subset used by
+servicenow_cmdb_sync.py, for load testing and offline development.
+
+Implements:
+    GET   /api/now/v2/table/<cmdb table>    encoded queries, keyset/offset paging
+    GET   /api/now/v2/table/incident        lookups by number/correlation_id
+    POST  /api/now/v2/table/incident        create
+    PATCH /api/now/v2/table/incident/<id>   update/resolve
+    POST  /api/now/v1/batch                 Batch API
+    GET   /mock/stats                       request counters (not fault-injected)
+
+Latency, 5xx errors and 429 throttling can be injected to exercise the
+client's retry and rate limit handling.
+
+Usage:
+    python servicenow_mock_server.py --records 10000 --port 8080
+    python servicenow_mock_server.py --records 1000 --latency 20 --error-rate 0.01
+    
+    export SNOW_INSTANCE=127.0.0.1:8080 SNOW_URL_SCHEME=http SNOW_PASSWORD=mock
+    python servicenow_cmdb_sync.py --vm-name dev-vm-000001 --environment dev
+
+Author: Morpheus Automation Lab
+Version: 1.0.0
+"""
+
+import re
+import sys
+import json
+import gzip
+import time
+import base64
+import random
+import bisect
+import logging
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+#--------------------------------------------------------------
+# Record Generation
+#--------------------------------------------------------------
+
+ENVIRONMENTS = ('dev', 'staging', 'prod')
+
+# Timestamp all generated records share, so changed-since queries are cheap
+GENERATED_UPDATED_ON = '2024-01-01 00:00:00'
+
+
+def build_record(index: int, environment: str) -> Dict[str, Any]:
+    """
+    Build the CMDB record for VM number `index`.
+    
+    Deterministic, so load tests can derive expected values from the
+    same function.
+    """
+    return {
+        'sys_id': f"{index:032x}",
+        'name': f"{environment}-vm-{index:06d}",
+        'ip_address': f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+        'cpu_count': '2',
+        'ram': '4096',
+        'disk_space': '40',
+        'state': 'on',
+        'os': 'Linux Red Hat',
+        'os_version': '9.3',
+        'environment': environment,
+        'managed_by': 'morpheus',
+        'sys_created_on': GENERATED_UPDATED_ON,
+        'sys_updated_on': GENERATED_UPDATED_ON,
+        'correlation_id': f"morpheus-{index}",
+        'discovery_source': 'Morpheus'
+    }
+
+
+def generate_records(
+    count: int,
+    environments: Tuple[str, ...] = ENVIRONMENTS,
+    drift: float = 0.0,
+    seed: int = 42
+) -> List[Dict[str, Any]]:
+    """
+    Generate CMDB records, spread round-robin across environments.
+    
+    Args:
+        count: Number of records
+        environments: Environment of record i is environments[i % len]
+        drift: Fraction of records whose cpu_count/ram differ from build_record
+        seed: Random seed for drift selection
+    
+    Returns:
+        Records in sys_id order
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        record = build_record(i, environments[i % len(environments)])
+        if drift and rng.random() < drift:
+            record['cpu_count'] = '4'
+            record['ram'] = '8192'
+        records.append(record)
+    return records
+
+
+#--------------------------------------------------------------
+# In-Memory Tables
+#--------------------------------------------------------------
+
+# field, operator, value - fields are lower-case, so 'IN' is unambiguous
+QUERY_CONDITION = re.compile(r'^(\w+?)(IN|!=|>=|<=|=|>|<)(.*)$')
+
+
+def parse_query(query: str) -> Tuple[List[Tuple[str, str, str]], Optional[str]]:
+    """
+    Parse an encoded query into AND-ed conditions and an ORDERBY field.
+    
+    Raises:
+        ValueError: For conditions outside the supported subset
+    """
+    conditions = []
+    order_by = None
+    for part in query.split('^'):
+        if not part:
+            continue
+        if part.startswith('ORDERBY'):
+            order_by = part[len('ORDERBY'):]
+            continue
+        match = QUERY_CONDITION.match(part)
+        if not match:
+            raise ValueError(f"Unsupported query condition: {part}")
+        conditions.append(match.groups())
+    return conditions, order_by
+
+
+def _predicate(field: str, op: str, value: str) -> Callable[[Dict], bool]:
+    """Build a record predicate for one condition."""
+    if op == 'IN':
+        values = set(value.split(','))
+        return lambda r: str(r.get(field, '')) in values
+    if op == '=':
+        value = value.lower()
+        return lambda r: str(r.get(field, '')).lower() == value
+    if op == '!=':
+        value = value.lower()
+        return lambda r: str(r.get(field, '')).lower() != value
+    compare = {
+        '>': str.__gt__, '>=': str.__ge__, '<': str.__lt__, '<=': str.__le__
+    }[op]
+    return lambda r: compare(str(r.get(field, '')), value)
+
+
+class Table:
+    """
+    In-memory table kept in sys_id order, with a name index.
+    
+    Name lookups and sys_id keyset pages are served from the indexes, so
+    paging through 100k records costs the same per page as 1k.
+    """
+    
+    def __init__(self, records: Optional[List[Dict[str, Any]]] = None):
+        self._lock = threading.Lock()
+        self.records = sorted(records or [], key=lambda r: r['sys_id'])
+        self.sys_ids = [r['sys_id'] for r in self.records]
+        self.by_name: Dict[str, List[Dict]] = {}
+        for record in self.records:
+            self.by_name.setdefault(record.get('name'), []).append(record)
+    
+    def get(self, sys_id: str) -> Optional[Dict[str, Any]]:
+        i = bisect.bisect_left(self.sys_ids, sys_id)
+        if i < len(self.sys_ids) and self.sys_ids[i] == sys_id:
+            return self.records[i]
+        return None
+    
+    def insert(self, record: Dict[str, Any]):
+        with self._lock:
+            i = bisect.bisect_left(self.sys_ids, record['sys_id'])
+            self.sys_ids.insert(i, record['sys_id'])
+            self.records.insert(i, record)
+            self.by_name.setdefault(record.get('name'), []).append(record)
+    
+    def query(
+        self,
+        query: str,
+        limit: int,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Return up to `limit` matching records after `offset`."""
+        conditions, order_by = parse_query(query)
+        
+        # Seed the scan from an index where possible
+        candidates = self.records
+        start = 0
+        remaining = []
+        for field, op, value in conditions:
+            if field == 'name' and op in ('=', 'IN') and candidates is self.records:
+                names = value.split(',') if op == 'IN' else [value]
+                candidates = sorted(
+                    (r for n in names for r in self.by_name.get(n, [])),
+                    key=lambda r: r['sys_id']
+                )
+            elif field == 'sys_id' and op in ('>', '>=') and order_by in (None, 'sys_id'):
+                position = (bisect.bisect_right if op == '>' else bisect.bisect_left)
+                start = max(start, position(self.sys_ids, value))
+                remaining.append((field, op, value))
+            else:
+                remaining.append((field, op, value))
+        
+        predicates = [_predicate(*c) for c in remaining]
+        if candidates is not self.records:
+            start = 0
+        
+        matches = []
+        wanted = offset + limit
+        for record in candidates[start:] if start else candidates:
+            if all(p(record) for p in predicates):
+                matches.append(record)
+                if len(matches) >= wanted and order_by in (None, 'sys_id'):
+                    break
+        
+        if order_by not in (None, 'sys_id'):
+            matches.sort(key=lambda r: str(r.get(order_by, '')))
+        return matches[offset:wanted]
+
+
+#--------------------------------------------------------------
+# Mock Server
+#--------------------------------------------------------------
+
+class MockServiceNow:
+    """
+    ServiceNow API stand-in with fault injection.
+    
+    Args:
+        records: CMDB records to serve
+        cmdb_table: Name of the CMDB table
+        latency: Mean added latency per request, in seconds
+        jitter: Uniform +/- jitter on the latency, in seconds
+        error_rate: Fraction of requests answered with 503
+        throttle_rate: Fraction of requests answered with 429
+        rate_limit: Requests/sec before answering 429 (0 disables)
+        batch: Whether the Batch API is available
+    """
+    
+    def __init__(
+        self,
+        records: List[Dict[str, Any]],
+        cmdb_table: str = 'cmdb_ci_vm_instance',
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        batch: bool = True
+    ):
+        self.cmdb_table = cmdb_table
+        self.tables = {cmdb_table: Table(records), 'incident': Table()}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.batch = batch
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._incident_seq = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+    
+    def inject_fault(self) -> Optional[Tuple[int, Dict[str, str], Dict]]:
+        """
+        Apply latency and decide whether to fail this request.
+        
+        Returns:
+            (status, headers, body) for an injected failure, or None
+        """
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        
+        if self.rate_limit:
+            with self._lock:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start, self._window_count = now, 0
+                self._window_count += 1
+                limited = self._window_count > self.rate_limit
+            if limited:
+                return 429, {'Retry-After': '1'}, _error('Rate limit exceeded')
+        
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            return 429, {'Retry-After': '1'}, _error('Rate limit exceeded')
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, {}, _error('Service unavailable')
+        return None
+    
+    def handle(
+        self,
+        method: str,
+        path: str,
+        params: Dict[str, str],
+        body: Dict[str, Any]
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Serve one Table API request; also used for Batch API items."""
+        match = re.match(r'^/api/now/(?:v\d+/)?table/(\w+)(?:/(\w+))?$', path)
+        if not match or match.group(1) not in self.tables:
+            return 404, _error('Table not found')
+        name, sys_id = match.groups()
+        table = self.tables[name]
+        
+        if method == 'GET' and sys_id is None:
+            try:
+                records = table.query(
+                    params.get('sysparm_query', ''),
+                    limit=int(params.get('sysparm_limit', 10000)),
+                    offset=int(params.get('sysparm_offset', 0))
+                )
+            except ValueError as e:
+                return 400, _error(str(e))
+            fields = [f for f in params.get('sysparm_fields', '').split(',') if f]
+            if fields:
+                records = [{f: r.get(f, '') for f in fields} for r in records]
+            return 200, {'result': records}
+        
+        if method == 'GET':
+            record = table.get(sys_id)
+            return (200, {'result': record}) if record else (404, _error('Record not found'))
+        
+        if method == 'POST' and name == 'incident' and sys_id is None:
+            with self._lock:
+                self._incident_seq += 1
+                seq = self._incident_seq
+            record = dict(
+                body,
+                sys_id=f"{seq:032x}",
+                number=f"INC{seq:07d}",
+                active='true',
+                state=body.get('state', '1'),
+                sys_updated_on=_now()
+            )
+            table.insert(record)
+            return 201, {'result': record}
+        
+        if method in ('PATCH', 'PUT') and sys_id:
+            record = table.get(sys_id)
+            if record is None:
+                return 404, _error('Record not found')
+            record.update(body, sys_updated_on=_now())
+            if name == 'incident' and str(body.get('state')) in ('6', '7'):
+                record['active'] = 'false'
+            return 200, {'result': record}
+        
+        return 405, _error('Method not allowed')
+    
+    def handle_batch(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Serve a Batch API request by dispatching each item."""
+        if not self.batch:
+            return 404, _error('Batch API not available')
+        
+        serviced = []
+        for item in payload.get('rest_requests', []):
+            parsed = urlparse(item.get('url', ''))
+            params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            try:
+                body = json.loads(base64.b64decode(item.get('body') or '') or b'{}')
+            except ValueError:
+                body = {}
+            status, result = self.handle(item.get('method', 'GET'), parsed.path, params, body)
+            self.count(item.get('method', 'GET'), 'batch-item', status)
+            serviced.append({
+                'id': item.get('id'),
+                'status_code': status,
+                'body': base64.b64encode(json.dumps(result).encode()).decode()
+            })
+        
+        return 200, {
+            'batch_request_id': payload.get('batch_request_id'),
+            'serviced_requests': serviced,
+            'unserviced_requests': []
+        }
+    
+    def count(self, method: str, kind: str, status: int):
+        with self._lock:
+            self.stats[f"{method} {kind} {status}"] += 1
+            self.stats['requests'] += 1
+    
+    def count_bytes(self, raw: int, sent: int):
+        with self._lock:
+            self.stats['bytes_raw'] += raw
+            self.stats['bytes_sent'] += sent
+    
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+        """Create the HTTP server (call serve_forever() on the result)."""
+        server = _MockHTTPServer((host, port), _MockRequestHandler)
+        server.mock = self
+        return server
+
+
+def _error(message: str) -> Dict[str, Any]:
+    return {'error': {'message': message, 'detail': ''}, 'status': 'failure'}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _MockRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end for MockServiceNow."""
+    
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; don't let Nagle delay the body
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format: str, *args):
+        logging.getLogger(__name__).debug(format, *args)
+    
+    def _send(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode()
+        raw_length = len(payload)
+        
+        encoding = None
+        if raw_length > 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload, compresslevel=5)
+            encoding = 'gzip'
+        self.server.mock.count_bytes(raw_length, len(payload))
+        
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _dispatch(self, method: str):
+        mock = self.server.mock
+        parsed = urlparse(self.path)
+        
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        
+        if parsed.path == '/mock/stats':
+            self._send(200, dict(mock.stats))
+            return
+        
+        fault = mock.inject_fault()
+        if fault:
+            status, headers, body = fault
+            mock.count(method, 'fault', status)
+            self._send(status, body, headers)
+            return
+        
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            mock.count(method, 'invalid', 400)
+            self._send(400, _error('Invalid JSON body'))
+            return
+        
+        if method == 'POST' and parsed.path.rstrip('/').endswith('/batch'):
+            status, result = mock.handle_batch(body)
+            kind = 'batch'
+        else:
+            params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            status, result = mock.handle(method, parsed.path, params, body)
+            kind = 'table'
+        
+        mock.count(method, kind, status)
+        self._send(status, result)
+    
+    def do_GET(self):
+        self._dispatch('GET')
+    
+    def do_POST(self):
+        self._dispatch('POST')
+    
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+    
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+
+#--------------------------------------------------------------
+# CLI Interface
+#--------------------------------------------------------------
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Local mock of the ServiceNow Table and Batch APIs'
+    )
+    
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port (0 picks a free one)')
+    parser.add_argument('--records', type=int, default=1000, help='CMDB records to generate')
+    parser.add_argument(
+        '--environment',
+        action='append',
+        choices=['dev', 'staging', 'prod', 'production'],
+        help='Environment(s) to spread records across (default: dev, staging, prod)'
+    )
+    parser.add_argument(
+        '--drift', type=float, default=0.0,
+        help='Fraction of records with cpu/ram differing from the generated values'
+    )
+    parser.add_argument('--latency', type=float, default=0.0, help='Added latency in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Latency jitter in ms')
+    parser.add_argument(
+        '--error-rate', type=float, default=0.0, help='Fraction of requests failing with 503'
+    )
+    parser.add_argument(
+        '--throttle-rate', type=float, default=0.0, help='Fraction of requests failing with 429'
+    )
+    parser.add_argument(
+        '--rate-limit', type=float, default=0.0,
+        help='Requests/sec allowed before answering 429 (0 disables)'
+    )
+    parser.add_argument('--no-batch', action='store_true', help='Disable the Batch API')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Log every request')
+    
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main entry point."""
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s | %(levelname)-8s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    
+    environments = tuple(args.environment or ENVIRONMENTS)
+    mock = MockServiceNow(
+        generate_records(args.records, environments, drift=args.drift),
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        batch=not args.no_batch
+    )
+    server = mock.serve(args.host, args.port)
+    
+    # First line of output is machine-readable for wrappers such as cmdb_benchmark.py
+    host, port = server.server_address[:2]
+    print(f"Listening on http://{host}:{port}", flush=True)
+    logging.info(f"Serving {args.records} records across {', '.join(environments)}")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
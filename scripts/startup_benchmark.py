@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+CMDB Sync Startup Benchmark
+===========================
+Measures how long short servicenow_cmdb_sync.py invocations take from
+process start to exit: a demo run and a cache-hit validation, via the
+cmdb_sync.py launcher and via the script itself. Wall time is reported
+against a bare interpreter, and one extra run per case with
+`python -X importtime` shows what got imported and whether the network
+stack (requests/urllib3) or asyncio was loaded on paths that never need
+them.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --runs 20 --budget 100
+    python startup_benchmark.py --cases demo cache-hit --json startup.json
+
+Author: Morpheus Automation Lab
+Version: 1.0.0
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import servicenow_cmdb_sync as cmdb_sync
+
+
+MODULE = 'servicenow_cmdb_sync'
+LAUNCHER = os.path.join(SCRIPT_DIR, 'cmdb_sync.py')
+SCRIPT = os.path.join(SCRIPT_DIR, 'servicenow_cmdb_sync.py')
+
+VM_NAME = 'startup-vm-01'
+
+# Offline cases fail the benchmark if any of these get imported
+NETWORK_MODULES = ('requests', 'urllib3', 'asyncio')
+
+# name: (command line, offline, checked against --budget)
+CASES = {
+    'interpreter': (['-c', 'pass'], True, False),
+    'demo': ([LAUNCHER, '--vm-name', VM_NAME, '-e', 'dev', '--demo'], True, True),
+    'demo-script': ([SCRIPT, '--vm-name', VM_NAME, '-e', 'dev', '--demo'], True, False),
+    'cache-hit': (
+        [LAUNCHER, '--vm-name', VM_NAME, '-e', 'dev', '--no-daemon', '--no-incident'],
+        True, True
+    )
+}
+
+
+#--------------------------------------------------------------
+# Measurement
+#--------------------------------------------------------------
+
+def seed_cache(path: str):
+    """Store a fresh CMDB record for VM_NAME so validation never hits the API."""
+    cache = cmdb_sync.CMDBCache(path)
+    cache.put({
+        'sys_id': 'startup0000000000000000000000001',
+        'name': VM_NAME,
+        'environment': 'dev',
+        'sys_updated_on': '2024-01-01 00:00:00',
+        'operational_status': '1'
+    })
+
+
+def case_env(cache_path: str) -> Dict[str, str]:
+    """Environment for the child processes: offline, with a warm cache."""
+    env = dict(os.environ)
+    # The launcher cases measure a warm __pycache__
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env.update({
+        # Unroutable, so a cache miss fails fast instead of timing out
+        'SNOW_INSTANCE': '127.0.0.1:9',
+        'SNOW_URL_SCHEME': 'http',
+        'SNOW_USERNAME': 'benchmark',
+        'SNOW_PASSWORD': 'benchmark',
+        'SNOW_CACHE_PATH': cache_path,
+        'SNOW_METRICS_FILE': '',
+        'SNOW_TRACE_FILE': '',
+        'SNOW_OTEL': 'false'
+    })
+    return env
+
+
+def run_once(argv: List[str], env: Dict[str, str], importtime: bool = False) -> Tuple[float, str]:
+    """
+    Run the interpreter once.
+    
+    Returns:
+        (wall time in ms, stderr)
+    """
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), *argv]
+    started = time.perf_counter()
+    process = subprocess.run(command, env=env, capture_output=True, text=True, timeout=60)
+    elapsed = (time.perf_counter() - started) * 1000
+    if process.returncode not in (0, 1):
+        raise RuntimeError(
+            f"{' '.join(argv)} exited with {process.returncode}: {process.stderr[-500:]}"
+        )
+    return elapsed, process.stderr
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, float, float]]:
+    """
+    Parse `-X importtime` output.
+    
+    Returns:
+        (module, depth, self ms, cumulative ms) in the order Python logged them
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(fields[0]) / 1000, int(fields[1]) / 1000))
+    return imports
+
+
+def module_imports(
+    imports: List[Tuple[str, int, float, float]]
+) -> Tuple[Optional[float], List[Tuple[str, float]]]:
+    """
+    Find the CMDB module's import time and its direct imports.
+    
+    importtime logs children before their parent, so the direct imports
+    are the depth-1 lines just ahead of the module's own line.
+    
+    Returns:
+        (module cumulative ms or None, [(module, cumulative ms)])
+    """
+    children = []
+    for name, depth, _, cumulative in imports:
+        if depth == 0:
+            if name == MODULE:
+                return cumulative, children
+            children = []
+        elif depth == 1:
+            children.append((name, cumulative))
+    return None, []
+
+
+def measure(case: str, runs: int, env: Dict[str, str], top: int) -> Dict[str, Any]:
+    """Time one case and analyse its imports."""
+    argv, offline, budgeted = CASES[case]
+    
+    # Warm-up run writes __pycache__ for the launcher cases
+    run_once(argv, env)
+    samples = [run_once(argv, env)[0] for _ in range(runs)]
+    
+    imports = parse_importtime(run_once(argv, env, importtime=True)[1])
+    import_ms, children = module_imports(imports)
+    loaded = sorted({
+        prefix for name, _, _, _ in imports for prefix in NETWORK_MODULES
+        if name == prefix or name.startswith(prefix + '.')
+    })
+    
+    return {
+        'case': case,
+        'runs': runs,
+        'min_ms': round(min(samples), 1),
+        'median_ms': round(statistics.median(samples), 1),
+        'import_ms': round(import_ms, 1) if import_ms is not None else None,
+        'network': loaded,
+        'offline': offline,
+        'budgeted': budgeted,
+        'top_imports': [
+            {'module': name, 'ms': round(ms, 1)}
+            for name, ms in sorted(children, key=lambda c: -c[1])[:top]
+        ]
+    }
+
+
+#--------------------------------------------------------------
+# Reporting
+#--------------------------------------------------------------
+
+REPORT_COLUMNS = (
+    ('case', 'Case', '{:<12}'),
+    ('runs', 'Runs', '{:>5}'),
+    ('min_ms', 'Min ms', '{:>8}'),
+    ('median_ms', 'p50 ms', '{:>8}'),
+    ('overhead_ms', 'Over ms', '{:>8}'),
+    ('import_ms', 'Import ms', '{:>10}'),
+    ('network', 'Loaded', '{:<20}')
+)
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """Print results as a fixed-width table, then each case's slowest imports."""
+    header = '  '.join(fmt.format(title) for _, title, fmt in REPORT_COLUMNS)
+    print(header)
+    print('-' * len(header))
+    for row in results:
+        cells = dict(row, network=','.join(row['network']) or '-')
+        print('  '.join(
+            fmt.format('-' if cells[key] is None else cells[key])
+            for key, _, fmt in REPORT_COLUMNS
+        ))
+    
+    for row in results:
+        if row['top_imports']:
+            slowest = ', '.join(f"{i['module']} {i['ms']}" for i in row['top_imports'])
+            print(f"\nSlowest imports ({row['case']}, ms): {slowest}")
+
+
+def find_failures(results: List[Dict[str, Any]], budget: Optional[float]) -> List[str]:
+    """
+    Check offline cases stayed offline and budgeted cases met --budget.
+    
+    Returns:
+        One message per failed check
+    """
+    failures = []
+    for row in results:
+        if row['offline'] and row['network']:
+            failures.append(f"{row['case']}: loaded {', '.join(row['network'])}")
+        if (budget is not None and row['budgeted']
+                and row['overhead_ms'] is not None and row['overhead_ms'] > budget):
+            failures.append(
+                f"{row['case']}: {row['overhead_ms']} ms over the bare interpreter "
+                f"(budget {budget} ms)"
+            )
+    return failures
+
+
+#--------------------------------------------------------------
+# CLI Interface
+#--------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Measure servicenow_cmdb_sync.py startup time and imports'
+    )
+    
+    parser.add_argument(
+        '--cases', nargs='+', choices=[c for c in CASES if c != 'interpreter'],
+        default=[c for c in CASES if c != 'interpreter'],
+        help='Cases to run (the bare interpreter is always measured)'
+    )
+    parser.add_argument('--runs', type=int, default=10, help='Timed runs per case')
+    parser.add_argument(
+        '--budget', type=float, metavar='MS',
+        help='Fail if a launcher case takes longer than this over the bare interpreter'
+    )
+    parser.add_argument('--top', type=int, default=5, help='Slowest imports to list per case')
+    parser.add_argument('--json', metavar='FILE', help='Write results as JSON')
+    
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Main entry point."""
+    args = parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='cmdb-startup-')
+    try:
+        cache_path = os.path.join(workdir, 'cache.db')
+        seed_cache(cache_path)
+        env = case_env(cache_path)
+        
+        results = []
+        for case in ['interpreter', *args.cases]:
+            print(f"Running {case}...", file=sys.stderr, flush=True)
+            results.append(measure(case, args.runs, env, args.top))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    baseline = results[0]['median_ms']
+    for row in results:
+        row['overhead_ms'] = (
+            round(row['median_ms'] - baseline, 1) if row['case'] != 'interpreter' else None
+        )
+    
+    print_report(results)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    failures = find_failures(results, args.budget)
+    if failures:
+        print("\nStartup checks failed:")
+        for message in failures:
+            print(f"  - {message}")
+        return 1
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Shared fixtures: a mock ServiceNow instance per test, with the SNOW_*
+environment pointing the sync script at it.
+"""
+
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+import servicenow_mock_server as mock_server  # noqa: E402
+
+
+@pytest.fixture
+def servicenow(monkeypatch, tmp_path):
+    """
+    Start a mock ServiceNow instance and configure the sync script for it.
+    
+    Returns a function start(count, batch=True, **env) that serves `count`
+    dev records and returns the MockServiceNow. Extra keyword arguments are
+    set as environment variables, e.g. SNOW_PAGE_SIZE='10'.
+    """
+    servers = []
+    
+    def start(count: int = 50, batch: bool = True, **env) -> mock_server.MockServiceNow:
+        mock = mock_server.MockServiceNow(
+            mock_server.generate_records(count, ('dev',)), batch=batch
+        )
+        server = mock.serve()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        
+        for name in list(os.environ):
+            if name.startswith('SNOW_'):
+                monkeypatch.delenv(name)
+        settings = {
+            'SNOW_INSTANCE': f"127.0.0.1:{server.server_address[1]}",
+            'SNOW_URL_SCHEME': 'http',
+            'SNOW_USERNAME': 'test',
+            'SNOW_PASSWORD': 'test',
+            'SNOW_RETRY_DELAY': '0.01',
+            'SNOW_MEMO_TTL': '0',
+            'SNOW_WATCH_STATE': str(tmp_path / 'watch.db'),
+        }
+        settings.update(env)
+        for name, value in settings.items():
+            monkeypatch.setenv(name, str(value))
+        return mock
+    
+    yield start
+    
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def fail_requests(mock, after: int = 0, status: int = 503, headers=None, times=None):
+    """
+    Answer every request after the first `after` with `status`.
+    
+    Stops after `times` failures if given. Returns the call counter; pass
+    the mock to heal() to stop failing.
+    """
+    calls = {'requests': 0, 'failed': 0}
+    
+    def inject_fault():
+        calls['requests'] += 1
+        if calls['requests'] > after and (times is None or calls['failed'] < times):
+            calls['failed'] += 1
+            return status, dict(headers or {}), mock_server._error('Injected failure')
+        return None
+    
+    mock.inject_fault = inject_fault
+    return calls
+
+
+def heal(mock):
+    """Stop the failures injected with fail_requests."""
+    mock.__dict__.pop('inject_fault', None)
+
+
+def reject_items(mock, text):
+    """Answer 400 to every create or update whose URL or body mentions `text`."""
+    handle = mock.handle
+    
+    def reject(method, path, params, body):
+        if method != 'GET' and (text in path or text in json.dumps(body)):
+            return 400, mock_server._error(f"Rejected {text}")
+        return handle(method, path, params, body)
+    
+    mock.handle = reject
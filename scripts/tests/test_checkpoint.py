@@ -0,0 +1,85 @@
+"""Checkpointed batch validation: abort on a failed lookup, then resume."""
+
+import csv
+import json
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+from conftest import fail_requests, heal
+
+NAMES = [f"dev-vm-{i:06d}" for i in range(30)]
+EXPECTED = {name: {'name': name} for name in NAMES}
+
+
+@pytest.fixture
+def mock(servicenow):
+    return servicenow(30, SNOW_VALIDATION_CHUNK_SIZE='10')
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = cmdb_sync.ValidationCheckpoint(str(tmp_path / 'checkpoint.db'))
+    yield checkpoint
+    checkpoint.close()
+
+
+def validate(checkpoint, writer=None, resume=False):
+    return cmdb_sync.run_batch_validation(
+        NAMES, 'dev', EXPECTED, create_incident=False,
+        writer=writer, checkpoint=checkpoint, resume=resume
+    )
+
+
+def test_failed_lookup_aborts_before_saving_the_chunk(mock, checkpoint):
+    fail_requests(mock, after=1)
+    passed, results = validate(checkpoint)
+    
+    assert not passed
+    assert 'Failed to fetch page' in results['error']
+    # Only the first chunk was saved; its VMs were found, none reported missing
+    assert checkpoint.counts() == (10, 0)
+
+
+def test_resume_restarts_at_the_failed_chunk(mock, checkpoint):
+    fail_requests(mock, after=1)
+    validate(checkpoint)
+    
+    heal(mock)
+    mock.stats.clear()
+    passed, results = validate(checkpoint, resume=True)
+    
+    assert passed
+    assert 'error' not in results
+    assert results['passed_count'] == 30
+    assert [r['vm_name'] for r in results['results']] == NAMES
+    # The saved chunk was not looked up again
+    assert mock.stats['GET table 200'] == 2
+
+
+@pytest.mark.parametrize('output_format', ['ndjson', 'csv'])
+def test_resumed_output_continues_the_file(mock, checkpoint, tmp_path, output_format):
+    path = str(tmp_path / f"results.{output_format}")
+    
+    fail_requests(mock, after=2)
+    writer = cmdb_sync.open_result_writer(output_format, path)
+    passed, results = validate(checkpoint, writer)
+    writer.write_summary(results)
+    writer.close()
+    assert not passed
+    
+    heal(mock)
+    writer = cmdb_sync.open_result_writer(output_format, path, append=True)
+    passed, results = validate(checkpoint, writer, resume=True)
+    writer.write_summary(results)
+    writer.close()
+    assert passed
+    
+    with open(path, encoding='utf-8', newline='') as f:
+        if output_format == 'csv':
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f]
+    vm_rows, summary = rows[:-1], rows[-1]
+    assert [row['vm_name'] for row in vm_rows] == NAMES
+    assert summary['type'] == 'summary'
@@ -0,0 +1,98 @@
+"""Identical reads share one request: SingleFlight in flight, ResponseMemo after."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+
+def test_single_flight_shares_one_call():
+    flight = cmdb_sync.SingleFlight()
+    release = threading.Event()
+    calls = []
+    
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'record'
+    
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do_shared, 'vm-a', fetch) for _ in range(8)]
+        # Give the followers time to join the leader's call
+        time.sleep(0.2)
+        release.set()
+        results = [f.result() for f in futures]
+    
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 7
+    assert all(value == 'record' for value, _ in results)
+    # The next call runs again
+    assert flight.do('vm-a', lambda: 'fresh') == 'fresh'
+
+
+def test_single_flight_propagates_errors():
+    flight = cmdb_sync.SingleFlight()
+    
+    def fail():
+        raise RuntimeError('lookup failed')
+    
+    with pytest.raises(RuntimeError, match='lookup failed'):
+        flight.do('vm-a', fail)
+    assert flight.do('vm-a', lambda: 'ok') == 'ok'
+
+
+def test_memo_expires_entries():
+    memo = cmdb_sync.ResponseMemo(ttl=0.05, max_entries=10, max_bytes=1000)
+    memo.put(('table/x', 'a'), {'n': 1}, 10)
+    assert memo.get(('table/x', 'a')) == {'n': 1}
+    time.sleep(0.1)
+    assert memo.get(('table/x', 'a')) is None
+    assert len(memo) == 0
+
+
+def test_memo_evicts_least_recently_used():
+    memo = cmdb_sync.ResponseMemo(ttl=60, max_entries=2, max_bytes=100)
+    memo.put(('t', 'a'), 'a', 10)
+    memo.put(('t', 'b'), 'b', 10)
+    memo.get(('t', 'a'))
+    memo.put(('t', 'c'), 'c', 10)
+    assert memo.get(('t', 'b')) is None
+    assert memo.get(('t', 'a')) == 'a'
+    
+    # Over the byte budget: oldest entries go, oversized ones are never kept
+    memo.put(('t', 'd'), 'd', 95)
+    assert len(memo) == 1 and memo.get(('t', 'd')) == 'd'
+    memo.put(('t', 'e'), 'e', 101)
+    assert memo.get(('t', 'e')) is None
+
+
+def test_memo_invalidates_a_scope():
+    memo = cmdb_sync.ResponseMemo(ttl=60, max_entries=10, max_bytes=1000)
+    memo.put(('table/incident', 'a'), 'a', 1)
+    memo.put(('table/cmdb_ci_vm_instance', 'b'), 'b', 1)
+    memo.invalidate('table/incident')
+    assert memo.get(('table/incident', 'a')) is None
+    assert memo.get(('table/cmdb_ci_vm_instance', 'b')) == 'b'
+
+
+def test_client_reads_are_coalesced(servicenow):
+    mock = servicenow(5, SNOW_MEMO_TTL='60')
+    mock.latency = 0.2
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            records = list(pool.map(
+                lambda _: cmdb_sync.get_cmdb_record(client, 'dev-vm-000001'), range(4)
+            ))
+        assert mock.stats['GET table 200'] == 1
+        
+        # Memoized after the call completes
+        cmdb_sync.get_cmdb_record(client, 'dev-vm-000001')
+        assert mock.stats['GET table 200'] == 1
+    finally:
+        client.close()
+    
+    assert all(r['name'] == 'dev-vm-000001' for r in records)
@@ -0,0 +1,101 @@
+"""Adaptive (AIMD) concurrency limits: growth, backoff and the client's cap."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+
+@pytest.fixture
+def config(servicenow):
+    servicenow(5, SNOW_MAX_CONCURRENCY='20')
+    return cmdb_sync.ServiceNowConfig()
+
+
+@pytest.mark.parametrize('max_concurrency', [5, 40])
+def test_limit_is_capped_by_async_client_concurrency(config, max_concurrency):
+    client = cmdb_sync.AsyncServiceNowClient(config, max_concurrency=max_concurrency)
+    try:
+        assert client.concurrency.max_limit == max_concurrency
+        assert client.limit == max_concurrency
+        
+        # A halving is felt at once, not after the limit drops below the cap
+        client.concurrency.record(0.1, '429')
+        assert client.limit == max_concurrency // 2
+    finally:
+        client.close()
+
+
+def test_shared_client_keeps_its_limit(config):
+    sync_client = cmdb_sync.ServiceNowClient(config, pool_size=8)
+    client = cmdb_sync.AsyncServiceNowClient(config, client=sync_client)
+    try:
+        assert client.max_concurrency == 8
+        assert client.concurrency is sync_client.concurrency
+        assert client.concurrency.max_limit == 8
+    finally:
+        client.close()
+        sync_client.close()
+
+
+def report(limit, samples, latency=0.01, status='200'):
+    for _ in range(samples):
+        limit.record(latency, status)
+
+
+def healthy_window(limit, latency=0.01):
+    report(limit, max(limit.limit, limit.MIN_WINDOW), latency)
+
+
+def throttled(max_limit=16, min_limit=2, latency_target=1.0):
+    """A limit just halved by a 429, with the in-flight reports it ignores drained."""
+    limit = cmdb_sync.AdaptiveConcurrencyLimit(min_limit, max_limit, latency_target)
+    limit.record(0.01, '429')
+    report(limit, max_limit)
+    return limit
+
+
+def test_limit_grows_by_one_per_healthy_window():
+    limit = throttled()
+    assert limit.limit == 8
+    
+    seen = []
+    for _ in range(10):
+        healthy_window(limit)
+        seen.append(limit.limit)
+    assert seen == [9, 10, 11, 12, 13, 14, 15, 16, 16, 16]
+    assert cmdb_sync.METRICS.value('snow_concurrency_limit') == 16
+
+
+def test_burst_of_throttling_halves_once():
+    limit = cmdb_sync.AdaptiveConcurrencyLimit(3, 16, 1.0)
+    report(limit, 16, status='429')
+    assert limit.limit == 8
+    
+    # Once requests sent at the old limit are done, throttling cuts again
+    report(limit, 1)
+    limit.record(0.01, 'timeout')
+    assert limit.limit == 4
+    report(limit, 8)
+    limit.record(0.01, 'timeout')
+    assert limit.limit == 3
+
+
+def test_errors_back_off():
+    limit = throttled()
+    report(limit, 9)
+    limit.record(0.01, '503')
+    assert limit.limit == 4
+
+
+def test_latency_over_target_backs_off():
+    limit = throttled(latency_target=0.1)
+    healthy_window(limit, latency=0.5)
+    assert limit.limit == 4
+
+
+def test_latency_over_learned_baseline_backs_off():
+    limit = throttled(latency_target=0)
+    healthy_window(limit, latency=0.01)
+    assert limit.limit == 9
+    healthy_window(limit, latency=0.05)
+    assert limit.limit == 4
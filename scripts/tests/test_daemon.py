@@ -0,0 +1,87 @@
+"""The validation daemon only runs jobs with its token and identity."""
+
+import json
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+JOB = {
+    'vm_name': 'dev-vm-000001',
+    'environment': 'dev',
+    'expected_values': {'name': 'dev-vm-000001', 'environment': 'dev'},
+    'create_incident': False,
+}
+
+
+@pytest.fixture
+def daemon(servicenow, tmp_path):
+    servicenow(
+        5,
+        SNOW_DAEMON_ADDR=f"unix:{tmp_path / 'daemon.sock'}",
+        SNOW_DAEMON_TOKEN_FILE=str(tmp_path / 'daemon.token')
+    )
+    daemon = cmdb_sync.ValidationDaemon(cmdb_sync.ServiceNowConfig())
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while daemon.server is None or not os.path.exists(tmp_path / 'daemon.sock'):
+        assert time.monotonic() < deadline, 'daemon did not start'
+        time.sleep(0.01)
+    yield daemon
+    daemon.server.shutdown()
+    thread.join()
+    daemon.client.close()
+
+
+def post(config, token, job):
+    """POST a job with the given token; returns (status, body)."""
+    _, path = cmdb_sync.parse_daemon_address(config.daemon_address)
+    connection_class = cmdb_sync._http_class(
+        cmdb_sync._UnixHTTPConnection, cmdb_sync.http_client.HTTPConnection
+    )
+    conn = connection_class(path, timeout=5)
+    try:
+        conn.request(
+            'POST', '/validate', body=json.dumps(job),
+            headers={'Content-Type': 'application/json', 'Authorization': f"Bearer {token}"}
+        )
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def test_token_file_is_private(daemon):
+    mode = os.stat(daemon.config.daemon_token_file).st_mode
+    assert stat.S_IMODE(mode) == 0o600
+    assert cmdb_sync.daemon_token(daemon.config) == daemon.token
+
+
+def test_job_runs_with_token_and_identity(daemon):
+    passed, results = cmdb_sync.daemon_validate(cmdb_sync.ServiceNowConfig(), JOB)
+    assert passed
+    assert results['vm_name'] == JOB['vm_name']
+
+
+def test_wrong_token_is_refused(daemon, monkeypatch):
+    status, _ = post(daemon.config, 'wrong', JOB)
+    assert status == 401
+    
+    monkeypatch.setenv('SNOW_DAEMON_TOKEN', 'wrong')
+    assert cmdb_sync.daemon_validate(cmdb_sync.ServiceNowConfig(), JOB) is None
+
+
+def test_job_for_another_table_is_refused(daemon, monkeypatch):
+    monkeypatch.setenv('SNOW_CMDB_TABLE', 'cmdb_ci_server')
+    config = cmdb_sync.ServiceNowConfig()
+    
+    job = {**JOB, 'identity': cmdb_sync.daemon_identity(config)}
+    status, body = post(config, daemon.token, job)
+    assert status == 409
+    assert body['identity'] == cmdb_sync.daemon_identity(daemon.config)
+    assert cmdb_sync.daemon_validate(config, JOB) is None
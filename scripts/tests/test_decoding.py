@@ -0,0 +1,96 @@
+"""JSON decoder selection and pipelined page decoding."""
+
+import importlib.util
+import json
+import logging
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+from conftest import fail_requests
+
+NAMES = [f"dev-vm-{i:06d}" for i in range(50)]
+
+
+@pytest.fixture
+def mock(servicenow):
+    return servicenow(50, SNOW_PAGE_SIZE='10')
+
+
+@pytest.fixture
+def client(mock):
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    yield client
+    client.close()
+
+
+def scan(client, prefetch, strict=False, page_size=None):
+    endpoint = f"table/{client.config.cmdb_table}"
+    params = {'sysparm_fields': 'sys_id,name', 'sysparm_query': 'environment=dev'}
+    schema = cmdb_sync.RecordSchema(['sys_id', 'name'])
+    records = cmdb_sync._iter_table_records(
+        client, endpoint, params, page_size=page_size, prefetch=prefetch, strict=strict,
+        transform=schema.compact
+    )
+    return [record['name'] for record in records]
+
+
+def test_standard_library_decoder():
+    name, loads = cmdb_sync.get_json_decoder('json')
+    assert name == 'json'
+    assert loads(b'{"a": [1]}') == {'a': [1]}
+    with pytest.raises(ValueError, match='Unknown JSON decoder'):
+        cmdb_sync.get_json_decoder('simdjson')
+
+
+@pytest.mark.skipif(importlib.util.find_spec('ujson') is not None, reason='ujson installed')
+def test_missing_decoder_falls_back():
+    assert cmdb_sync.get_json_decoder('ujson')[0] == 'json'
+
+
+def test_fast_decoder_falls_back_on_rejected_documents():
+    def strict_loads(data):
+        raise ValueError('out of range')
+    
+    loads = cmdb_sync._fast_loads(strict_loads)
+    assert loads(b'[1e400]') == [float('inf')]
+    with pytest.raises(ValueError):
+        loads(b'{not json')
+
+
+def test_peek_page():
+    body = json.dumps({'result': [
+        {'sys_id': 'a', 'name': 'x'}, {'name': 'y "sys_id": "z"', 'sys_id': 'b\\"c'}
+    ]}).encode()
+    assert cmdb_sync._peek_page(body) == (2, 'b\\"c')
+    assert cmdb_sync._peek_page(b'{"result": []}') == (0, None)
+
+
+@pytest.mark.parametrize('page_size', [10, 7])
+def test_prefetch_matches_sequential_scan(client, page_size):
+    assert scan(client, prefetch=True, page_size=page_size) == NAMES
+    assert scan(client, prefetch=False, page_size=page_size) == NAMES
+
+
+def test_prefetch_recovers_from_a_wrong_peek(mock, client, caplog):
+    handle = mock.handle
+    
+    def nested_sys_id(method, path, params, body):
+        # A reference link after sys_id makes the raw peek read the wrong key
+        status, response = handle(method, path, params, body)
+        if method == 'GET' and isinstance(response.get('result'), list):
+            response = {'result': [
+                {**record, 'ref': {'sys_id': '0'}} for record in response['result']
+            ]}
+        return status, response
+    
+    mock.handle = nested_sys_id
+    with caplog.at_level(logging.WARNING):
+        assert scan(client, prefetch=True) == NAMES
+    assert 'fetching the rest page by page' in caplog.text
+
+
+def test_prefetch_failed_page(mock, client):
+    fail_requests(mock, after=2)
+    with pytest.raises(RuntimeError, match='Failed to fetch page'):
+        scan(client, prefetch=True, strict=True)
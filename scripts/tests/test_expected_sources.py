@@ -0,0 +1,109 @@
+"""Expected values loaded in bulk from Terraform and Ansible inventories."""
+
+import json
+
+import servicenow_cmdb_sync as cmdb_sync
+
+
+def write_json(path, document):
+    path.write_text(json.dumps(document))
+    return str(path)
+
+
+def vm_resource(names, cpus=2):
+    return {
+        'mode': 'managed',
+        'type': 'vsphere_virtual_machine',
+        'name': 'vm',
+        'instances': [
+            {'attributes': {
+                'name': name, 'num_cpus': cpus, 'memory': 4096,
+                'default_ip_address': f"10.0.0.{i}", 'disk': [{'size': 40}, {'size': 60}]
+            }}
+            for i, name in enumerate(names)
+        ]
+    }
+
+
+def test_terraform_output_json(tmp_path):
+    path = write_json(tmp_path / 'outputs.json', {
+        'vm_name': {'value': 'dev-web-01'},
+        'vm_cpu': {'value': 2},
+        'vm_memory': {'value': 4096},
+        'vm_default_ip_address': {'value': '10.0.0.5'},
+        'db_name': {'value': ['dev-db-01', 'dev-db-02']},
+        'db_ip': {'value': ['10.0.1.1']},
+        'app_name': {'value': {'a': 'dev-app-a'}},
+        'app_cpu': {'value': {'a': 8}},
+    })
+    expected = cmdb_sync.load_terraform_expected(path, 'dev')
+    
+    assert expected['dev-web-01'] == {
+        'name': 'dev-web-01', 'cpu_count': 2, 'ram': 4096,
+        'ip_address': '10.0.0.5', 'environment': 'dev'
+    }
+    assert expected['dev-db-01']['ip_address'] == '10.0.1.1'
+    assert 'ip_address' not in expected['dev-db-02']
+    assert expected['dev-app-a']['cpu_count'] == 8
+
+
+def test_terraform_state_prefers_resources_over_outputs(tmp_path):
+    path = write_json(tmp_path / 'terraform.tfstate', {
+        'version': 4,
+        'outputs': {'vm_name': {'value': 'dev-web-01'}, 'vm_cpu': {'value': 1}},
+        'resources': [
+            {'mode': 'data', 'type': 'vsphere_virtual_machine', 'instances': []},
+            vm_resource(['dev-web-01'], cpus=4),
+        ]
+    })
+    expected = cmdb_sync.load_terraform_expected(path, 'dev')
+    
+    assert expected == {'dev-web-01': {
+        'name': 'dev-web-01', 'cpu_count': 4, 'ram': 4096, 'ip_address': '10.0.0.0',
+        'disk_space': 100, 'environment': 'dev'
+    }}
+
+
+def test_large_terraform_state_is_streamed(tmp_path):
+    names = [f"dev-vm-{i:05d}" for i in range(2000)]
+    path = write_json(tmp_path / 'terraform.tfstate', {
+        'resources': [vm_resource(names[i:i + 100]) for i in range(0, len(names), 100)]
+    })
+    expected = cmdb_sync.load_terraform_expected(path, 'dev')
+    assert sorted(expected) == names
+
+
+def test_ansible_inventory(tmp_path):
+    path = tmp_path / 'inventory'
+    path.write_text(
+        "[all:vars]\n"
+        "ram=2048\n"
+        "\n"
+        "[web]\n"
+        "dev-web-[01:03] cpu_count=2\n"
+        "dev-web-04 ansible_host=10.0.0.4 ram=8192\n"
+        "\n"
+        "[db]\n"
+        "prod-db-01 environment=prod\n"
+        "dev-db-01 ansible_host=db.example.com\n"
+        "\n"
+        "[dev:children]\n"
+        "web\n"
+        "\n"
+        "[dev:vars]\n"
+        "cpu_count=1\n"
+        "ram=4096\n"
+    )
+    expected = cmdb_sync.load_ansible_inventory(str(path), 'dev')
+    
+    assert sorted(expected) == [
+        'dev-db-01', 'dev-web-01', 'dev-web-02', 'dev-web-03', 'dev-web-04'
+    ]
+    # Host vars beat group vars, which beat parent group and all:vars
+    assert expected['dev-web-02'] == {
+        'name': 'dev-web-02', 'environment': 'dev', 'cpu_count': '2', 'ram': '4096'
+    }
+    assert expected['dev-web-04']['ram'] == '8192'
+    assert expected['dev-web-04']['ip_address'] == '10.0.0.4'
+    assert 'ip_address' not in expected['dev-db-01']
+    assert expected['dev-db-01']['ram'] == '2048'
@@ -0,0 +1,149 @@
+"""CMDB exports: every format, the saved .idx index and its invalidation."""
+
+import csv
+import json
+import os
+from xml.sax.saxutils import escape
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+RECORDS = [
+    {'sys_id': f"{i:032x}", 'name': f"dev-vm-{i:03d}", 'cpu_count': '2', 'environment': 'dev'}
+    for i in range(50)
+]
+# Multi-byte names and a value spanning lines exercise offsets and quoting
+RECORDS.append({
+    'sys_id': 'f' * 32, 'name': 'dev-vm-übung', 'cpu_count': '4',
+    'environment': 'dev', 'comments': 'line one\nline "two"'
+})
+
+
+def write_json(path, records):
+    # Reference fields as the Table API returns them
+    records = [{**r, 'environment': {'value': r['environment'], 'link': 'x'}} for r in records]
+    path.write_text(json.dumps({'records': records}, ensure_ascii=False), encoding='utf-8')
+
+
+def write_ndjson(path, records):
+    path.write_text(
+        ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records), encoding='utf-8'
+    )
+
+
+def write_csv(path, records):
+    fields = list(dict.fromkeys(f for r in records for f in r))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def write_xml(path, records):
+    rows = ''.join(
+        '<cmdb_ci_vm_instance>'
+        + ''.join(f"<{k}>{escape(v)}</{k}>" for k, v in r.items())
+        + '</cmdb_ci_vm_instance>\n'
+        for r in records
+    )
+    document = f"<?xml version='1.0' encoding='UTF-8'?>\n<unload>\n{rows}</unload>\n"
+    path.write_text(document, encoding='utf-8')
+
+
+WRITERS = {'.json': write_json, '.ndjson': write_ndjson, '.csv': write_csv, '.xml': write_xml}
+
+
+@pytest.fixture(params=list(WRITERS))
+def export_path(request, tmp_path):
+    path = tmp_path / f"cmdb{request.param}"
+    WRITERS[request.param](path, RECORDS)
+    return str(path)
+
+
+def open_export(path):
+    return cmdb_sync.open_cmdb_export(path)
+
+
+def test_lookup_and_scan(export_path):
+    export = open_export(export_path)
+    try:
+        assert export.count == len(RECORDS)
+        assert export.get('dev-vm-007')['sys_id'] == f"{7:032x}"
+        assert export.get('dev-vm-007', ['name', 'environment']) == {
+            'name': 'dev-vm-007', 'environment': 'dev'
+        }
+        assert export.get('dev-vm-übung')['comments'] == 'line one\nline "two"'
+        assert export.get('dev-vm-999') is None
+        assert sorted(export.get_many(['dev-vm-001', 'dev-vm-999', 'dev-vm-002'])) == [
+            'dev-vm-001', 'dev-vm-002'
+        ]
+        assert [r['name'] for r in export.scan(['name'])] == [r['name'] for r in RECORDS]
+    finally:
+        export.close()
+
+
+def test_index_is_saved_and_reused(export_path, monkeypatch):
+    open_export(export_path).close()
+    assert os.path.exists(f"{export_path}.idx")
+    
+    def rebuild(*args):
+        raise AssertionError('index rebuilt')
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(cmdb_sync.CMDBExport, '_build_index', rebuild)
+        export = open_export(export_path)
+        try:
+            assert export.count == len(RECORDS)
+            assert export.get('dev-vm-049')['name'] == 'dev-vm-049'
+        finally:
+            export.close()
+
+
+def test_changed_export_is_reindexed(tmp_path):
+    path = tmp_path / 'cmdb.ndjson'
+    write_ndjson(path, RECORDS[:10])
+    open_export(str(path)).close()
+    
+    write_ndjson(path, RECORDS[5:20])
+    export = open_export(str(path))
+    try:
+        assert export.count == 15
+        assert export.get('dev-vm-001') is None
+        assert export.get('dev-vm-019')['name'] == 'dev-vm-019'
+    finally:
+        export.close()
+
+
+def test_duplicate_names_keep_the_first_record(tmp_path):
+    path = tmp_path / 'cmdb.ndjson'
+    write_ndjson(path, [RECORDS[0], {**RECORDS[0], 'cpu_count': '8'}])
+    export = open_export(str(path))
+    try:
+        assert export.count == 1
+        assert export.get('dev-vm-000')['cpu_count'] == '2'
+    finally:
+        export.close()
+
+
+def test_unsupported_export(tmp_path):
+    path = tmp_path / 'cmdb.txt'
+    path.write_text('')
+    with pytest.raises(ValueError, match='Unsupported CMDB export'):
+        open_export(str(path))
+    with pytest.raises(TypeError):
+        cmdb_sync.CMDBExport(str(path))
+
+
+def test_client_reads_from_export(servicenow, tmp_path):
+    path = tmp_path / 'cmdb.csv'
+    write_csv(path, RECORDS)
+    mock = servicenow(5, SNOW_CMDB_EXPORT=str(path))
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    try:
+        records = cmdb_sync.get_cmdb_records_bulk(client, ['dev-vm-003', 'dev-vm-999'])
+    finally:
+        client.close()
+    
+    assert list(records) == ['dev-vm-003']
+    assert mock.stats['requests'] == 0
@@ -0,0 +1,67 @@
+"""compare_fleet finds the same discrepancies as validate_sync per VM."""
+
+import servicenow_cmdb_sync as cmdb_sync
+
+EXPECTED = {
+    'vm-ok': {'name': 'vm-ok', 'cpu_count': 2, 'ram': 4096, 'environment': 'dev'},
+    'vm-units': {'name': 'vm-units', 'ram': '4 GB', 'disk_space': '100', 'environment': 'DEV'},
+    'vm-drift': {
+        'name': 'vm-drift', 'cpu_count': 4, 'ram': 8192, 'disk_space': 100,
+        'environment': 'prod', 'ip_address': '10.0.0.9'
+    },
+    'vm-missing': {'name': 'vm-missing', 'environment': 'dev'},
+    'vm-empty': {'name': 'vm-empty'},
+}
+
+ACTUAL = {
+    'vm-ok': {
+        'name': 'vm-ok', 'cpu_count': '2', 'ram': '4096', 'environment': 'dev',
+        'state': 'on', 'disk_space': '50'
+    },
+    'vm-units': {
+        'name': 'vm-units', 'ram': '4096', 'disk_space': '100.8', 'environment': 'dev',
+        'state': 'Running'
+    },
+    'vm-drift': {
+        'name': 'vm-drift', 'cpu_count': '2', 'ram': '4096', 'disk_space': '90',
+        'environment': 'dev', 'ip_address': '10.0.0.1', 'state': 'Off'
+    },
+    'vm-empty': {'name': 'vm-empty', 'environment': ''},
+}
+
+
+def as_rows(discrepancies):
+    return sorted(
+        (d['field'], str(d['expected']), str(d['actual']), str(d['severity']))
+        for d in discrepancies
+    )
+
+
+def test_fleet_matches_validate_sync():
+    table = cmdb_sync.compare_fleet(
+        cmdb_sync.FleetSnapshot.from_mapping(EXPECTED),
+        cmdb_sync.FleetSnapshot.from_mapping(ACTUAL)
+    )
+    by_vm = table.by_vm()
+    
+    failed = set()
+    for vm_name, expected in EXPECTED.items():
+        passed, discrepancies = cmdb_sync.validate_sync(expected, ACTUAL.get(vm_name))
+        if not passed:
+            failed.add(vm_name)
+        assert as_rows(by_vm.get(vm_name, [])) == as_rows(discrepancies), vm_name
+    
+    assert table.failed_vms() == failed == {'vm-drift', 'vm-missing'}
+    assert 'vm-ok' not in by_vm and 'vm-units' not in by_vm
+
+
+def test_missing_records_are_critical():
+    table = cmdb_sync.compare_fleet(
+        cmdb_sync.FleetSnapshot.from_mapping(EXPECTED),
+        cmdb_sync.FleetSnapshot.from_mapping({'vm-ok': ACTUAL['vm-ok'], 'vm-units': None})
+    )
+    missing = [row for row in table.rows() if row['field'] == 'record']
+    assert sorted(row['vm_name'] for row in missing) == [
+        'vm-drift', 'vm-empty', 'vm-missing', 'vm-units'
+    ]
+    assert all(row['severity'] == cmdb_sync.Severity.CRITICAL for row in missing)
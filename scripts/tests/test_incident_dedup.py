@@ -0,0 +1,77 @@
+"""Repeated failures update their open incident instead of opening another."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+DISCREPANCIES = [
+    cmdb_sync.Discrepancy('cpu_count', '2', '4', 'warning'),
+    cmdb_sync.Discrepancy('environment', 'dev', 'prod', 'high'),
+]
+
+
+@pytest.fixture
+def mock(servicenow):
+    return servicenow(5, SNOW_INCIDENT_UPDATE_INTERVAL='0')
+
+
+def new_client():
+    return cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+
+
+def test_fingerprint_ignores_discrepancy_order():
+    fingerprint = cmdb_sync.incident_fingerprint('vm-a', 'dev', DISCREPANCIES)
+    assert fingerprint == cmdb_sync.incident_fingerprint('vm-a', 'dev', DISCREPANCIES[::-1])
+    assert fingerprint != cmdb_sync.incident_fingerprint('vm-a', 'prod', DISCREPANCIES)
+    assert fingerprint != cmdb_sync.incident_fingerprint('vm-a', 'dev', DISCREPANCIES[:1])
+
+
+def test_repeated_failure_reuses_incident(mock):
+    numbers = []
+    # A client per run, as for separate pipeline runs
+    for _ in range(2):
+        client = new_client()
+        try:
+            numbers.append(cmdb_sync.create_incident_on_failure(
+                client, 'vm-a', 'dev', DISCREPANCIES
+            ))
+        finally:
+            client.close()
+    
+    incidents = mock.tables['incident'].records
+    assert numbers[0] and numbers[0] == numbers[1]
+    assert len(incidents) == 1
+    assert incidents[0]['correlation_id'].startswith('cmdb-sync-vm-a-')
+
+
+def test_changed_failure_opens_new_incident(mock):
+    client = new_client()
+    try:
+        first = cmdb_sync.create_incident_on_failure(client, 'vm-a', 'dev', DISCREPANCIES)
+        second = cmdb_sync.create_incident_on_failure(client, 'vm-a', 'dev', DISCREPANCIES[1:])
+    finally:
+        client.close()
+    assert first != second
+    assert len(mock.tables['incident'].records) == 2
+
+
+def test_bulk_lookup_is_batched(mock):
+    failures = {f"vm-{i:03d}": ('dev', DISCREPANCIES) for i in range(200)}
+    client = new_client()
+    try:
+        cmdb_sync.create_incidents_bulk(client, failures)
+    finally:
+        client.close()
+    
+    mock.stats.clear()
+    client = new_client()
+    try:
+        results = cmdb_sync.create_incidents_bulk(client, failures)
+    finally:
+        client.close()
+    
+    assert all(r['action'] == 'updated' and r['success'] for r in results)
+    assert len(mock.tables['incident'].records) == 200
+    # One lookup for all 200 failures, not one query per VM
+    assert mock.stats['GET table 200'] == 1
+    assert not any(key.startswith('POST batch-item') for key in mock.stats)
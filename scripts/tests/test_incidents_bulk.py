@@ -0,0 +1,114 @@
+"""Bulk incident operations when some items fail, with and without the Batch API."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+import servicenow_mock_server as mock_server
+from conftest import reject_items
+
+DISCREPANCIES = [cmdb_sync.Discrepancy('cpu_count', '2', '4', 'high')]
+
+
+@pytest.fixture(params=[True, False], ids=['batch-api', 'fallback'])
+def mock(request, servicenow):
+    return servicenow(5, batch=request.param, SNOW_INCIDENT_UPDATE_INTERVAL='0')
+
+
+@pytest.fixture
+def client(mock):
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    yield client
+    client.close()
+
+
+def failures(*vm_names):
+    return {vm_name: ('dev', DISCREPANCIES) for vm_name in vm_names}
+
+
+def test_partial_create_failure(mock, client):
+    reject_items(mock, 'vm-b')
+    results = {r['vm_name']: r for r in cmdb_sync.create_incidents_bulk(
+        client, failures('vm-a', 'vm-b', 'vm-c')
+    )}
+    
+    assert results['vm-a']['success'] and results['vm-c']['success']
+    assert results['vm-a']['incident_number'] != results['vm-c']['incident_number']
+    assert not results['vm-b']['success']
+    assert results['vm-b']['action'] == 'created'
+    assert results['vm-b']['incident_number'] is None
+    assert results['vm-b']['error']
+    assert len(mock.tables['incident'].records) == 2
+    
+    # The rejected VM is retried; the others are not duplicated
+    del mock.handle
+    retried = {r['vm_name']: r for r in cmdb_sync.create_incidents_bulk(
+        client, failures('vm-a', 'vm-b', 'vm-c')
+    )}
+    assert [retried[vm]['action'] for vm in ('vm-a', 'vm-b', 'vm-c')] == [
+        'updated', 'created', 'updated'
+    ]
+    assert all(r['success'] for r in retried.values())
+    assert len(mock.tables['incident'].records) == 3
+
+
+def test_partial_update_failure_keeps_action(mock, client):
+    created = cmdb_sync.create_incidents_bulk(client, failures('vm-a', 'vm-b'))
+    numbers = {r['vm_name']: r['incident_number'] for r in created}
+    
+    reject_items(mock, 'work_notes')
+    results = {r['vm_name']: r for r in cmdb_sync.create_incidents_bulk(
+        client, failures('vm-a', 'vm-b', 'vm-c')
+    )}
+    
+    for vm_name in ('vm-a', 'vm-b'):
+        assert results[vm_name]['action'] == 'updated'
+        assert not results[vm_name]['success']
+        assert results[vm_name]['incident_number'] == numbers[vm_name]
+    assert results['vm-c']['action'] == 'created'
+    assert results['vm-c']['success']
+
+
+def test_partial_resolve_failure(mock, client):
+    created = cmdb_sync.create_incidents_bulk(client, failures('vm-a', 'vm-b'))
+    numbers = [r['incident_number'] for r in created]
+    
+    reject_items(mock, mock.tables['incident'].records[1]['sys_id'])
+    results = cmdb_sync.resolve_incidents_bulk(client, numbers + ['INC9999999'], 'fixed')
+    
+    assert [r['success'] for r in results] == [True, False, False]
+    assert results[2]['error'] == 'Not found'
+    assert mock.tables['incident'].records[0]['active'] == 'false'
+    assert mock.tables['incident'].records[1]['active'] == 'true'
+
+
+@pytest.mark.parametrize('status', [500, 503])
+def test_failed_batch_request_is_not_resent(servicenow, status):
+    mock = servicenow(5)
+    mock.handle_batch = lambda payload: (status, mock_server._error('Batch failed'))
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    try:
+        results = cmdb_sync.create_incidents_bulk(client, failures('vm-a', 'vm-b'))
+    finally:
+        client.close()
+    
+    # The batch may have run on the server, so nothing falls back to the Table API
+    assert [r['success'] for r in results] == [False, False]
+    assert [r['action'] for r in results] == ['created', 'created']
+    assert not any(key.startswith('POST table') for key in mock.stats)
+
+
+def test_reserved_vm_names_find_their_open_incidents(servicenow):
+    mock = servicenow(5, SNOW_INCIDENT_UPDATE_INTERVAL='0', SNOW_MAX_URL_LENGTH='600')
+    vm_names = ['vm,a', 'vm,b'] + [f"vm-{i:02d}" for i in range(20)]
+    runs = []
+    for _ in range(2):
+        # A new client starts with an empty incident index, so it must query
+        client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+        try:
+            runs.append(cmdb_sync.create_incidents_bulk(client, failures(*vm_names)))
+        finally:
+            client.close()
+    
+    assert all(r['success'] and r['action'] == 'created' for r in runs[0])
+    assert all(r['success'] and r['action'] == 'updated' for r in runs[1])
+    assert len(mock.tables['incident'].records) == len(vm_names)
@@ -0,0 +1,19 @@
+"""Modules deferred by _lazy_import still work for code that imports them later."""
+
+import subprocess
+import sys
+
+from conftest import SCRIPTS_DIR
+
+
+def test_lazy_submodules_load_after_the_sync_script():
+    # A fresh interpreter: the test session has already loaded http.server
+    code = (
+        "import servicenow_cmdb_sync\n"
+        "from http.server import BaseHTTPRequestHandler\n"
+        "import servicenow_mock_server\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=SCRIPTS_DIR, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,59 @@
+"""Failed pages in strict and non-strict Table API scans."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+from conftest import fail_requests
+
+NAMES = [f"dev-vm-{i:06d}" for i in range(50)]
+
+
+@pytest.fixture
+def mock(servicenow):
+    return servicenow(50, SNOW_PAGE_SIZE='10')
+
+
+@pytest.fixture
+def client(mock):
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    yield client
+    client.close()
+
+
+def scan(client, strict):
+    endpoint = f"table/{client.config.cmdb_table}"
+    params = {'sysparm_fields': 'sys_id,name', 'sysparm_query': 'environment=dev'}
+    return list(cmdb_sync._iter_table_records(client, endpoint, params, strict=strict))
+
+
+def test_complete_scan(client):
+    assert len(scan(client, strict=True)) == 50
+
+
+def test_failed_page_raises_in_strict_mode(mock, client):
+    fail_requests(mock, after=1)
+    with pytest.raises(RuntimeError, match='Failed to fetch page'):
+        scan(client, strict=True)
+
+
+def test_failed_page_truncates_in_non_strict_mode(mock, client):
+    fail_requests(mock, after=1)
+    assert len(scan(client, strict=False)) == 10
+
+
+def test_bulk_lookup_strict(mock, client):
+    fail_requests(mock)
+    with pytest.raises(RuntimeError):
+        cmdb_sync.get_cmdb_records_bulk(client, NAMES, strict=True)
+
+
+def test_bulk_lookup_non_strict_omits_failed_vms(mock, client):
+    fail_requests(mock)
+    assert cmdb_sync.get_cmdb_records_bulk(client, NAMES) == {}
+
+
+def test_single_lookup_strict(mock, client):
+    fail_requests(mock)
+    assert cmdb_sync.get_cmdb_record(client, NAMES[0]) is None
+    with pytest.raises(RuntimeError):
+        cmdb_sync.get_cmdb_record(client, NAMES[0], strict=True)
@@ -0,0 +1,56 @@
+"""CMDB queries request only the fields their use case needs."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+GENERATED_ONLY = {'os', 'os_version', 'managed_by', 'correlation_id', 'discovery_source'}
+
+
+@pytest.fixture
+def mock(servicenow):
+    return servicenow(20, SNOW_PAGE_SIZE='10')
+
+
+@pytest.fixture
+def client(mock):
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    yield client
+    client.close()
+
+
+def fields(params):
+    return params['sysparm_fields'].split(',')
+
+
+def test_validation_profile_follows_rules():
+    params = cmdb_sync.cmdb_query_params()
+    assert params['sysparm_display_value'] == 'false'
+    assert params['sysparm_exclude_reference_link'] == 'true'
+    assert set(fields(params)) == (
+        set(cmdb_sync.CMDB_KEY_FIELDS) | set(cmdb_sync.VALIDATION_RULES)
+    )
+    assert len(fields(params)) == len(set(fields(params)))
+    
+    rules = cmdb_sync.compile_rules({'os': {'severity': 'warning'}})
+    assert fields(cmdb_sync.cmdb_query_params(rules=rules)) == (
+        cmdb_sync.CMDB_KEY_FIELDS + ['os']
+    )
+
+
+def test_record_lookup_is_projected(client):
+    record = cmdb_sync.get_cmdb_record(client, 'dev-vm-000003')
+    assert record['cpu_count'] == '2'
+    assert not GENERATED_ONLY & set(record)
+    
+    client.rules = cmdb_sync.compile_rules({'os': {'severity': 'warning'}})
+    record = cmdb_sync.get_cmdb_record(client, 'dev-vm-000003')
+    assert set(record) == set(cmdb_sync.CMDB_KEY_FIELDS) | {'os'}
+
+
+def test_inventory_scan_is_projected_and_compressed(mock, client):
+    allowed = set(cmdb_sync.CMDB_KEY_FIELDS + cmdb_sync.CMDB_INVENTORY_FIELDS)
+    records = list(cmdb_sync.get_cmdb_records_by_environment(client, 'dev'))
+    assert len(records) == 20
+    assert all(set(record) <= allowed for record in records)
+    assert 0 < mock.stats['bytes_sent'] < mock.stats['bytes_raw']
@@ -0,0 +1,78 @@
+"""Compact CMDBRecord and Discrepancy objects read like the dicts they replace."""
+
+import json
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+FIELDS = ['sys_id', 'name', 'environment', 'state']
+
+
+def compact(record, fields=FIELDS):
+    return cmdb_sync.RecordSchema(fields).compact(record)
+
+
+def test_record_reads_like_a_dict():
+    raw = {'sys_id': 'a1', 'name': 'vm-a', 'environment': 'dev'}
+    record = compact(raw)
+    
+    assert record == raw and dict(record) == raw
+    assert record['name'] == 'vm-a'
+    assert record.get('state') is None and record.get('state', 'on') == 'on'
+    assert 'state' not in record and 'name' in record
+    assert list(record) == ['sys_id', 'name', 'environment']
+    assert len(record) == 3
+    with pytest.raises(KeyError):
+        record['state']
+    assert json.loads(json.dumps(record, default=cmdb_sync.json_default)) == raw
+
+
+def test_record_is_read_only():
+    record = compact({'name': 'vm-a'})
+    with pytest.raises(TypeError):
+        record['name'] = 'vm-b'
+    with pytest.raises(AttributeError):
+        record.extra = 1
+
+
+def test_schema_grows_for_new_fields():
+    schema = cmdb_sync.RecordSchema(['name'])
+    first = schema.compact({'name': 'vm-a'})
+    second = schema.compact({'name': 'vm-b', 'ram': '4096'})
+    
+    assert second['ram'] == '4096'
+    assert 'ram' not in first and first.get('ram') is None
+    assert schema.compact(second) is second
+
+
+def test_low_cardinality_values_are_pooled():
+    schema = cmdb_sync.RecordSchema(FIELDS)
+    # Build equal strings that are distinct objects, as separate pages would
+    values = [''.join(['pro', 'd']) for _ in range(2)]
+    assert values[0] is not values[1]
+    records = [
+        schema.compact({'name': f"vm-{i}", 'environment': value})
+        for i, value in enumerate(values)
+    ]
+    assert records[0]['environment'] is records[1]['environment']
+
+
+def test_unique_fields_stop_pooling():
+    schema = cmdb_sync.RecordSchema(['name'])
+    for i in range(schema.POOL_LIMIT + 2):
+        schema.compact({'name': f"vm-{i}"})
+    assert schema.pools == ()
+
+
+def test_discrepancy_reads_like_a_dict():
+    d = cmdb_sync.Discrepancy('ram', '4096', '2048', cmdb_sync.Severity.WARNING)
+    raw = {'field': 'ram', 'expected': '4096', 'actual': '2048', 'severity': 'warning'}
+    
+    assert d == raw and dict(d) == raw
+    assert d['severity'] == 'warning' and str(d['severity']) == 'warning'
+    assert d.get('missing') is None
+    with pytest.raises(KeyError):
+        d['missing']
+    assert json.loads(json.dumps(d, default=cmdb_sync.json_default)) == raw
+    assert not hasattr(d, '__dict__')
@@ -0,0 +1,39 @@
+"""Retry-After handling is capped at the policy's max_delay."""
+
+import time
+
+import servicenow_cmdb_sync as cmdb_sync
+from conftest import fail_requests
+
+
+def test_retry_after_is_clamped_to_max_delay():
+    policy = cmdb_sync.RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert policy.compute_delay(0, retry_after=3600) == 5.0
+    assert 2.0 <= policy.compute_delay(0, retry_after=2) <= 3.0
+
+
+def test_backoff_is_capped_at_max_delay():
+    policy = cmdb_sync.RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert all(policy.compute_delay(10) <= 5.0 for _ in range(100))
+
+
+def test_retry_after_date_is_parsed():
+    future = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 120))
+    assert 100 <= cmdb_sync.RetryPolicy.parse_retry_after(future) <= 120
+    assert cmdb_sync.RetryPolicy.parse_retry_after('7') == 7.0
+
+
+def test_long_retry_after_does_not_stall_requests(servicenow):
+    mock = servicenow(5, SNOW_RETRY_MAX_DELAY='0.2')
+    calls = fail_requests(mock, status=429, headers={'Retry-After': '3600'}, times=1)
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    try:
+        started = time.monotonic()
+        record = cmdb_sync.get_cmdb_record(client, 'dev-vm-000001')
+        elapsed = time.monotonic() - started
+    finally:
+        client.close()
+    
+    assert record is not None
+    assert calls['failed'] == 1
+    assert elapsed < 2.0
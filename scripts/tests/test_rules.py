@@ -0,0 +1,93 @@
+"""Validation rules: comparisons, tolerance, regex and case handling."""
+
+import json
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+
+CASES = [
+    # spec, expected, actual, fails
+    ({}, 'web-01', 'web-01', False),
+    ({}, 'web-01', 'WEB-01', True),
+    ({'ignore_case': True}, 'web-01', 'WEB-01', False),
+    ({}, None, 'anything', False),
+    ({'compare': 'number'}, 2, '2.0', False),
+    ({'compare': 'number'}, 2, 'two', True),
+    ({'compare': 'number', 'tolerance': 1}, 10, '11', False),
+    ({'compare': 'number', 'tolerance': 1}, 10, '11.5', True),
+    ({'compare': 'number', 'tolerance': '10%'}, 200, '181', False),
+    ({'compare': 'number', 'tolerance': '10%'}, 200, '179', True),
+    ({'compare': 'size', 'unit': 'MB'}, '4 GB', '4096', False),
+    ({'compare': 'size', 'unit': 'MB'}, '4GiB', '4 GB', False),
+    ({'compare': 'size', 'unit': 'GB'}, 100, '102400 MB', False),
+    ({'compare': 'size', 'unit': 'GB', 'tolerance': '5%'}, '100', '96 GB', False),
+    ({'compare': 'size', 'unit': 'GB', 'tolerance': '5%'}, '100', '94 GB', True),
+    ({'values': ['On', 'Running']}, 'x', 'Running', False),
+    ({'values': ['On', 'Running']}, 'x', 'on', True),
+    ({'values': ['On', 'Running'], 'ignore_case': True}, 'x', 'on', False),
+    ({'values': ['On']}, None, 'off', False),
+    ({'values': ['On'], 'required': True}, None, 'off', True),
+    ({'compare': 'regex', 'pattern': '^Linux'}, 'x', 'Linux Red Hat', False),
+    ({'compare': 'regex', 'pattern': '^Linux'}, 'x', 'linux', True),
+    ({'compare': 'regex', 'pattern': '^Linux', 'ignore_case': True}, 'x', 'linux', False),
+    ({'compare': 'regex', 'pattern': '^Linux'}, 'x', None, True),
+]
+
+
+@pytest.mark.parametrize('spec, expected, actual, fails', CASES)
+def test_rule(spec, expected, actual, fails):
+    rule = cmdb_sync.ValidationRule('field', {'severity': 'warning', **spec})
+    discrepancy = rule.check(expected, actual)
+    
+    assert (discrepancy is not None) == fails
+    # Fleet comparison evaluates the same rule over columns
+    assert rule.failures([expected], [actual]) == ([0] if fails else [])
+    if discrepancy:
+        assert discrepancy['severity'] == cmdb_sync.Severity.WARNING
+        assert discrepancy['actual'] == actual
+
+
+def test_allowed_and_regex_rules_report_what_was_expected():
+    allowed = cmdb_sync.ValidationRule('state', {'values': ['On'], 'severity': 'low'})
+    regex = cmdb_sync.ValidationRule(
+        'os', {'compare': 'regex', 'pattern': '^Linux', 'severity': 'low'}
+    )
+    assert allowed.check('x', 'off')['expected'] == "one of ['On']"
+    assert regex.check('x', 'Windows')['expected'] == 'matches ^Linux'
+
+
+@pytest.mark.parametrize('spec', [
+    {},
+    {'severity': 'urgent'},
+    {'severity': 'low', 'compare': 'fuzzy'},
+    {'severity': 'low', 'compare': 'regex'},
+    {'severity': 'low', 'compare': 'regex', 'pattern': '('},
+    {'severity': 'low', 'compare': 'size', 'unit': 'PB'},
+    {'severity': 'low', 'tolerance': '-1'},
+    {'severity': 'low', 'tolerance': 'some'},
+])
+def test_malformed_rule_is_rejected(spec):
+    with pytest.raises(ValueError):
+        cmdb_sync.ValidationRule('field', spec)
+
+
+def test_rules_file(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'rules': {
+        'name': {'required': True, 'severity': 'critical'},
+        'os': {'compare': 'regex', 'pattern': '^Linux', 'severity': 'HIGH'},
+    }}))
+    rules = cmdb_sync.load_validation_rules(str(path))
+    assert list(rules) == ['name', 'os']
+    assert rules['os'].severity == cmdb_sync.Severity.HIGH
+    
+    passed, discrepancies = cmdb_sync.validate_sync(
+        {'name': 'vm-a', 'os': 'x'}, {'name': 'vm-a', 'os': 'Windows'}, rules
+    )
+    assert not passed
+    assert [d['field'] for d in discrepancies] == ['os']
+    
+    path.write_text(json.dumps({'checks': {}}))
+    with pytest.raises(ValueError, match="no 'rules' mapping"):
+        cmdb_sync.load_validation_rules(str(path))
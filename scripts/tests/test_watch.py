@@ -0,0 +1,72 @@
+"""Watch mode retries VMs whose incident could not be opened or resolved."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+from conftest import reject_items
+
+
+@pytest.fixture
+def watched(servicenow):
+    mock = servicenow(5, SNOW_INCIDENT_UPDATE_INTERVAL='3600')
+    watcher = cmdb_sync.ValidationWatcher(
+        cmdb_sync.ServiceNowConfig(), 'dev', common_expected={'environment': 'prod'}
+    )
+    yield mock, watcher
+    watcher.client.close()
+
+
+def open_incidents(mock):
+    return [r for r in mock.tables['incident'].records if r['active'] == 'true']
+
+
+def test_failed_incident_create_is_retried(watched):
+    mock, watcher = watched
+    
+    reject_items(mock, 'dev-vm-000003')
+    summary = watcher.poll_once()
+    assert summary['failed'] == 5
+    assert summary['incidents_created'] == 4
+    
+    del mock.handle
+    summary = watcher.poll_once()
+    assert summary['incidents_created'] == 1
+    assert len(open_incidents(mock)) == 5
+    
+    # Nothing left to retry
+    summary = watcher.poll_once()
+    assert summary['changed'] == 0
+    assert len(mock.tables['incident'].records) == 5
+
+
+def test_failed_incident_resolve_is_retried(watched):
+    mock, watcher = watched
+    watcher.poll_once()
+    assert len(open_incidents(mock)) == 5
+    
+    watcher.common_expected = {}
+    watcher.notify(f"dev-vm-{i:06d}" for i in range(5))
+    reject_items(mock, mock.tables['incident'].records[0]['sys_id'])
+    summary = watcher.poll_once()
+    assert summary['recovered'] == 5
+    assert summary['incidents_resolved'] == 4
+    assert len(open_incidents(mock)) == 1
+    
+    del mock.handle
+    summary = watcher.poll_once()
+    assert summary['incidents_resolved'] == 1
+    assert open_incidents(mock) == []
+    
+    summary = watcher.poll_once()
+    assert summary['changed'] == 0
+
+
+def test_summary_counts_checked_and_changed_vms(watched):
+    mock, watcher = watched
+    summary = watcher.poll_once()
+    assert (summary['checked'], summary['changed']) == (5, 5)
+    
+    # Queued but unchanged VMs are checked, not validated again
+    watcher.notify(['dev-vm-000001', 'dev-vm-000002'])
+    summary = watcher.poll_once()
+    assert (summary['checked'], summary['changed']) == (2, 0)
@@ -0,0 +1,99 @@
+"""Change-stream watermarks only move after a complete poll or refresh."""
+
+import pytest
+
+import servicenow_cmdb_sync as cmdb_sync
+from conftest import fail_requests, heal
+
+SCOPE = 'cmdb_ci_vm_instance:dev'
+
+
+def remove_record(mock, name):
+    """Delete a CMDB record from the mock, as if it was retired."""
+    table = mock.tables[mock.cmdb_table]
+    record = table.by_name.pop(name)[0]
+    i = table.sys_ids.index(record['sys_id'])
+    del table.sys_ids[i]
+    del table.records[i]
+
+
+@pytest.fixture
+def watched(servicenow):
+    mock = servicenow(50, SNOW_PAGE_SIZE='10')
+    watcher = cmdb_sync.ValidationWatcher(
+        cmdb_sync.ServiceNowConfig(), 'dev', create_incident=False
+    )
+    yield mock, watcher
+    watcher.client.close()
+
+
+@pytest.fixture
+def cached(servicenow, tmp_path):
+    mock = servicenow(30, SNOW_PAGE_SIZE='10', SNOW_CACHE_PATH=str(tmp_path / 'cache.db'))
+    client = cmdb_sync.ServiceNowClient(cmdb_sync.ServiceNowConfig())
+    yield mock, client
+    client.close()
+
+
+def test_watcher_keeps_watermark_after_failed_poll(watched):
+    mock, watcher = watched
+    
+    fail_requests(mock, after=2)
+    with pytest.raises(RuntimeError):
+        watcher.poll_once()
+    assert watcher.state.get_watermark(SCOPE) is None
+    
+    heal(mock)
+    summary = watcher.poll_once()
+    assert summary['changed'] == 50
+    assert summary['checked'] == 50
+    assert watcher.state.get_watermark(SCOPE) is not None
+
+
+def test_watcher_failed_incremental_poll_rereads_changes(watched):
+    mock, watcher = watched
+    watcher.poll_once()
+    watermark = watcher.state.get_watermark(SCOPE)
+    
+    fail_requests(mock)
+    with pytest.raises(RuntimeError):
+        watcher.poll_once()
+    assert watcher.state.get_watermark(SCOPE) == watermark
+
+
+def test_cache_refresh_keeps_watermark_on_error(cached):
+    mock, client = cached
+    assert client.cache.refresh(client, 'dev') == 30
+    watermark = client.cache.get_watermark(SCOPE)
+    
+    fail_requests(mock)
+    with pytest.raises(RuntimeError):
+        client.cache.refresh(client, 'dev')
+    assert client.cache.get_watermark(SCOPE) == watermark
+    assert client.cache.get('dev-vm-000005') is not None
+
+
+def test_failed_full_load_drops_nothing(cached):
+    mock, client = cached
+    client.cache.refresh(client, 'dev')
+    client.cache.set_watermark(f"full:{SCOPE}", '0')
+    
+    fail_requests(mock, after=1)
+    with pytest.raises(RuntimeError):
+        client.cache.refresh(client, 'dev')
+    assert len(client.cache.get_many([f"dev-vm-{i:06d}" for i in range(30)])) == 30
+
+
+def test_full_load_drops_records_it_did_not_see(cached):
+    mock, client = cached
+    client.cache.refresh(client, 'dev')
+    remove_record(mock, 'dev-vm-000005')
+    
+    # An incremental refresh cannot see deletions
+    client.cache.refresh(client, 'dev')
+    assert client.cache.get('dev-vm-000005') is not None
+    
+    client.cache.set_watermark(f"full:{SCOPE}", '0')
+    assert client.cache.refresh(client, 'dev') == 29
+    assert client.cache.get('dev-vm-000005') is None
+    assert client.cache.get('dev-vm-000006') is not None